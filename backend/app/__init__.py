@@ -71,6 +71,13 @@ def create_app():
         except Exception as e:
             print(f"Database setup warning: {e}")
 
+        # Report missing / unused indexes on the attendance tables
+        try:
+            from app.utils.db_indexes import check_indexes
+            check_indexes()
+        except Exception as e:
+            print(f"Index check warning: {e}")
+
         # Automatic audit log rotation (archives logs older than 7 days)
         try:
             from app.utils.audit_rotation import rotate_audit_logs
@@ -91,6 +98,7 @@ def create_app():
     from app.routes.audit_routes import audit_bp
     from app.routes.archive_routes import archive_bp
     from app.routes.feedback_routes import feedback_bp
+    from app.routes.report_routes import report_bp
     # from app.routes.webauthn_routes import webauthn_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
@@ -107,6 +115,7 @@ def create_app():
     app.register_blueprint(audit_bp, url_prefix="/api/audit", strict_slashes=False)
     app.register_blueprint(archive_bp, url_prefix="/api/archive", strict_slashes=False)
     app.register_blueprint(feedback_bp, url_prefix="/api/feedback", strict_slashes=False)
+    app.register_blueprint(report_bp, url_prefix="/api/reports", strict_slashes=False)
     # app.register_blueprint(webauthn_bp)
 
     return app
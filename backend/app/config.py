@@ -15,4 +15,12 @@ class Config:
     DB_NAME = os.getenv('DB_NAME')
     DB_USER = os.getenv('DB_USER')
     DB_PASS = os.getenv('DB_PASS')
-    DB_PORT = os.getenv('DB_PORT', 5432)
\ No newline at end of file
+    DB_PORT = os.getenv('DB_PORT', 5432)
+
+    # הגדרות מאגר חיבורים (Connection Pool)
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 2))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # שניות המתנה לחיבור פנוי
+    DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 1800))  # מחזור חיבור אחרי 30 דקות
+    DB_POOL_PING_AFTER = int(os.getenv('DB_POOL_PING_AFTER', 30))  # בדיקת תקינות לחיבור שהמתין מעל X שניות
+    DB_POOL_LEAK_TIMEOUT = int(os.getenv('DB_POOL_LEAK_TIMEOUT', 120))  # אזהרה על חיבור שלא הוחזר
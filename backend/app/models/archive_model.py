@@ -1,4 +1,6 @@
 from app.utils.db import get_db_connection
+from app.utils.stats_cache import bump_data_version
+from app.utils.archive_grants import has_archive_access, invalidate_grants
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 
@@ -95,9 +97,14 @@ class ArchiveModel:
                 UPDATE data_restore_requests
                 SET status = %s, approver_id = %s, resolved_at = NOW(), expires_at = %s
                 WHERE id = %s
+                RETURNING requester_id
             """, (status, approver_id, expires_at, request_id))
+            row = cur.fetchone()
             
             conn.commit()
+            invalidate_grants(row[0] if row else None)
+            # Archive grants change the log source of cached dashboard results
+            bump_data_version()
             return True
         except Exception as e:
             conn.rollback()
@@ -107,26 +114,13 @@ class ArchiveModel:
             conn.close()
 
     @staticmethod
-    def check_access(user_id, target_date):
+    def check_access(user_id, target_date, end_date=None):
         """
-        Checks if a user has an approved and non-expired request for a specific date.
+        Checks if a user has an approved and non-expired request for a specific date
+        (or, with end_date, one request covering the whole range).
+        Answered from the user's cached grants (see archive_grants.py).
         """
-        conn = get_db_connection()
-        if not conn:
-            return False
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT id FROM data_restore_requests
-                WHERE requester_id = %s 
-                AND status = 'approved'
-                AND expires_at > NOW()
-                AND %s BETWEEN start_date AND end_date
-                LIMIT 1
-            """, (user_id, target_date))
-            return cur.fetchone() is not None
-        finally:
-            conn.close()
+        return has_archive_access(user_id, target_date, end_date)
 
     @staticmethod
     def get_requests_history(user_id=None):
@@ -1,5 +1,32 @@
-from app.utils.db import get_db_connection
-from psycopg2.extras import RealDictCursor
+from app.utils.db import get_db_connection, stream_query
+from app.utils.current_status import (
+    refresh_current_status,
+    ensure_current_status_fresh,
+    current_status_join,
+    is_today,
+)
+from app.utils.daily_facts import refresh_daily_facts, facts_cover
+from app.utils.status_registry import (
+    get_status,
+    list_status_types,
+    is_weekend_allowed,
+    is_presence,
+    status_family_sql,
+)
+from app.utils.org_hierarchy import employees_in_scope
+from app.utils.requester_context import invalidate_requester
+from app.utils.stats_cache import cached_result, bump_data_version
+from app.utils.roster_finalization import run_roster_finalization
+from app.utils.log_partitions import archive_cutoff
+from app.utils.log_source import plan_log_source, needs_archive, as_date
+from app.utils.status_window import (
+    starts_on_or_before,
+    starts_on_or_after,
+    open_or_ends_on_or_after,
+    continuity_clause,
+    active_on_day,
+)
+from psycopg2.extras import RealDictCursor, execute_values
 from datetime import datetime, date, timedelta
 
 
@@ -27,13 +54,8 @@ class AttendanceModel:
                     start = now
 
             # Split range into daily logs, skipping non-weekend statuses on weekends
-            # 1. Fetch status info to check for weekend permission
-            cur.execute(
-                "SELECT name FROM status_types WHERE id = %s", (status_type_id,)
-            )
-            st_res = cur.fetchone()
-            status_name = st_res[0] if st_res else ""
-            is_weekend_allowed = "תגבור" in status_name or "אחר" in status_name
+            # 1. Weekend permission from the status registry
+            weekend_allowed = is_weekend_allowed(status_type_id)
 
             # 2. Determine date range
             start_date_obj = None
@@ -59,7 +81,7 @@ class AttendanceModel:
                     # Wait, datetime.weekday(): 0=Monday... 4=Friday, 5=Saturday, 6=Sunday
                     # In Israel: 4=Friday, 5=Saturday (Wait, 0=Mon, 4=Fri, 5=Sat)
                     wd = current_date.weekday()
-                    if (wd == 4 or wd == 5) and not is_weekend_allowed:
+                    if (wd == 4 or wd == 5) and not weekend_allowed:
                         current_date += timedelta(days=1)
                         continue
 
@@ -121,11 +143,8 @@ class AttendanceModel:
 
             # --- COMMAND RETURN LOGIC ---
             # If this is a presence status, automatically return command authority by ending active delegations
-            cur.execute(
-                "SELECT is_presence FROM status_types WHERE id = %s", (status_type_id,)
-            )
-            st_info = cur.fetchone()
-            if st_info and st_info[0]:  # If is_presence is True
+            delegations_ended = False
+            if is_presence(status_type_id):
                 cur.execute(
                     """
                     UPDATE delegations 
@@ -134,8 +153,16 @@ class AttendanceModel:
                 """,
                     (start, employee_id),
                 )
+                delegations_ended = cur.rowcount > 0
+
+            refresh_current_status(cur, [employee_id])
+            refresh_daily_facts(cur, [employee_id], start_date_obj)
 
             conn.commit()
+            bump_data_version([employee_id])
+            if delegations_ended:
+                # The delegate's temporary command scope is gone
+                invalidate_requester()
             return True
         except Exception as e:
             conn.rollback()
@@ -145,62 +172,55 @@ class AttendanceModel:
             conn.close()
 
     @staticmethod
-    def _get_log_source(user_id=None, date_val=None, requesting_user=None):
+    def _get_log_source(user_id=None, date_val=None, requesting_user=None, end_val=None):
         """
-        Returns the table(s) to query for logs.
-        
+        Returns the table(s) to query for logs over [date_val, end_val]
+        (end_val defaults to date_val) - see log_source.py.
+
         Access rules:
-        - Current month + previous month: always accessible (attendance_logs)
+        - Current month + previous month: always accessible (attendance_logs, which
+          keeps logs still active at the archive cutoff)
         - Older than previous month: requires an approved archive access request
-        - Admins: always get full access (both tables)
+          covering the archived part of the window
+        - Admins: always get archive access
         """
         from app.models.archive_model import ArchiveModel
-        from datetime import date
-        from dateutil.relativedelta import relativedelta
-
-        cols = "id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at"
-        full_union = f"(SELECT {cols} FROM attendance_logs UNION ALL SELECT {cols} FROM attendance_logs_archive)"
-
-        # Admins always get full access
-        if requesting_user and requesting_user.get("is_admin"):
-            return full_union
-
-        if not user_id or not date_val:
-            return "attendance_logs"
-
-        # Parse the target date
-        try:
-            if isinstance(date_val, str):
-                target_date = date.fromisoformat(date_val[:10])
-            else:
-                target_date = date_val
-        except (ValueError, TypeError):
-            return "attendance_logs"
-
-        # Calculate the start of the previous month
-        today = date.today()
-        start_of_prev_month = today.replace(day=1) - relativedelta(months=1)
 
-        # If the date is within the current or previous month, allow normal access
-        if target_date >= start_of_prev_month:
-            return "attendance_logs"
-
-        # For older dates: check if user has an approved archive access request
-        if ArchiveModel.check_access(user_id, date_val):
-            return full_union
-
-        # No access - return empty result set (access denied)
-        return "(SELECT {cols} FROM attendance_logs WHERE FALSE)".format(cols=cols)
+        archive_allowed = False
+        if needs_archive(date_val):
+            if requesting_user and requesting_user.get("is_admin"):
+                archive_allowed = True
+            elif user_id and date_val:
+                archived_end = min(
+                    as_date(end_val) or as_date(date_val),
+                    archive_cutoff() - timedelta(days=1),
+                )
+                archive_allowed = ArchiveModel.check_access(user_id, as_date(date_val), archived_end)
 
+        return plan_log_source(date_val, end_val, archive_allowed)
 
     @staticmethod
     def log_bulk_status(updates, reported_by=None):
+        """
+        Applies many status updates in one transaction, set-based:
+        every requested (employee, day) cell is staged into a temp table and the
+        overlap handling (delete / truncate / shift), inserts and delegation
+        return run as a handful of statements regardless of batch size.
+        A later update for the same employee and day wins.
+        """
         conn = get_db_connection()
         if not conn:
             return False
         try:
             cur = conn.cursor()
             now = datetime.now()
+
+            cells = {}  # (employee_id, day) -> (status_type_id, note), last update wins
+            timestamp_updates = []  # updates with an explicit start time (not full-day)
+            delegation_returns = {}  # employee_id -> end_date (first presence update)
+            touched_employees = set()
+            facts_from = None  # earliest day touched by this batch
+
             for update in updates:
                 employee_id = update.get("employee_id")
                 status_type_id = update.get("status_type_id")
@@ -210,8 +230,8 @@ class AttendanceModel:
 
                 if not employee_id or not status_type_id:
                     continue
+                touched_employees.add(employee_id)
 
-                # Insert new status
                 start = start_date
                 if not start_date:
                     start = now
@@ -219,13 +239,7 @@ class AttendanceModel:
                     if start_date == now.strftime("%Y-%m-%d"):
                         start = now
 
-                # Fetch status info to check for weekend permission
-                cur.execute(
-                    "SELECT name FROM status_types WHERE id = %s", (status_type_id,)
-                )
-                st_res = cur.fetchone()
-                status_name = st_res[0] if st_res else ""
-                is_weekend_allowed = "תגבור" in status_name or "אחר" in status_name
+                weekend_allowed = is_weekend_allowed(status_type_id)
 
                 # Determine dates
                 start_date_obj = None
@@ -235,6 +249,8 @@ class AttendanceModel:
                     start_date_obj = (
                         start.date() if isinstance(start, datetime) else start
                     )
+                if start_date_obj and (facts_from is None or start_date_obj < facts_from):
+                    facts_from = start_date_obj
 
                 end_date_obj = None
                 if end_date:
@@ -249,144 +265,67 @@ class AttendanceModel:
                             else end_date
                         )
 
-                # If multi-day range, split it
                 if start_date_obj and end_date_obj and start_date_obj < end_date_obj:
+                    # Multi-day range: one cell per day, skipping Fri/Sat unless allowed
                     current_date = start_date_obj
                     while current_date <= end_date_obj:
                         wd = current_date.weekday()
-                        if (wd == 4 or wd == 5) and not is_weekend_allowed:
-                            current_date += timedelta(days=1)
-                            continue
-
-                        day_start = datetime.combine(current_date, datetime.min.time())
-                        day_end = datetime.combine(current_date, datetime.max.time())
-
-                        # Surgical removal/truncation of existing logs for this day
-                        # 1. Delete logs fully contained within this day
-                        cur.execute(
-                            "DELETE FROM attendance_logs WHERE employee_id = %s AND start_datetime >= %s AND end_datetime <= %s",
-                            (employee_id, day_start, day_end),
-                        )
-
-                        # 2. Truncate logs that start before but end DURING or after the day
-                        cur.execute(
-                            "UPDATE attendance_logs SET end_datetime = %s WHERE employee_id = %s AND start_datetime < %s AND (end_datetime IS NULL OR end_datetime >= %s)",
-                            (
-                                day_start - timedelta(seconds=1),
-                                employee_id,
-                                day_start,
-                                day_start,
-                            ),
-                        )
-
-                        # 3. Truncate logs that start DURING the day but end after
-                        cur.execute(
-                            "UPDATE attendance_logs SET start_datetime = %s WHERE employee_id = %s AND start_datetime >= %s AND start_datetime <= %s AND (end_datetime IS NULL OR end_datetime > %s)",
-                            (
-                                day_end + timedelta(seconds=1),
-                                employee_id,
-                                day_start,
-                                day_end,
-                                day_end,
-                            ),
-                        )
-
-                        cur.execute(
-                            """
-                            INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """,
-                            (
-                                employee_id,
-                                status_type_id,
-                                day_start,
-                                day_end,
-                                note,
-                                reported_by,
-                                True,
-                            ),
-                        )
+                        if not ((wd == 4 or wd == 5) and not weekend_allowed):
+                            cells[(employee_id, current_date)] = (status_type_id, note)
                         current_date += timedelta(days=1)
+                elif isinstance(start, (datetime, date)) or (
+                    isinstance(start, str) and len(start) == 10
+                ):
+                    # Single full day
+                    cells[(employee_id, start_date_obj)] = (status_type_id, note)
                 else:
-                    # Single day / open-ended
-                    # Determine day bounds if it's a full-day update
-                    if isinstance(start, (datetime, date)) or (
-                        isinstance(start, str) and len(start) == 10
-                    ):
-                        day_start = datetime.combine(
-                            start_date_obj, datetime.min.time()
-                        )
-                        day_end = datetime.combine(start_date_obj, datetime.max.time())
-
-                        # Apply same surgical logic for single day
-                        cur.execute(
-                            "DELETE FROM attendance_logs WHERE employee_id = %s AND start_datetime >= %s AND end_datetime <= %s",
-                            (employee_id, day_start, day_end),
-                        )
-                        cur.execute(
-                            "UPDATE attendance_logs SET end_datetime = %s WHERE employee_id = %s AND start_datetime < %s AND (end_datetime IS NULL OR end_datetime >= %s)",
-                            (
-                                day_start - timedelta(seconds=1),
-                                employee_id,
-                                day_start,
-                                day_start,
-                            ),
-                        )
-                        cur.execute(
-                            "UPDATE attendance_logs SET start_datetime = %s WHERE employee_id = %s AND start_datetime >= %s AND start_datetime <= %s AND (end_datetime IS NULL OR end_datetime > %s)",
-                            (
-                                day_end + timedelta(seconds=1),
-                                employee_id,
-                                day_start,
-                                day_end,
-                                day_end,
-                            ),
-                        )
-
-                        start_to_insert = day_start
-                        end_to_insert = day_end
-                    else:
-                        # If it's a specific timestamp (unlikely from Roster but good to handle)
-                        cur.execute(
-                            "UPDATE attendance_logs SET end_datetime = %s WHERE employee_id = %s AND end_datetime IS NULL AND start_datetime < %s",
-                            (start, employee_id, start),
-                        )
-                        start_to_insert = start
-                        end_to_insert = end_date
-
-                    cur.execute(
-                        """
-                        INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                        (
-                            employee_id,
-                            status_type_id,
-                            start_to_insert,
-                            end_to_insert,
-                            note,
-                            reported_by,
-                            True,
-                        ),
+                    # Specific timestamp (unlikely from Roster but good to handle)
+                    timestamp_updates.append(
+                        (employee_id, status_type_id, start, end_date, note)
                     )
 
                 # --- COMMAND RETURN LOGIC (Bulk) ---
+                if is_presence(status_type_id) and employee_id not in delegation_returns:
+                    delegation_returns[employee_id] = start
+
+            if cells:
+                AttendanceModel._apply_day_cells(cur, cells, reported_by)
+
+            for employee_id, status_type_id, start, end_date, note in timestamp_updates:
                 cur.execute(
-                    "SELECT is_presence FROM status_types WHERE id = %s",
-                    (status_type_id,),
+                    "UPDATE attendance_logs SET end_datetime = %s WHERE employee_id = %s AND end_datetime IS NULL AND start_datetime < %s",
+                    (start, employee_id, start),
                 )
-                st_info = cur.fetchone()
-                if st_info and st_info[0]:
-                    cur.execute(
-                        """
-                        UPDATE delegations 
-                        SET is_active = FALSE, end_date = %s 
-                        WHERE commander_id = %s AND is_active = TRUE
-                    """,
-                        (start, employee_id),
-                    )
+                cur.execute(
+                    """
+                    INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """,
+                    (employee_id, status_type_id, start, end_date, note, reported_by, True),
+                )
+
+            delegations_ended = False
+            if delegation_returns:
+                execute_values(
+                    cur,
+                    """
+                    UPDATE delegations d
+                    SET is_active = FALSE, end_date = v.end_date
+                    FROM (VALUES %s) AS v(commander_id, end_date)
+                    WHERE d.commander_id = v.commander_id AND d.is_active = TRUE
+                """,
+                    list(delegation_returns.items()),
+                    template="(%s, %s::timestamp)",
+                )
+                delegations_ended = cur.rowcount > 0
+
+            refresh_current_status(cur, touched_employees)
+            refresh_daily_facts(cur, touched_employees, facts_from)
 
             conn.commit()
+            bump_data_version(touched_employees)
+            if delegations_ended:
+                invalidate_requester()
             return True
         except Exception as e:
             conn.rollback()
@@ -395,6 +334,119 @@ class AttendanceModel:
         finally:
             conn.close()
 
+    @staticmethod
+    def _stage_day_cells(cur, cells):
+        """
+        Stages {(employee_id, day): (status_type_id, note)} into the temp tables
+        bulk_cells (one row per day) and bulk_runs (runs of consecutive days per
+        employee, as [run_start, run_end] timestamps). Both drop on commit.
+        """
+        cur.execute(
+            """
+            CREATE TEMP TABLE bulk_cells (
+                employee_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                status_type_id INTEGER NOT NULL,
+                note TEXT,
+                day_start TIMESTAMP NOT NULL,
+                day_end TIMESTAMP NOT NULL
+            ) ON COMMIT DROP
+        """
+        )
+        execute_values(
+            cur,
+            "INSERT INTO bulk_cells (employee_id, day, status_type_id, note, day_start, day_end) VALUES %s",
+            [
+                (
+                    employee_id,
+                    day,
+                    status_type_id,
+                    note,
+                    datetime.combine(day, datetime.min.time()),
+                    datetime.combine(day, datetime.max.time()),
+                )
+                for (employee_id, day), (status_type_id, note) in cells.items()
+            ],
+            page_size=1000,
+        )
+
+        # Runs of consecutive requested days per employee
+        cur.execute(
+            """
+            CREATE TEMP TABLE bulk_runs ON COMMIT DROP AS
+            SELECT employee_id, MIN(day_start) AS run_start, MAX(day_end) AS run_end
+            FROM (
+                SELECT employee_id, day_start, day_end,
+                       day - (ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY day))::int AS grp
+                FROM bulk_cells
+            ) c
+            GROUP BY employee_id, grp
+        """
+        )
+        cur.execute("CREATE INDEX ON bulk_runs (employee_id, run_start)")
+        cur.execute("ANALYZE bulk_runs")
+
+    @staticmethod
+    def _apply_day_cells(cur, cells, reported_by=None):
+        """
+        Writes full-day logs for {(employee_id, day): (status_type_id, note)}.
+        Same overlap rules as a per-day loop in ascending day order:
+        logs inside a requested day are removed, logs running into it are cut
+        at its start, logs starting in it move past it. Consecutive requested
+        days are handled as one run, which makes the result independent of order.
+        """
+        AttendanceModel._stage_day_cells(cur, cells)
+
+        # 1. Delete logs fully contained within a run
+        cur.execute(
+            """
+            DELETE FROM attendance_logs al
+            USING bulk_runs r
+            WHERE al.employee_id = r.employee_id
+            AND al.start_datetime >= r.run_start AND al.end_datetime <= r.run_end
+        """
+        )
+
+        # 2. Logs that start DURING a run but end after it - move their start past the run
+        cur.execute(
+            """
+            UPDATE attendance_logs al
+            SET start_datetime = r.run_end + INTERVAL '1 second'
+            FROM bulk_runs r
+            WHERE al.employee_id = r.employee_id
+            AND al.start_datetime >= r.run_start AND al.start_datetime <= r.run_end
+            AND (al.end_datetime IS NULL OR al.end_datetime > r.run_end)
+        """
+        )
+
+        # 3. Logs that start before a run but end during or after it - cut at the first such run
+        cur.execute(
+            """
+            UPDATE attendance_logs al
+            SET end_datetime = nxt.run_start - INTERVAL '1 second'
+            FROM (
+                SELECT l.id, MIN(r.run_start) AS run_start
+                FROM attendance_logs l
+                JOIN bulk_runs r ON r.employee_id = l.employee_id
+                WHERE l.start_datetime < r.run_start
+                AND (l.end_datetime IS NULL OR l.end_datetime >= r.run_start)
+                GROUP BY l.id
+            ) nxt
+            WHERE al.id = nxt.id
+        """
+        )
+
+        # 4. Insert the new daily logs
+        cur.execute(
+            """
+            INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified)
+            SELECT employee_id, status_type_id, day_start, day_end, note, %s, TRUE
+            FROM bulk_cells
+            ORDER BY employee_id, day
+        """,
+            (reported_by,),
+        )
+
     @staticmethod
     def log_scope_status(
         scope_type, scope_id, status_type_id, start_date, end_date, note=None, reported_by=None
@@ -449,9 +501,8 @@ class AttendanceModel:
                 from app.models.notification_model import NotificationModel
                 
                 # Get status name
-                cur.execute("SELECT name FROM status_types WHERE id = %s", (status_type_id,))
-                st_res = cur.fetchone()
-                status_name = st_res['name'] if st_res else "אירוע יחידה"
+                st_res = get_status(status_type_id)
+                status_name = st_res["name"] if st_res else "אירוע יחידה"
                 
                 msg_title = f"נקבע {status_name}"
                 msg_desc = f"עבור התאריכים {start_date} עד {end_date or start_date}"
@@ -476,114 +527,158 @@ class AttendanceModel:
         """
         Sets a specific daily roster entry (00:00-23:59).
         Overwrites any existing logs for that day.
-        Sets is_verified = FALSE (unless date < today).
         """
+        return AttendanceModel.apply_roster_batch(
+            [
+                {
+                    "employee_id": employee_id,
+                    "status_id": status_type_id,
+                    "start_date": date_obj,
+                }
+            ],
+            reported_by=reported_by,
+        )
+
+    @staticmethod
+    def apply_roster_batch(cells, reported_by=None, max_days=None):
+        """
+        Applies roster grid cells in one transaction.
+        cells: [{employee_id, status_id, start_date, end_date?}] - dates are
+        'YYYY-MM-DD' strings or date objects, end_date defaults to start_date.
+        Every day in each range becomes a verified full-day log; a later cell
+        wins for the same employee and day. Existing logs are cut around the
+        requested days (a log surrounding them is split, not truncated), in a
+        single overlap-resolution pass.
+        Raises ValueError when the cells expand to more than max_days days.
+        """
+        day_cells = {}
+        for cell in cells:
+            employee_id = cell.get("employee_id")
+            status_id = cell.get("status_id") or cell.get("status_type_id")
+            start_date = cell.get("start_date")
+            if not employee_id or not status_id or not start_date:
+                raise ValueError("Each cell needs employee_id, status_id and start_date")
+            if isinstance(start_date, str):
+                start_date = datetime.strptime(start_date[:10], "%Y-%m-%d").date()
+            end_date = cell.get("end_date") or start_date
+            if isinstance(end_date, str):
+                end_date = datetime.strptime(end_date[:10], "%Y-%m-%d").date()
+            if end_date < start_date:
+                raise ValueError("end_date is before start_date")
+            if max_days is not None and len(day_cells) + (end_date - start_date).days + 1 > max_days:
+                raise ValueError(f"Too many roster days (max {max_days})")
+
+            curr_date = start_date
+            while curr_date <= end_date:
+                day_cells[(int(employee_id), curr_date)] = (int(status_id), None)
+                curr_date += timedelta(days=1)
+
+        if not day_cells:
+            return True
+
         conn = get_db_connection()
         if not conn:
             return False
         try:
             cur = conn.cursor()
+            AttendanceModel._stage_day_cells(cur, day_cells)
 
-            # Define range for the day
-            start_dt = datetime.combine(date_obj, datetime.min.time())
-            end_dt = datetime.combine(date_obj, datetime.max.time())
-
-            # Roster entries are considered verified/final by default
-            is_verified = True
-
-            # 1. Surgical overlapping management
-            # a) Delete logs fully contained within this day
+            # 1. Every live log overlapping a run, cut into the pieces outside the runs:
+            #    before the first run, between runs, after the last run.
             cur.execute(
-                "DELETE FROM attendance_logs WHERE employee_id = %s AND start_datetime >= %s AND end_datetime <= %s",
-                (employee_id, start_dt, end_dt),
+                """
+                CREATE TEMP TABLE roster_pieces ON COMMIT DROP AS
+                WITH hits AS (
+                    SELECT l.id AS log_id, l.start_datetime, l.end_datetime,
+                           r.run_start, r.run_end,
+                           LAG(r.run_end) OVER w AS prev_run_end,
+                           LEAD(r.run_start) OVER w AS next_run_start
+                    FROM attendance_logs l
+                    JOIN bulk_runs r ON r.employee_id = l.employee_id
+                    WHERE l.start_datetime <= r.run_end
+                    AND (l.end_datetime IS NULL OR l.end_datetime >= r.run_start)
+                    WINDOW w AS (PARTITION BY l.id ORDER BY r.run_start)
+                ),
+                pieces AS (
+                    -- Portion before this run
+                    SELECT log_id,
+                           COALESCE(prev_run_end + INTERVAL '1 second', start_datetime) AS piece_start,
+                           run_start - INTERVAL '1 second' AS piece_end
+                    FROM hits
+                    WHERE prev_run_end IS NOT NULL OR start_datetime < run_start
+                    UNION ALL
+                    -- Portion after the last run
+                    SELECT log_id, run_end + INTERVAL '1 second', end_datetime
+                    FROM hits
+                    WHERE next_run_start IS NULL
+                    AND (end_datetime IS NULL OR end_datetime > run_end)
+                )
+                SELECT log_id, piece_start, piece_end,
+                       ROW_NUMBER() OVER (PARTITION BY log_id ORDER BY piece_start) AS piece_no
+                FROM pieces
+            """
             )
 
-            # b) Truncate logs that surround this day (Start before, End after) - SPLIT them
+            # 2. Logs left with no piece outside the runs are removed
             cur.execute(
                 """
-                SELECT id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified
-                FROM attendance_logs
-                WHERE employee_id = %s 
-                AND start_datetime < %s 
-                AND (end_datetime IS NULL OR end_datetime > %s)
-            """,
-                (employee_id, start_dt, end_dt),
-            )
-            surrounders = cur.fetchall()
-            for s in surrounders:
-                # Insert the 'after' portion
-                cur.execute(
-                    """
-                    INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                    (
-                        employee_id,
-                        s[1],
-                        end_dt + timedelta(seconds=1),
-                        s[3],
-                        s[4],
-                        s[5],
-                        s[6],
-                    ),
-                )
-                # Update the 'before' portion
-                cur.execute(
-                    "UPDATE attendance_logs SET end_datetime = %s WHERE id = %s",
-                    (start_dt - timedelta(seconds=1), s[0]),
+                DELETE FROM attendance_logs al
+                WHERE al.id IN (
+                    SELECT l.id FROM attendance_logs l
+                    JOIN bulk_runs r ON r.employee_id = l.employee_id
+                    WHERE l.start_datetime <= r.run_end
+                    AND (l.end_datetime IS NULL OR l.end_datetime >= r.run_start)
                 )
+                AND NOT EXISTS (SELECT 1 FROM roster_pieces p WHERE p.log_id = al.id)
+            """
+            )
 
-            # c) Truncate logs that start before but end DURING the day
+            # 3. The first piece keeps the original row, further pieces are new rows
             cur.execute(
                 """
-                UPDATE attendance_logs 
-                SET end_datetime = %s 
-                WHERE employee_id = %s 
-                AND start_datetime < %s 
-                AND end_datetime >= %s AND end_datetime <= %s
-            """,
-                (
-                    start_dt - timedelta(seconds=1),
-                    employee_id,
-                    start_dt,
-                    start_dt,
-                    end_dt,
-                ),
+                INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, is_verified)
+                SELECT al.employee_id, al.status_type_id, p.piece_start, p.piece_end, al.note, al.reported_by, al.is_verified
+                FROM roster_pieces p
+                JOIN attendance_logs al ON al.id = p.log_id
+                WHERE p.piece_no > 1
+            """
             )
-
-            # d) Truncate logs that start DURING but end after the day
             cur.execute(
                 """
-                UPDATE attendance_logs 
-                SET start_datetime = %s 
-                WHERE employee_id = %s 
-                AND start_datetime >= %s AND start_datetime <= %s 
-                AND (end_datetime IS NULL OR end_datetime > %s)
-            """,
-                (end_dt + timedelta(seconds=1), employee_id, start_dt, end_dt, end_dt),
+                UPDATE attendance_logs al
+                SET start_datetime = p.piece_start, end_datetime = p.piece_end
+                FROM roster_pieces p
+                WHERE p.log_id = al.id AND p.piece_no = 1
+            """
             )
 
-            # 2. Insert new daily log
+            # 4. New daily logs (roster entries are considered verified/final by default)
             cur.execute(
                 """
                 INSERT INTO attendance_logs (employee_id, status_type_id, start_datetime, end_datetime, reported_by, is_verified)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                SELECT employee_id, status_type_id, day_start, day_end, %s, TRUE
+                FROM bulk_cells
+                ORDER BY employee_id, day
             """,
-                (
-                    employee_id,
-                    status_type_id,
-                    start_dt,
-                    end_dt,
-                    reported_by,
-                    is_verified,
-                ),
+                (reported_by,),
+            )
+
+            touched_employees = {emp_id for emp_id, _ in day_cells}
+            refresh_current_status(cur, touched_employees)
+            # A shifted remainder can start the day after a run
+            refresh_daily_facts(
+                cur,
+                touched_employees,
+                min(day for _, day in day_cells),
+                max(day for _, day in day_cells) + timedelta(days=1),
             )
 
             conn.commit()
+            bump_data_version(touched_employees)
             return True
         except Exception as e:
             conn.rollback()
-            print(f"Error upserting roster: {e}")
+            print(f"Error applying roster batch: {e}")
             return False
         finally:
             conn.close()
@@ -616,8 +711,13 @@ class AttendanceModel:
                 query += " AND employee_id = ANY(%s)"
                 params.append(list(employee_ids))
 
+            query += " RETURNING employee_id"
             cur.execute(query, tuple(params))
+            verified = [r[0] for r in cur.fetchall()]
+            refresh_current_status(cur, verified)
             conn.commit()
+            if verified:
+                bump_data_version(verified)
             return True
         except Exception as e:
             conn.rollback()
@@ -629,55 +729,15 @@ class AttendanceModel:
     @staticmethod
     def auto_approve_daily_roster():
         """
-        Automatically approves (verifies) all roster logs for TODAY that are currently unverified.
-        This runs on dashboard load to ensure the 'pull' happens automatically in the morning.
+        Verifies the roster entries that are due by today.
+        Runs from the scheduler and, throttled, from the dashboard routes
+        (ensure_roster_finalized).
         """
-        conn = get_db_connection()
-        if not conn:
-            return False
-        try:
-            cur = conn.cursor()
-
-            # Update all unverified logs for today to verified
-            # Logic: IF start_date is Today (or in past) AND is_verified is False -> Set True
-            # We also ensure the log is actually active today (start <= now <= end/null)
-
-            query = """
-                UPDATE attendance_logs
-                SET is_verified = TRUE, verified_at = NOW()
-                WHERE start_datetime::date <= CURRENT_DATE 
-                AND (end_datetime IS NULL OR end_datetime >= CURRENT_TIMESTAMP)
-                AND is_verified = FALSE
-            """
-            cur.execute(query)
-            count = cur.rowcount
-            if count > 0:
-                print(
-                    f"[AUTO-ROSTER] Automatically verified {count} records for today."
-                )
-
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            print(f"Error in auto_approve_daily_roster: {e}")
-            return False
-        finally:
-            conn.close()
+        return run_roster_finalization() is not None
 
     @staticmethod
     def get_status_types():
-        conn = get_db_connection()
-        if not conn:
-            return []
-        try:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute(
-                "SELECT id, name, color, is_presence, is_persistent, parent_status_id FROM status_types ORDER BY COALESCE(parent_status_id, id), id"
-            )
-            return cur.fetchall()
-        finally:
-            conn.close()
+        return list_status_types()
 
     @staticmethod
     def get_monthly_summary(year, month, requesting_user_id=None):
@@ -686,7 +746,11 @@ class AttendanceModel:
             return {}
         try:
             cur = conn.cursor(cursor_factory=RealDictCursor)
-            table_source = AttendanceModel._get_log_source(requesting_user_id, f"{year}-{month:02d}-01")
+            month_start = date(year, month, 1)
+            next_month = date(year + month // 12, month % 12 + 1, 1)
+            table_source = AttendanceModel._get_log_source(
+                requesting_user_id, month_start, end_val=next_month - timedelta(days=1)
+            )
             query = f"""
                 SELECT 
                     DATE(al.start_datetime) as date,
@@ -695,12 +759,11 @@ class AttendanceModel:
                     COUNT(*) as count
                 FROM {table_source} al
                 JOIN status_types st ON al.status_type_id = st.id
-                WHERE EXTRACT(YEAR FROM al.start_datetime) = %s 
-                AND EXTRACT(MONTH FROM al.start_datetime) = %s
+                WHERE al.start_datetime >= %s AND al.start_datetime < %s
                 GROUP BY date, st.name, st.color
                 ORDER BY date
             """
-            cur.execute(query, (year, month))
+            cur.execute(query, (month_start, next_month))
             rows = cur.fetchall()
             summary = {}
             for row in rows:
@@ -789,14 +852,49 @@ class AttendanceModel:
             # 3.5. Status Comparison Filter Logic
             count_condition = "st.is_presence = TRUE"
             if filters and filters.get("status_id"):
-                status_id = int(filters["status_id"])
-                count_condition = (
-                    f"(st.id = {status_id} OR st.parent_status_id = {status_id})"
-                )
+                count_condition = status_family_sql(int(filters["status_id"]))
 
             # 4. Execute Query
             # If days > 1, we calculate average over requested range
-            if days > 1:
+            base_date = date or datetime.now().strftime("%Y-%m-%d")
+            window_end = datetime.strptime(str(base_date)[:10], "%Y-%m-%d").date()
+            window_start = window_end - timedelta(days=days - 1)
+            if days > 1 and facts_cover(cur, window_start, window_end):
+                # Pre-computed daily snapshots (unit ids as of each day)
+                query = f"""
+                    SELECT 
+                        {grouping_id} as unit_id,
+                        COALESCE({grouping_col}, 'ללא שיוך') as unit_name,
+                        COUNT(DISTINCT e.id) as total_count,
+                        ROUND(CAST(COUNT(CASE WHEN f.is_presence = TRUE THEN 1 END) AS NUMERIC) / {days}, 1) as present_count,
+                        ROUND(CAST(COUNT(CASE WHEN f.is_presence = FALSE THEN 1 END) AS NUMERIC) / {days}, 1) as absent_count,
+                        ROUND(CAST(COUNT(CASE WHEN f.is_presence IS NULL THEN 1 END) AS NUMERIC) / {days}, 1) as unknown_count
+                    FROM daily_status_facts f
+                    JOIN employees e ON e.id = f.employee_id
+                    LEFT JOIN teams t ON f.team_id = t.id
+                    LEFT JOIN sections s ON f.section_id = s.id
+                    LEFT JOIN departments d ON f.department_id = d.id
+                    LEFT JOIN service_types srv ON e.service_type_id = srv.id
+                    WHERE f.fact_date BETWEEN %s AND %s
+                    AND e.is_active = TRUE 
+                    AND e.username != 'admin'
+                    {scoping_clause}
+                    AND e.id != %s
+                    GROUP BY {grouping_id}, {grouping_col}
+                    HAVING {grouping_id} IS NOT NULL
+                    ORDER BY {grouping_col}
+                """
+                userId = requesting_user["id"] if requesting_user else None
+                final_params = [window_start, window_end] + scoping_params + [userId]
+
+                cur.execute(query, tuple(final_params))
+            elif days > 1:
+                table_source = AttendanceModel._get_log_source(
+                    requesting_user["id"] if requesting_user else None,
+                    window_start,
+                    requesting_user=requesting_user,
+                    end_val=window_end,
+                )
                 query = f"""
                     WITH RECURSIVE date_range AS (
                         SELECT DATE(%s) as date_val
@@ -813,16 +911,10 @@ class AttendanceModel:
                             e.id as emp_id,
                             (
                                 SELECT st.is_presence
-                                FROM (
-                                    SELECT id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at FROM attendance_logs
-                                    UNION ALL
-                                    SELECT id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at FROM attendance_logs_archive
-                                ) al
+                                FROM {table_source} al
                                 JOIN status_types st ON al.status_type_id = st.id
                                 WHERE al.employee_id = e.id
-                                AND DATE(al.start_datetime) <= dr.date_val
-                                AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= dr.date_val)
-                                AND (st.is_persistent = TRUE OR DATE(al.start_datetime) = dr.date_val)
+                                AND {active_on_day("dr.date_val")}
                                 ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
                             ) as is_present
                         FROM date_range dr
@@ -850,15 +942,37 @@ class AttendanceModel:
                     GROUP BY unit_id, unit_name
                     ORDER BY unit_name
                 """
-                base_date = date if date else "CURRENT_DATE"
                 userId = requesting_user["id"] if requesting_user else None
                 final_params = [base_date, base_date, days] + scoping_params + [userId]
 
                 cur.execute(query, tuple(final_params))
             else:
                 # Standardized Snapshot logic for single day
-                target_date = date if date else date.today().strftime("%Y-%m-%d")
-                status_params = [target_date, target_date, target_date]
+                if is_today(date):
+                    # Today: plain join on the maintained current-status projection
+                    ensure_current_status_fresh()
+                    status_join = current_status_join(alias="al")
+                    status_params = []
+                else:
+                    target_date = date
+                    table_source = AttendanceModel._get_log_source(
+                        requesting_user["id"] if requesting_user else None,
+                        target_date,
+                        requesting_user=requesting_user,
+                    )
+                    status_join = f"""LEFT JOIN LATERAL (
+                        SELECT al.status_type_id, al.id,
+                               (CASE WHEN al.status_type_id IS NOT NULL
+                                          AND {continuity_clause("%s", status="sti")}
+                                     THEN TRUE
+                                     ELSE FALSE
+                               END) as is_active_for_date
+                        FROM {table_source} al
+                        JOIN status_types sti ON al.status_type_id = sti.id
+                        WHERE al.employee_id = e.id AND {starts_on_or_before("%s")}
+                        ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
+                    ) al ON al.is_active_for_date = TRUE"""
+                    status_params = [target_date, target_date, target_date]
 
                 query = f"""
                     SELECT 
@@ -875,26 +989,7 @@ class AttendanceModel:
                     LEFT JOIN sections s_dir ON e.section_id = s_dir.id
                     LEFT JOIN departments d_dir ON e.department_id = d_dir.id
                     LEFT JOIN service_types srv ON e.service_type_id = srv.id
-                    LEFT JOIN LATERAL (
-                        SELECT al.status_type_id, al.id,
-                               (CASE WHEN al.status_type_id IS NOT NULL
-                                          AND (
-                                            (al.end_datetime IS NOT NULL AND DATE(al.end_datetime) >= %s)
-                                            OR
-                                            (al.end_datetime IS NULL AND (sti.is_persistent = TRUE OR DATE(al.start_datetime) = %s))
-                                          )
-                                     THEN TRUE
-                                     ELSE FALSE
-                               END) as is_active_for_date
-                        FROM (
-                            SELECT id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at FROM attendance_logs
-                            UNION ALL
-                            SELECT id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at FROM attendance_logs_archive
-                        ) al
-                        JOIN status_types sti ON al.status_type_id = sti.id
-                        WHERE al.employee_id = e.id AND DATE(al.start_datetime) <= %s
-                        ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
-                    ) al ON al.is_active_for_date = TRUE
+                    {status_join}
                     LEFT JOIN status_types st ON al.status_type_id = st.id
                     WHERE e.is_active = TRUE 
                     AND e.username != 'admin' 
@@ -971,10 +1066,7 @@ class AttendanceModel:
             # 2.5. Status Trend Filter Logic
             count_condition = "st.is_presence = TRUE"
             if filters and filters.get("status_id"):
-                status_id = int(filters["status_id"])
-                count_condition = (
-                    f"(st.id = {status_id} OR st.parent_status_id = {status_id})"
-                )
+                count_condition = status_family_sql(int(filters["status_id"]))
 
             date_anchor = "CURRENT_DATE"
             date_params = []
@@ -982,6 +1074,55 @@ class AttendanceModel:
                 date_anchor = "%s::date"
                 date_params = [end_date]
 
+            userId = requesting_user["id"] if requesting_user else -1
+            window_end = (
+                datetime.strptime(str(end_date)[:10], "%Y-%m-%d").date()
+                if end_date
+                else date.today()
+            )
+            window_start = window_end - timedelta(days=days - 1)
+
+            if facts_cover(cur, window_start, window_end):
+                # Pre-computed daily snapshots: one indexed range scan instead of
+                # a LATERAL over live + archive logs per (day, employee)
+                query = f"""
+                    WITH params AS (
+                        SELECT ({date_anchor} - n)::date as fact_date
+                        FROM generate_series(0, %s) n
+                    )
+                    SELECT 
+                        TO_CHAR(p.fact_date, 'DD/MM') as date_str,
+                        p.fact_date::timestamp as date,
+                        COUNT(st.fact_date) as total_employees,
+                        COUNT(CASE WHEN {count_condition} THEN 1 END) as present_count
+                    FROM params p
+                    LEFT JOIN (
+                        SELECT f.fact_date, sti.id, sti.is_presence
+                        FROM daily_status_facts f
+                        JOIN employees e ON e.id = f.employee_id
+                        LEFT JOIN teams t ON f.team_id = t.id
+                        LEFT JOIN sections s ON f.section_id = s.id
+                        LEFT JOIN departments d ON f.department_id = d.id
+                        LEFT JOIN service_types srv ON e.service_type_id = srv.id
+                        LEFT JOIN status_types sti ON f.status_type_id = sti.id
+                        WHERE f.fact_date BETWEEN %s AND %s
+                        AND e.is_active = TRUE AND e.id != %s {scoping_clause}
+                    ) st ON st.fact_date = p.fact_date
+                    GROUP BY p.fact_date
+                    ORDER BY p.fact_date ASC
+                """
+                final_params = (
+                    date_params + [days - 1, window_start, window_end, userId] + scoping_params
+                )
+                cur.execute(query, tuple(final_params))
+                return cur.fetchall()
+
+            table_source = AttendanceModel._get_log_source(
+                requesting_user.get("id") if requesting_user else None,
+                window_start,
+                requesting_user=requesting_user,
+                end_val=window_end,
+            )
             query = f"""
                 WITH params AS (
                     SELECT {date_anchor} - (n || ' days')::interval as date
@@ -1005,16 +1146,10 @@ class AttendanceModel:
                         FROM scoped_employees se
                         LEFT JOIN LATERAL (
                             SELECT st.is_presence, st.id
-                            FROM (
-                                SELECT id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at FROM attendance_logs
-                                UNION ALL
-                                SELECT id, employee_id, status_type_id, start_datetime, end_datetime, note, reported_by, created_at, is_verified, verified_at FROM attendance_logs_archive
-                            ) al
+                            FROM {table_source} al
                             JOIN status_types st ON al.status_type_id = st.id
                             WHERE al.employee_id = se.id
-                                AND DATE(al.start_datetime) <= p.date 
-                                AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= p.date)
-                                AND (st.is_persistent = TRUE OR DATE(al.start_datetime) = p.date)
+                                AND {active_on_day("p.date")}
                                 ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
                         ) st ON true
                         WHERE {count_condition}
@@ -1023,7 +1158,6 @@ class AttendanceModel:
                 ORDER BY p.date ASC
             """
 
-            userId = requesting_user["id"] if requesting_user else -1
             final_params = (
                 date_params + [days - 1] + [userId] + scoping_params
             )
@@ -1033,44 +1167,68 @@ class AttendanceModel:
             conn.close()
 
     @staticmethod
-    def get_dashboard_stats(requesting_user=None, filters=None):
+    def get_dashboard_stats(requesting_user=None, filters=None, comparison=None):
+        """
+        Dashboard figures for the requester (status breakdown, units, ages, total).
+        comparison={"status_id": ...} also returns the single-day peer comparison
+        (what get_unit_comparison_stats computes without unit drill-down) from the
+        same rollup, as result["comparison"].
+        Served from the stats cache; writers bump the data version of their scope.
+        """
+        target_date = (filters or {}).get("date") or date.today().strftime("%Y-%m-%d")
+
+        # Per-user grant, resolved outside the cache: it picks the log source, so it is part of the key
+        has_archive_access = False
+        requesting_user_id = requesting_user.get("id") if requesting_user else None
+        if requesting_user_id:
+            from app.models.archive_model import ArchiveModel
+            has_archive_access = ArchiveModel.check_access(requesting_user_id, target_date)
+
+        result = cached_result(
+            "dashboard_stats",
+            requesting_user,
+            {
+                **(filters or {}),
+                "date": target_date,
+                "archive_access": has_archive_access,
+                "comparison": comparison,
+            },
+            lambda: AttendanceModel._compute_dashboard_stats(requesting_user, filters, target_date, comparison),
+        )
+        if result is None:
+            return {"stats": [], "total_employees": 0}
+        return {**result, "has_archive_access": has_archive_access}
+
+    @staticmethod
+    def _compute_dashboard_stats(requesting_user, filters, target_date, comparison=None):
         conn = get_db_connection()
         if not conn:
-            return {"stats": [], "total_employees": 0}
+            return None
         try:
             cur = conn.cursor(cursor_factory=RealDictCursor)
 
-            target_date = (filters or {}).get("date") or date.today().strftime("%Y-%m-%d")
-
             # Build scoping conditions dynamically
             scope_conditions = ["e.is_active = TRUE", "e.username != 'admin'"]
+            unit_conditions = []
+            age_conditions = []
             scope_params = {"target_date": target_date}
 
             # 1. Base Scoping (Security)
-            if requesting_user and not requesting_user.get("is_admin"):
-                if requesting_user.get("commands_department_id"):
-                    scope_conditions.append("(d.id = %(cmd_dept_id)s OR d_dir.id = %(cmd_dept_id)s)")
-                    scope_params["cmd_dept_id"] = requesting_user["commands_department_id"]
-                elif requesting_user.get("commands_section_id"):
-                    scope_conditions.append("(s.id = %(cmd_sec_id)s OR s_dir.id = %(cmd_sec_id)s)")
-                    scope_params["cmd_sec_id"] = requesting_user["commands_section_id"]
-                elif requesting_user.get("commands_team_id"):
-                    scope_conditions.append("t.id = %(cmd_team_id)s")
-                    scope_params["cmd_team_id"] = requesting_user["commands_team_id"]
-                else:
-                    scope_conditions.append("e.id = %(cmd_user_id)s")
-                    scope_params["cmd_user_id"] = requesting_user["id"]
+            scope_ids = employees_in_scope(requesting_user)
+            if scope_ids is not None:
+                scope_conditions.append("e.id = ANY(%(scope_ids)s)")
+                scope_params["scope_ids"] = scope_ids
 
             # 2. Drill-down Filters (User Selection)
             if filters:
                 if filters.get("department_id"):
-                    scope_conditions.append("(d.id = %(f_dept_id)s OR d_dir.id = %(f_dept_id)s)")
+                    unit_conditions.append("(d.id = %(f_dept_id)s OR d_dir.id = %(f_dept_id)s)")
                     scope_params["f_dept_id"] = filters["department_id"]
                 if filters.get("section_id"):
-                    scope_conditions.append("(s.id = %(f_sec_id)s OR s_dir.id = %(f_sec_id)s)")
+                    unit_conditions.append("(s.id = %(f_sec_id)s OR s_dir.id = %(f_sec_id)s)")
                     scope_params["f_sec_id"] = filters["section_id"]
                 if filters.get("team_id"):
-                    scope_conditions.append("t.id = %(f_team_id)s")
+                    unit_conditions.append("t.id = %(f_team_id)s")
                     scope_params["f_team_id"] = filters["team_id"]
                 if filters.get("serviceTypes"):
                     srv_list = (
@@ -1080,11 +1238,12 @@ class AttendanceModel:
                     )
                     scope_conditions.append("srv.name = ANY(%(srv_list)s)")
                     scope_params["srv_list"] = srv_list
+                # Age filters only flag rows: the age histogram keeps every column visible
                 if filters.get("min_age"):
-                    scope_conditions.append("EXTRACT(YEAR FROM AGE(CURRENT_DATE, e.birth_date)) >= %(min_age)s")
+                    age_conditions.append("EXTRACT(YEAR FROM AGE(CURRENT_DATE, e.birth_date)) >= %(min_age)s")
                     scope_params["min_age"] = int(filters["min_age"])
                 if filters.get("max_age"):
-                    scope_conditions.append("EXTRACT(YEAR FROM AGE(CURRENT_DATE, e.birth_date)) <= %(max_age)s")
+                    age_conditions.append("EXTRACT(YEAR FROM AGE(CURRENT_DATE, e.birth_date)) <= %(max_age)s")
                     scope_params["max_age"] = int(filters["max_age"])
 
             # Exclude requesting user (Commander/Admin) from stats
@@ -1092,33 +1251,52 @@ class AttendanceModel:
                 scope_conditions.append("e.id != %(req_user_id)s")
                 scope_params["req_user_id"] = requesting_user["id"]
 
+            # Drill-down narrows the scope, unless the comparison (which ignores it) shares the pass
+            if comparison is None:
+                scope_conditions.extend(unit_conditions)
+                unit_conditions = []
+
             scope_where = " AND ".join(scope_conditions)
+            unit_where = " AND ".join(unit_conditions) or "TRUE"
+            age_where = " AND ".join(age_conditions) or "TRUE"
+
+            # Peer comparison: grouping level, status family and commander exclusion
+            comparison_level = None
+            family_sql = "st.is_presence = TRUE"
+            comparison_sets = ""
+            comparison_columns = ""
+            comparison_grouping = ""
+            if comparison is not None:
+                comparison_level = AttendanceModel._comparison_level(requesting_user)
+                if comparison.get("status_id"):
+                    family_sql = status_family_sql(int(comparison["status_id"]))
+                if comparison_level == "employee":
+                    comparison_sets = ",\n                    (id, employee_name)"
+                    comparison_columns = "id as employee_id, employee_name,"
+                    comparison_grouping = "WHEN GROUPING(id) = 0 THEN 'employee'"
 
             requesting_user_id = requesting_user.get("id") if requesting_user else None
             table_source = AttendanceModel._get_log_source(requesting_user_id, target_date, requesting_user=requesting_user)
 
-            query = f"""
-                WITH scoped_employees AS (
-                    SELECT e.id
-                    FROM employees e
-                    LEFT JOIN teams t ON e.team_id = t.id
-                    LEFT JOIN sections s ON t.section_id = s.id
-                    LEFT JOIN departments d ON s.department_id = d.id
-                    LEFT JOIN sections s_dir ON e.section_id = s_dir.id
-                    LEFT JOIN departments d_dir ON e.department_id = d_dir.id
-                    LEFT JOIN service_types srv ON e.service_type_id = srv.id
-                    WHERE {scope_where}
-                ),
-                employee_status AS (
+            if is_today(target_date):
+                # Today: read the maintained current-status projection (no per-employee LATERAL)
+                ensure_current_status_fresh()
+                employee_status_sql = f"""
+                    SELECT
+                        se.id as emp_id,
+                        last_log.status_type_id,
+                        last_log.is_verified,
+                        last_log.note
+                    FROM scoped_employees se
+                    {current_status_join(alias="last_log", employee_ref="se.id")}
+                """
+            else:
+                employee_status_sql = f"""
                     SELECT
                         se.id as emp_id,
                         (CASE 
                             WHEN last_log.status_type_id IS NOT NULL 
-                                 AND (
-                                     (last_log.end_datetime IS NOT NULL AND DATE(last_log.end_datetime) >= %(target_date)s)
-                                     OR 
-                                     (last_log.end_datetime IS NULL AND (last_log.is_persistent = TRUE OR DATE(last_log.start_datetime) = %(target_date)s))
-                                 ) 
+                                 AND {continuity_clause("%(target_date)s", log="last_log", status="last_log")}
                             THEN last_log.status_type_id 
                             ELSE NULL 
                         END) as status_type_id,
@@ -1130,108 +1308,119 @@ class AttendanceModel:
                         FROM {table_source} al
                         JOIN status_types sti ON al.status_type_id = sti.id
                         WHERE al.employee_id = se.id
-                        AND DATE(al.start_datetime) <= %(target_date)s
+                        AND {starts_on_or_before("%(target_date)s")}
                         ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
                     ) last_log ON true
-                )
-                SELECT
-                    st.id as status_id,
-                    (CASE WHEN st.name = 'אחר' THEN COALESCE(NULLIF(es.note, ''), 'אחר') ELSE st.name END) as status_name,
-                    COUNT(es.emp_id) as count,
-                    COUNT(CASE WHEN es.is_verified = FALSE THEN 1 END) as unverified_count,
-                    st.color as color
-                FROM employee_status es
-                JOIN status_types st ON es.status_type_id = st.id
-                GROUP BY st.id, (CASE WHEN st.name = 'אחר' THEN COALESCE(NULLIF(es.note, ''), 'אחר') ELSE st.name END), st.color
-                UNION ALL
-                SELECT
-                    NULL as status_id,
-                    'לא דווח' as status_name,
-                    COUNT(es.emp_id) as count,
-                    0 as unverified_count,
-                    '#94a3b8' as color
-                FROM employee_status es
-                WHERE es.status_type_id IS NULL
-                HAVING COUNT(es.emp_id) > 0
-                ORDER BY count DESC
-            """
-
-            total_query = f"""
-                SELECT COUNT(e.id) as total
-                FROM employees e
-                LEFT JOIN teams t ON e.team_id = t.id
-                LEFT JOIN sections s ON t.section_id = s.id
-                LEFT JOIN departments d ON s.department_id = d.id
-                LEFT JOIN sections s_dir ON e.section_id = s_dir.id
-                LEFT JOIN departments d_dir ON e.department_id = d_dir.id
-                LEFT JOIN service_types srv ON e.service_type_id = srv.id
-                WHERE {scope_where}
-            """
-
-            # Special scope for Age Distribution: Ignore age filters so all columns stay visible
-            age_scope_conditions = [c for c in scope_conditions if "AGE(" not in c]
-            age_scope_where = " AND ".join(age_scope_conditions)
+                """
 
-            age_query = f"""
-                WITH scoped_ages AS (
-                    SELECT 
-                        EXTRACT(YEAR FROM AGE(CURRENT_DATE, e.birth_date)) as age
+            query = f"""
+                WITH scoped_employees AS (
+                    SELECT e.id,
+                           t.id as team_id, t.name as team_name,
+                           COALESCE(s.id, s_dir.id) as section_id,
+                           COALESCE(s.name, s_dir.name) as section_name,
+                           COALESCE(d.id, d_s_dir.id, d_dir.id) as department_id,
+                           COALESCE(d.name, d_s_dir.name, d_dir.name) as department_name,
+                           e.first_name || ' ' || e.last_name as employee_name,
+                           EXTRACT(YEAR FROM AGE(CURRENT_DATE, e.birth_date)) as age,
+                           ({age_where}) as in_age_range,
+                           ({unit_where}) as in_units,
+                           e.id IN (
+                               SELECT commander_id FROM departments WHERE commander_id IS NOT NULL
+                               UNION
+                               SELECT commander_id FROM sections WHERE commander_id IS NOT NULL
+                           ) as is_commander
                     FROM employees e
                     LEFT JOIN teams t ON e.team_id = t.id
                     LEFT JOIN sections s ON t.section_id = s.id
                     LEFT JOIN departments d ON s.department_id = d.id
                     LEFT JOIN sections s_dir ON e.section_id = s_dir.id
+                    LEFT JOIN departments d_s_dir ON s_dir.department_id = d_s_dir.id
                     LEFT JOIN departments d_dir ON e.department_id = d_dir.id
                     LEFT JOIN service_types srv ON e.service_type_id = srv.id
-                    WHERE {age_scope_where} AND e.birth_date IS NOT NULL
+                    WHERE {scope_where}
                 ),
-                age_ranges AS (
-                    SELECT 
-                        CASE 
-                            WHEN age BETWEEN 18 AND 21 THEN '18-21'
-                            WHEN age BETWEEN 22 AND 25 THEN '22-25'
-                            WHEN age BETWEEN 26 AND 30 THEN '26-30'
-                            WHEN age BETWEEN 31 AND 35 THEN '31-35'
-                            WHEN age BETWEEN 36 AND 40 THEN '36-40'
-                            WHEN age BETWEEN 41 AND 50 THEN '41-50'
+                employee_status AS (
+                    {employee_status_sql}
+                ),
+                cells AS (
+                    SELECT
+                        se.*,
+                        es.status_type_id,
+                        es.is_verified,
+                        st.is_presence,
+                        (CASE
+                            WHEN st.id IS NULL THEN 'לא דווח'
+                            WHEN st.name = 'אחר' THEN COALESCE(NULLIF(es.note, ''), 'אחר')
+                            ELSE st.name
+                        END) as status_name,
+                        COALESCE(st.color, '#94a3b8') as status_color,
+                        COALESCE({family_sql}, FALSE) as in_family,
+                        (CASE
+                            WHEN se.age IS NULL THEN NULL
+                            WHEN se.age BETWEEN 18 AND 21 THEN '18-21'
+                            WHEN se.age BETWEEN 22 AND 25 THEN '22-25'
+                            WHEN se.age BETWEEN 26 AND 30 THEN '26-30'
+                            WHEN se.age BETWEEN 31 AND 35 THEN '31-35'
+                            WHEN se.age BETWEEN 36 AND 40 THEN '36-40'
+                            WHEN se.age BETWEEN 41 AND 50 THEN '41-50'
                             ELSE '50+'
-                        END as range_label,
-                        age
-                    FROM scoped_ages
+                        END) as age_range
+                    FROM scoped_employees se
+                    JOIN employee_status es ON es.emp_id = se.id
+                    LEFT JOIN status_types st ON es.status_type_id = st.id
+                )
+                SELECT
+                    (CASE
+                        WHEN GROUPING(status_type_id) = 0 THEN 'status'
+                        {comparison_grouping}
+                        WHEN GROUPING(team_id) = 0 THEN 'team'
+                        WHEN GROUPING(section_id) = 0 THEN 'section'
+                        WHEN GROUPING(department_id) = 0 THEN 'department'
+                        WHEN GROUPING(age_range) = 0 THEN 'age'
+                        ELSE 'total'
+                    END) as grouping_level,
+                    status_type_id, status_name, status_color,
+                    department_id, department_name,
+                    section_id, section_name,
+                    team_id, team_name,
+                    {comparison_columns}
+                    age_range,
+                    -- Status / unit / total figures honour the age filter; the age histogram does not.
+                    -- All of them honour the unit drill-down.
+                    COUNT(*) FILTER (WHERE in_age_range AND in_units) as count,
+                    COUNT(*) FILTER (WHERE in_age_range AND in_units AND status_type_id IS NOT NULL AND is_verified = FALSE) as unverified_count,
+                    COUNT(*) FILTER (WHERE in_age_range AND in_units AND is_presence = TRUE) as present_count,
+                    COUNT(*) FILTER (WHERE in_age_range AND in_units AND is_presence = FALSE) as absent_count,
+                    COUNT(*) FILTER (WHERE in_age_range AND in_units AND status_type_id IS NULL) as unknown_count,
+                    COUNT(age) FILTER (WHERE in_units) as age_count,
+                    ROUND(AVG(age) FILTER (WHERE in_units), 1) as avg_age,
+                    -- Peer comparison: no age / unit filter, commanders left out, status family counted
+                    COUNT(*) FILTER (WHERE NOT is_commander) as cmp_total_count,
+                    COUNT(*) FILTER (WHERE NOT is_commander AND in_family) as cmp_present_count,
+                    COUNT(*) FILTER (WHERE NOT is_commander AND is_presence = FALSE) as cmp_absent_count,
+                    COUNT(*) FILTER (WHERE NOT is_commander AND status_type_id IS NULL) as cmp_unknown_count
+                FROM cells
+                GROUP BY GROUPING SETS (
+                    (status_type_id, status_name, status_color),
+                    (department_id, department_name),
+                    (department_id, section_id, section_name),
+                    (section_id, team_id, team_name),
+                    (age_range),
+                    (){comparison_sets}
                 )
-                SELECT 
-                    range_label,
-                    COUNT(*) as count,
-                    (SELECT ROUND(AVG(age), 1) FROM scoped_ages) as avg_age
-                FROM age_ranges
-                GROUP BY range_label
-                ORDER BY range_label
             """
 
             try:
+                # One pass: status breakdown, every org level, age histogram, total (and comparison)
                 cur.execute(query, scope_params)
-                stats = cur.fetchall()
-                cur.execute(total_query, scope_params)
-                total_row = cur.fetchone()
-                total_employees = total_row["total"] if total_row else 0
-
-                cur.execute(age_query, scope_params)
-                age_data = cur.fetchall()
-                avg_age = age_data[0]["avg_age"] if age_data else 0
-                age_distribution = [{"range": r["range_label"], "count": r["count"]} for r in age_data]
-
-                # Check for archive access
-                has_archive_access = False
-                if requesting_user_id and target_date:
-                    from app.models.archive_model import ArchiveModel
-                    has_archive_access = ArchiveModel.check_access(requesting_user_id, target_date)
+                rows = cur.fetchall()
+                rollup = AttendanceModel._split_dashboard_rollup(rows)
+                if comparison_level is not None:
+                    rollup["comparison"] = AttendanceModel._comparison_from_rollup(rows, comparison_level)
 
                 return {
-                    "stats": stats,
-                    "total_employees": total_employees,
-                    "age_distribution": age_distribution,
-                    "average_age": avg_age,
-                    "has_archive_access": has_archive_access,
+                    **rollup,
                     "table_source": table_source
                 }
             except Exception as e:
@@ -1242,6 +1431,95 @@ class AttendanceModel:
         finally:
             conn.close()
 
+    @staticmethod
+    def _comparison_level(requesting_user):
+        """Peer level get_unit_comparison_stats groups by when there is no unit drill-down."""
+        if requesting_user and not requesting_user.get("is_admin"):
+            if requesting_user.get("commands_department_id"):
+                return "section"
+            if requesting_user.get("commands_section_id"):
+                return "team"
+            if requesting_user.get("commands_team_id"):
+                return "employee"
+        return "department"
+
+    @staticmethod
+    def _comparison_from_rollup(rows, level):
+        """Single-day unit comparison rows (get_unit_comparison_stats shape) from the dashboard rollup."""
+        id_column, name_column = (
+            ("employee_id", "employee_name") if level == "employee" else (f"{level}_id", f"{level}_name")
+        )
+        results = [
+            {
+                "unit_id": r[id_column],
+                "unit_name": r[name_column] or "ללא שיוך",
+                "total_count": r["cmp_total_count"],
+                "present_count": r["cmp_present_count"],
+                "absent_count": r["cmp_absent_count"],
+                "unknown_count": r["cmp_unknown_count"],
+                "level": level,
+            }
+            for r in rows
+            if r["grouping_level"] == level and r[id_column] is not None and r["cmp_total_count"] > 0
+        ]
+        results.sort(key=lambda x: x["unit_name"])
+        return results
+
+    @staticmethod
+    def _split_dashboard_rollup(rows):
+        """Splits the GROUPING SETS result of the dashboard query into its sections."""
+        stats = []
+        units = {"department": [], "section": [], "team": []}
+        age_distribution = []
+        total_employees = 0
+        avg_age = 0
+        parent_of = {"department": None, "section": "department_id", "team": "section_id"}
+
+        for r in rows:
+            level = r["grouping_level"]
+            if level == "status":
+                if r["count"] > 0:
+                    stats.append({
+                        "status_id": r["status_type_id"],
+                        "status_name": r["status_name"],
+                        "count": r["count"],
+                        "unverified_count": r["unverified_count"],
+                        "color": r["status_color"],
+                    })
+            elif level in units:
+                unit_id = r[f"{level}_id"]
+                if unit_id is None or r["count"] == 0:
+                    continue
+                units[level].append({
+                    "unit_id": unit_id,
+                    "unit_name": r[f"{level}_name"],
+                    "parent_id": r[parent_of[level]] if parent_of[level] else None,
+                    "level": level,
+                    "total_count": r["count"],
+                    "present_count": r["present_count"],
+                    "absent_count": r["absent_count"],
+                    "unknown_count": r["unknown_count"],
+                })
+            elif level == "age":
+                if r["age_range"] is not None:
+                    age_distribution.append({"range": r["age_range"], "count": r["age_count"]})
+            elif level == "total":
+                total_employees = r["count"]
+                avg_age = r["avg_age"] if r["avg_age"] is not None else 0
+
+        stats.sort(key=lambda x: x["count"], reverse=True)
+        age_distribution.sort(key=lambda x: x["range"])
+        for level_units in units.values():
+            level_units.sort(key=lambda x: x["unit_name"] or "")
+
+        return {
+            "stats": stats,
+            "total_employees": total_employees,
+            "age_distribution": age_distribution,
+            "average_age": avg_age,
+            "units": units,
+        }
+
     @staticmethod
     def get_birthdays(requesting_user=None, selected_date=None):
         conn = get_db_connection()
@@ -1260,26 +1538,14 @@ class AttendanceModel:
                     DATE_PART('day', e.birth_date) as day,
                     DATE_PART('month', e.birth_date) as month
                 FROM employees e
-                LEFT JOIN teams t ON e.team_id = t.id
-                LEFT JOIN sections s ON (t.section_id = s.id OR e.section_id = s.id)
-                LEFT JOIN departments d ON (s.department_id = d.id OR e.department_id = d.id)
                 WHERE e.is_active = TRUE AND e.birth_date IS NOT NULL AND e.username != 'admin'
             """
             params = []
 
-            if requesting_user and not requesting_user.get("is_admin"):
-                if requesting_user.get("commands_department_id"):
-                    query += " AND d.id = %s"
-                    params.append(requesting_user["commands_department_id"])
-                elif requesting_user.get("commands_section_id"):
-                    query += " AND s.id = %s"
-                    params.append(requesting_user["commands_section_id"])
-                elif requesting_user.get("commands_team_id"):
-                    query += " AND t.id = %s"
-                    params.append(requesting_user["commands_team_id"])
-                else:
-                    query += " AND e.id = %s"
-                    params.append(requesting_user["id"])
+            scope_ids = employees_in_scope(requesting_user)
+            if scope_ids is not None:
+                query += " AND e.id = ANY(%s)"
+                params.append(scope_ids)
 
             # Exclude requesting user from birthdays
             req_user_id = requesting_user.get("id") if requesting_user else -1
@@ -1360,6 +1626,37 @@ class AttendanceModel:
         finally:
             conn.close()
 
+    @staticmethod
+    def _roster_logs_query(employee_ids, start_date, end_date, requesting_user_id=None):
+        # Align Roster logs with Smart Continuity:
+        # Only show logs that actually manifest on those dates.
+        # 1. Started on or before the end of the range
+        # 2. Ends on or after the start of the range (or is ongoing)
+        # 3. If NOT persistent, must have started on one of the days in the range
+        # Instead of a complex multi-join for each day, we fetch logs that meet basic Smart Continuity
+        # criteria for the WHOLE range.
+        table_source = AttendanceModel._get_log_source(requesting_user_id, start_date, end_val=end_date)
+        query = f"""
+            SELECT 
+                al.id as log_id,
+                al.employee_id,
+                al.status_type_id,
+                CASE WHEN st.name = 'אחר' THEN COALESCE(NULLIF(al.note, ''), st.name) ELSE st.name END as status_name,
+                st.color as status_color,
+                st.is_persistent,
+                al.start_datetime,
+                al.end_datetime,
+                al.is_verified
+            FROM {table_source} al
+            JOIN status_types st ON al.status_type_id = st.id
+            WHERE al.employee_id = ANY(%s)
+            AND {starts_on_or_before("%s")}
+            AND {open_or_ends_on_or_after("%s")}
+            AND (st.is_persistent = TRUE OR ({starts_on_or_after("%s")} AND {starts_on_or_before("%s")}))
+            ORDER BY al.start_datetime ASC, al.id ASC
+        """
+        return query, (list(employee_ids), end_date, start_date, start_date, end_date)
+
     @staticmethod
     def get_logs_for_employees(employee_ids, start_date, end_date, requesting_user_id=None):
         conn = get_db_connection()
@@ -1367,38 +1664,87 @@ class AttendanceModel:
             return []
         try:
             cur = conn.cursor(cursor_factory=RealDictCursor)
-            # Align Roster logs with Smart Continuity:
-            # Only show logs that actually manifest on those dates.
-            # 1. Started on or before the end of the range
-            # 2. Ends on or after the start of the range (or is ongoing)
-            # 3. If NOT persistent, must have started on one of the days in the range
-            # Instead of a complex multi-join for each day, we fetch logs that meet basic Smart Continuity
-            # criteria for the WHOLE range.
-            table_source = AttendanceModel._get_log_source(requesting_user_id, start_date)
-            query = f"""
+            query, params = AttendanceModel._roster_logs_query(
+                employee_ids, start_date, end_date, requesting_user_id
+            )
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def iter_logs_for_employees(employee_ids, start_date, end_date, requesting_user_id=None):
+        """Same rows as get_logs_for_employees, streamed from a server-side cursor."""
+        query, params = AttendanceModel._roster_logs_query(
+            employee_ids, start_date, end_date, requesting_user_id
+        )
+        return stream_query(query, params)
+
+    @staticmethod
+    def _history_export_query(employee_id, start_date=None, end_date=None):
+        query = """
+            WITH marked_changes AS (
                 SELECT 
-                    al.id as log_id,
-                    al.employee_id,
+                    al.id,
                     al.status_type_id,
-                    CASE WHEN st.name = 'אחר' THEN COALESCE(NULLIF(al.note, ''), st.name) ELSE st.name END as status_name,
-                    st.color as status_color,
                     al.start_datetime,
                     al.end_datetime,
-                    al.is_verified
-                FROM {table_source} al
-                JOIN status_types st ON al.status_type_id = st.id
-                WHERE al.employee_id = ANY(%s)
-                AND DATE(al.start_datetime) <= %s 
-                AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= %s)
-                AND (st.is_persistent = TRUE OR (DATE(al.start_datetime) >= %s AND DATE(al.start_datetime) <= %s))
-                ORDER BY al.start_datetime ASC
-            """
-            cur.execute(
-                query, (list(employee_ids), end_date, start_date, start_date, end_date)
+                    al.note,
+                    al.reported_by,
+                    CASE 
+                        WHEN LAG(al.status_type_id) OVER (ORDER BY al.start_datetime) = al.status_type_id THEN 0 
+                        ELSE 1 
+                    END as is_new_group
+                FROM attendance_logs al
+                WHERE al.employee_id = %s
+            ),
+            grouped_logs AS (
+                SELECT 
+                    *,
+                    SUM(is_new_group) OVER (ORDER BY start_datetime) as group_id
+                FROM marked_changes
+            ),
+            aggregated_history AS (
+                SELECT 
+                    MIN(gl.id) as id,
+                    CASE WHEN st.name = 'אחר' THEN COALESCE(NULLIF((ARRAY_AGG(gl.note ORDER BY gl.start_datetime))[1], ''), st.name) ELSE st.name END as status_name,
+                    st.color as status_color,
+                    MIN(gl.start_datetime) as start_datetime,
+                    CASE 
+                        WHEN BOOL_OR(gl.end_datetime IS NULL) THEN NULL 
+                        ELSE MAX(gl.end_datetime) 
+                    END as end_datetime,
+                    (ARRAY_AGG(gl.note ORDER BY gl.start_datetime))[1] as note,
+                    (ARRAY_AGG(gl.reported_by ORDER BY gl.start_datetime))[1] as reported_by_id
+                FROM grouped_logs gl
+                JOIN status_types st ON gl.status_type_id = st.id
+                GROUP BY gl.group_id, st.id, st.name, st.color
             )
-            return cur.fetchall()
-        finally:
-            conn.close()
+            SELECT 
+                ah.id,
+                ah.status_name,
+                ah.start_datetime,
+                ah.end_datetime,
+                ah.note,
+                r.first_name || ' ' || r.last_name as reported_by_name
+            FROM aggregated_history ah
+            LEFT JOIN employees r ON ah.reported_by_id = r.id
+            WHERE 1=1
+        """
+
+        params = [employee_id]
+
+        if start_date:
+            query += f" AND {starts_on_or_after('%s', log='ah')}"
+            params.append(start_date)
+
+        if end_date:
+            query += f" AND {starts_on_or_before('%s', log='ah')}"
+            params.append(end_date)
+
+        query += " ORDER BY ah.start_datetime DESC"
+
+        return query, tuple(params)
 
     @staticmethod
     def get_employee_history_export(employee_id, start_date=None, end_date=None):
@@ -1407,73 +1753,22 @@ class AttendanceModel:
             return []
         try:
             cur = conn.cursor(cursor_factory=RealDictCursor)
-            query = """
-                WITH marked_changes AS (
-                    SELECT 
-                        al.id,
-                        al.status_type_id,
-                        al.start_datetime,
-                        al.end_datetime,
-                        al.note,
-                        al.reported_by,
-                        CASE 
-                            WHEN LAG(al.status_type_id) OVER (ORDER BY al.start_datetime) = al.status_type_id THEN 0 
-                            ELSE 1 
-                        END as is_new_group
-                    FROM attendance_logs al
-                    WHERE al.employee_id = %s
-                ),
-                grouped_logs AS (
-                    SELECT 
-                        *,
-                        SUM(is_new_group) OVER (ORDER BY start_datetime) as group_id
-                    FROM marked_changes
-                ),
-                aggregated_history AS (
-                    SELECT 
-                        MIN(gl.id) as id,
-                        CASE WHEN st.name = 'אחר' THEN COALESCE(NULLIF((ARRAY_AGG(gl.note ORDER BY gl.start_datetime))[1], ''), st.name) ELSE st.name END as status_name,
-                        st.color as status_color,
-                        MIN(gl.start_datetime) as start_datetime,
-                        CASE 
-                            WHEN BOOL_OR(gl.end_datetime IS NULL) THEN NULL 
-                            ELSE MAX(gl.end_datetime) 
-                        END as end_datetime,
-                        (ARRAY_AGG(gl.note ORDER BY gl.start_datetime))[1] as note,
-                        (ARRAY_AGG(gl.reported_by ORDER BY gl.start_datetime))[1] as reported_by_id
-                    FROM grouped_logs gl
-                    JOIN status_types st ON gl.status_type_id = st.id
-                    GROUP BY gl.group_id, st.id, st.name, st.color
-                )
-                SELECT 
-                    ah.id,
-                    ah.status_name,
-                    ah.start_datetime,
-                    ah.end_datetime,
-                    ah.note,
-                    r.first_name || ' ' || r.last_name as reported_by_name
-                FROM aggregated_history ah
-                LEFT JOIN employees r ON ah.reported_by_id = r.id
-                WHERE 1=1
-            """
-
-            params = [employee_id]
-
-            if start_date:
-                query += " AND DATE(ah.start_datetime) >= %s"
-                params.append(start_date)
-
-            if end_date:
-                query += " AND DATE(ah.start_datetime) <= %s"
-                params.append(end_date)
-
-            query += " ORDER BY ah.start_datetime DESC"
-
-            cur.execute(query, tuple(params))
+            query, params = AttendanceModel._history_export_query(
+                employee_id, start_date, end_date
+            )
+            cur.execute(query, params)
             return cur.fetchall()
         finally:
             conn.close()
 
+    @staticmethod
+    def iter_employee_history_export(employee_id, start_date=None, end_date=None):
+        """Same rows as get_employee_history_export, streamed from a server-side cursor."""
+        query, params = AttendanceModel._history_export_query(
+            employee_id, start_date, end_date
+        )
+        return stream_query(query, params)
+
     @staticmethod
     def get_daily_attendance_log(date, requesting_user=None, filters=None):
         conn = get_db_connection()
@@ -1486,7 +1781,23 @@ class AttendanceModel:
             # "Status active on that date"
             # We want BOTH verified and unverified (planned) logs to show up here,
             # so the daily attendance view reflects the Roster planning.
-            params.extend([date, date, date])
+            if is_today(date):
+                ensure_current_status_fresh()
+                status_join = current_status_join(alias="last_log")
+            else:
+                params.extend([date, date, date])
+                status_join = f"""LEFT JOIN LATERAL (
+                    SELECT al.status_type_id, al.start_datetime, al.end_datetime, al.note,
+                           (CASE WHEN al.status_type_id IS NOT NULL
+                                      AND {continuity_clause("%s", status="sti")}
+                                 THEN TRUE
+                                 ELSE FALSE
+                           END) as is_active_for_date
+                    FROM attendance_logs al
+                    JOIN status_types sti ON al.status_type_id = sti.id
+                    WHERE al.employee_id = e.id AND {starts_on_or_before("%s")}
+                    ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
+                ) last_log ON last_log.is_active_for_date = TRUE"""
 
             query = f"""
                 SELECT 
@@ -1506,41 +1817,17 @@ class AttendanceModel:
                 LEFT JOIN sections s ON (t.section_id = s.id OR e.section_id = s.id)
                 LEFT JOIN departments d ON (s.department_id = d.id OR e.department_id = d.id)
                 LEFT JOIN service_types srv ON e.service_type_id = srv.id
-                LEFT JOIN LATERAL (
-                    SELECT al.status_type_id, al.start_datetime, al.end_datetime, al.note,
-                           (CASE WHEN al.status_type_id IS NOT NULL
-                                      AND (
-                                        (al.end_datetime IS NOT NULL AND DATE(al.end_datetime) >= %s)
-                                        OR
-                                        (al.end_datetime IS NULL AND (sti.is_persistent = TRUE OR DATE(al.start_datetime) = %s))
-                                      )
-                                 THEN TRUE
-                                 ELSE FALSE
-                           END) as is_active_for_date
-                    FROM attendance_logs al
-                    JOIN status_types sti ON al.status_type_id = sti.id
-                    WHERE al.employee_id = e.id AND DATE(al.start_datetime) <= %s
-                    ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
-                ) last_log ON last_log.is_active_for_date = TRUE
+                {status_join}
                 LEFT JOIN status_types st ON last_log.status_type_id = st.id
                 WHERE e.is_active = TRUE AND e.username != 'admin'
             """
 
             # 1. Base Scoping (Security)
-            if requesting_user and not requesting_user.get("is_admin"):
-                if requesting_user.get("commands_department_id"):
-                    query += " AND d.id = %s"
-                    params.append(int(requesting_user["commands_department_id"]))
-                elif requesting_user.get("commands_section_id"):
-                    query += " AND s.id = %s"
-                    params.append(int(requesting_user["commands_section_id"]))
-                elif requesting_user.get("commands_team_id"):
-                    query += " AND t.id = %s"
-                    params.append(int(requesting_user["commands_team_id"]))
-                else:
-                    # Individual Fallback
-                    query += " AND e.id = %s"
-                    params.append(int(requesting_user["id"]))
+            scope_ids = employees_in_scope(requesting_user)
+            if scope_ids is not None:
+                # Unit members from the org hierarchy (individual fallback: self)
+                query += " AND e.id = ANY(%s)"
+                params.append(scope_ids)
 
             # 2. Drill-down Filters (User Selection)
             if filters:
@@ -1,4 +1,4 @@
-from app.utils.db import get_db_connection
+from app.utils.db import get_db_connection, stream_query
 from psycopg2.extras import RealDictCursor, Json
 import datetime
 
@@ -70,6 +70,37 @@ class AuditLogModel:
         finally:
             conn.close()
 
+    @staticmethod
+    def _recent_activity_query(limit=100, filters=None):
+        where_clauses = []
+        params = []
+
+        if filters:
+            if filters.get("user_id"):
+                where_clauses.append("al.user_id = %s")
+                params.append(filters.get("user_id"))
+            if filters.get("action_type"):
+                where_clauses.append("al.action_type = %s")
+                params.append(filters.get("action_type"))
+
+        where_str = (
+            " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        )
+
+        query = f"""
+            SELECT al.*, 
+                   e.first_name || ' ' || e.last_name as user_name,
+                   t.first_name || ' ' || t.last_name as target_name
+            FROM audit_logs al
+            LEFT JOIN employees e ON al.user_id = e.id
+            LEFT JOIN employees t ON al.target_id = t.id
+            {where_str}
+            ORDER BY al.created_at DESC
+            LIMIT %s
+        """
+        params.append(limit)
+        return query, tuple(params)
+
     @staticmethod
     def get_recent_activity(limit=100, filters=None):
         # Admin view: see all activity
@@ -78,38 +109,18 @@ class AuditLogModel:
             return []
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                where_clauses = []
-                params = []
-
-                if filters:
-                    if filters.get("user_id"):
-                        where_clauses.append("al.user_id = %s")
-                        params.append(filters.get("user_id"))
-                    if filters.get("action_type"):
-                        where_clauses.append("al.action_type = %s")
-                        params.append(filters.get("action_type"))
-
-                where_str = (
-                    " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
-                )
-
-                query = f"""
-                    SELECT al.*, 
-                           e.first_name || ' ' || e.last_name as user_name,
-                           t.first_name || ' ' || t.last_name as target_name
-                    FROM audit_logs al
-                    LEFT JOIN employees e ON al.user_id = e.id
-                    LEFT JOIN employees t ON al.target_id = t.id
-                    {where_str}
-                    ORDER BY al.created_at DESC
-                    LIMIT %s
-                """
-                params.append(limit)
-                cur.execute(query, tuple(params))
+                query, params = AuditLogModel._recent_activity_query(limit, filters)
+                cur.execute(query, params)
                 return cur.fetchall()
         finally:
             conn.close()
 
+    @staticmethod
+    def iter_recent_activity(limit=100, filters=None):
+        """Same rows as get_recent_activity, streamed from a server-side cursor (exports)."""
+        query, params = AuditLogModel._recent_activity_query(limit, filters)
+        return stream_query(query, params)
+
     @staticmethod
     def get_suspicious_activity(limit=20):
         """
@@ -1,5 +1,26 @@
 from datetime import datetime
 from app.utils.db import get_db_connection
+from app.utils.current_status import (
+    refresh_current_status,
+    ensure_current_status_fresh,
+    current_status_join,
+    is_today,
+)
+from app.utils.daily_facts import refresh_daily_facts
+from app.utils.status_registry import status_family
+from app.utils.org_hierarchy import (
+    get_commands,
+    employees_in_scope,
+    get_structure_tree as cached_structure_tree,
+    invalidate_org_hierarchy,
+)
+from app.utils.requester_context import invalidate_requester
+from app.utils.stats_cache import bump_data_version
+from app.utils.status_window import (
+    starts_on_or_before,
+    starts_on_or_after,
+    ends_on_or_after,
+)
 from werkzeug.security import check_password_hash, generate_password_hash
 from psycopg2.extras import RealDictCursor
 
@@ -100,8 +121,9 @@ class EmployeeModel:
         if not conn:
             return None
         try:
+            ensure_current_status_fresh()
             cur = conn.cursor(cursor_factory=RealDictCursor)
-            query = """
+            query = f"""
                 SELECT e.id, e.first_name, e.last_name, e.dominant_name, e.username, e.phone_number,
                        e.email, e.birth_date, e.city, e.emergency_contact,
                        e.enlistment_date, e.discharge_date, e.assignment_date,
@@ -124,9 +146,6 @@ class EmployeeModel:
                        d.id as assigned_department_id,
                        s.id as assigned_section_id,
                        e.team_id, e.section_id, e.department_id,
-                       (SELECT id FROM departments WHERE commander_id = e.id LIMIT 1) as commands_department_id,
-                       (SELECT id FROM sections WHERE commander_id = e.id LIMIT 1) as commands_section_id,
-                       (SELECT id FROM teams WHERE commander_id = e.id LIMIT 1) as commands_team_id,
                        e.notif_sick_leave, e.notif_transfers, e.notif_morning_report
                 FROM employees e
                 -- Structure Joins (Assigned)
@@ -138,17 +157,8 @@ class EmployeeModel:
                 LEFT JOIN departments d_s_dir ON s_dir.department_id = d_s_dir.id
                 LEFT JOIN departments d_dir ON e.department_id = d_dir.id
                 LEFT JOIN service_types svt ON e.service_type_id = svt.id
-                -- Active Status
                 -- Active Status (Smart Continuity: Persistent stays, Daily resets)
-                LEFT JOIN LATERAL (
-                    SELECT al.status_type_id, al.start_datetime, al.end_datetime, al.note 
-                    FROM attendance_logs al
-                    JOIN status_types sti ON al.status_type_id = sti.id
-                    WHERE al.employee_id = e.id 
-                      AND (al.end_datetime IS NULL OR al.end_datetime > CURRENT_TIMESTAMP)
-                      AND (sti.is_persistent = TRUE OR DATE(al.start_datetime) = CURRENT_DATE)
-                    ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
-                ) al ON true
+                {current_status_join(alias="al")}
                 LEFT JOIN status_types st ON al.status_type_id = st.id
                 WHERE e.id = %s
             """
@@ -170,10 +180,11 @@ class EmployeeModel:
                 # STRICT SCOPING: Only set the ID for the level they actually command.
                 # Do NOT bubble up to parents - that causes the system to think they command the parent unit.
 
-                # Fetch IDs from the direct subquery columns
-                d_id = user.get("commands_department_id")
-                s_id = user.get("commands_section_id")
-                t_id = user.get("commands_team_id")
+                # Commanded units come from the in-memory org hierarchy
+                commands = get_commands(user["id"])
+                d_id = commands["commands_department_id"]
+                s_id = commands["commands_section_id"]
+                t_id = commands["commands_team_id"]
 
                 # Normalize to None if 0 or falsy (IDs should be > 0)
                 user["commands_department_id"] = d_id if d_id else None
@@ -300,75 +311,42 @@ class EmployeeModel:
                 LEFT JOIN departments d_dir ON e.department_id = d_dir.id
                 -- Service Type
                 LEFT JOIN service_types srv ON e.service_type_id = srv.id
-                -- Status Joins
                 -- Status Joins (Smart Continuity: Persistent stays, Daily resets)
-                LEFT JOIN LATERAL (
-                    SELECT al.status_type_id, al.start_datetime, al.end_datetime, al.is_verified, al.note
-                    FROM attendance_logs al
-                    JOIN status_types sti ON al.status_type_id = sti.id
-                    WHERE al.employee_id = e.id 
-                    {status_condition}
-                    ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
-                ) last_log ON true
+                {status_join}
                 LEFT JOIN status_types st ON last_log.status_type_id = st.id
                 WHERE e.username != 'admin'
             """
 
-            # Prepare status condition
-            # Robust continuity: Persistent stays until changed. Daily resets unless they are part of a date range.
-            status_sql = """AND (
-                sti.is_persistent = TRUE 
-                OR (
-                    DATE(al.start_datetime) <= CURRENT_DATE 
-                    AND (
-                        (al.end_datetime IS NOT NULL AND DATE(al.end_datetime) >= CURRENT_DATE)
-                        OR (al.end_datetime IS NULL AND DATE(al.start_datetime) = CURRENT_DATE)
-                    )
-                )
-            )"""
+            # Prepare status join
+            # Today: plain join on the maintained current-status projection.
+            # Other dates: Smart Continuity lookup (Persistent stays until changed, Daily resets).
+            check_date_str = (filters or {}).get("date") or (filters or {}).get("end_date")
             status_params = []
-
-            if filters and (filters.get("date") or filters.get("end_date")):
-                check_date_str = filters.get("date") or filters.get("end_date")
-                try:
-                    from datetime import datetime, date
-
-                    check_date_obj = datetime.strptime(
-                        check_date_str, "%Y-%m-%d"
-                    ).date()
-                    today = date.today()
-
-                    # Unified Smart Continuity logic for any date (Past/Present/Future)
-                    status_sql = """AND (
-                        sti.is_persistent = TRUE 
-                        OR (
-                            DATE(al.start_datetime) <= %s 
-                            AND (
-                                (al.end_datetime IS NOT NULL AND DATE(al.end_datetime) >= %s)
-                                OR (al.end_datetime IS NULL AND DATE(al.start_datetime) = %s)
-                            )
-                        )
-                    )"""
-                    status_params = [check_date_str, check_date_str, check_date_str]
-                except ValueError:
-                    # Fallback
-                    status_sql = """AND (
+            if is_today(check_date_str):
+                ensure_current_status_fresh()
+                status_join = current_status_join(alias="last_log")
+            else:
+                status_join = f"""LEFT JOIN LATERAL (
+                    SELECT al.status_type_id, al.start_datetime, al.end_datetime, al.is_verified, al.note
+                    FROM attendance_logs al
+                    JOIN status_types sti ON al.status_type_id = sti.id
+                    WHERE al.employee_id = e.id 
+                    AND (
                         sti.is_persistent = TRUE 
                         OR (
-                            DATE(al.start_datetime) <= %s 
+                            {starts_on_or_before("%s")} 
                             AND (
-                                (al.end_datetime IS NOT NULL AND DATE(al.end_datetime) >= %s)
-                                OR (al.end_datetime IS NULL AND DATE(al.start_datetime) = %s)
+                                (al.end_datetime IS NOT NULL AND {ends_on_or_after("%s")})
+                                OR (al.end_datetime IS NULL AND {starts_on_or_after("%s")})
                             )
                         )
-                    )"""
-                    status_params = [check_date_str, check_date_str, check_date_str]
-
-            # Initialize query parameters list if not already present
-            params = []
+                    )
+                    ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
+                ) last_log ON true"""
+                status_params = [check_date_str, check_date_str, check_date_str]
 
-            query = query.format(status_condition=status_sql)
-            params = status_params + params
+            query = query.format(status_join=status_join)
+            params = list(status_params)
 
             # Scoping and Exclusions
             if requesting_user:
@@ -376,31 +354,11 @@ class EmployeeModel:
                 query += " AND e.id != %s"
                 params.append(requesting_user["id"])
 
-                if not requesting_user.get("is_admin"):
-                    if requesting_user.get("commands_department_id"):
-                        query += " AND (d.id = %s OR d_dir.id = %s)"
-                        params.extend(
-                            [
-                                requesting_user["commands_department_id"],
-                                requesting_user["commands_department_id"],
-                            ]
-                        )
-                    elif requesting_user.get("commands_section_id"):
-                        query += " AND (s.id = %s OR s_dir.id = %s)"
-                        params.extend(
-                            [
-                                requesting_user["commands_section_id"],
-                                requesting_user["commands_section_id"],
-                            ]
-                        )
-                    elif requesting_user.get("commands_team_id"):
-                        query += " AND t.id = %s"
-                        params.append(requesting_user["commands_team_id"])
-                    else:
-                        # Case for a commander who isn't linked to a specific unit command in the DB yet
-                        # or just for security - they only see themselves if no scope found
-                        # Wait, if we excluded them above, they see nothing here. This is correct if they have no scope.
-                        pass
+                scope_ids = employees_in_scope(requesting_user)
+                if scope_ids is not None:
+                    # Commanders see their unit's members (no command scope -> nothing)
+                    query += " AND e.id = ANY(%s)"
+                    params.append(scope_ids)
 
             # Default to active only unless specified otherwise
             if not filters or not filters.get("include_inactive"):
@@ -437,8 +395,8 @@ class EmployeeModel:
                         pass
                     else:
                         # Improved: If filtering by parent status, include all sub-statuses
-                        query += " AND (st.id = %s OR st.parent_status_id = %s)"
-                        params.extend([filters["status_id"], filters["status_id"]])
+                        query += " AND st.id = ANY(%s)"
+                        params.append(status_family(filters["status_id"]))
                 
                 if filters.get("status_name"):
                     query += """ AND (
@@ -525,6 +483,55 @@ class EmployeeModel:
         finally:
             conn.close()
 
+    @staticmethod
+    def get_roster_employees(filters=None, requesting_user=None):
+        """
+        Lean row headers for roster grids: id and name only, with the same
+        scoping and unit filters as get_all_employees but without the status
+        and service-type joins.
+        """
+        conn = get_db_connection()
+        if not conn:
+            return []
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            query = """
+                SELECT DISTINCT e.id, e.first_name, e.last_name
+                FROM employees e
+                LEFT JOIN teams t ON e.team_id = t.id
+                LEFT JOIN sections s ON t.section_id = s.id
+                LEFT JOIN sections s_dir ON e.section_id = s_dir.id
+                WHERE e.username != 'admin' AND e.is_active = TRUE
+            """
+            params = []
+
+            if requesting_user:
+                query += " AND e.id != %s"
+                params.append(requesting_user["id"])
+                scope_ids = employees_in_scope(requesting_user)
+                if scope_ids is not None:
+                    query += " AND e.id = ANY(%s)"
+                    params.append(scope_ids)
+
+            filters = filters or {}
+            if filters.get("dept_id") and str(filters.get("dept_id")).isdigit():
+                d_id = int(filters["dept_id"])
+                query += " AND (s.department_id = %s OR e.department_id = %s)"
+                params.extend([d_id, d_id])
+            if filters.get("section_id") and str(filters.get("section_id")).isdigit():
+                s_id = int(filters["section_id"])
+                query += " AND (s.id = %s OR s_dir.id = %s)"
+                params.extend([s_id, s_id])
+            if filters.get("team_id") and str(filters.get("team_id")).isdigit():
+                query += " AND t.id = %s"
+                params.append(int(filters["team_id"]))
+
+            query += " ORDER BY e.first_name ASC, e.id ASC"
+            cur.execute(query, tuple(params))
+            return cur.fetchall()
+        finally:
+            conn.close()
+
     @staticmethod
     def create_employee(data):
         conn = get_db_connection()
@@ -671,7 +678,11 @@ class EmployeeModel:
                     # Commander of department
                     replace_unit_commander("department", department_id, new_id)
 
+            refresh_daily_facts(cur, [new_id])
+
             conn.commit()
+            invalidate_org_hierarchy()
+            bump_data_version()
             return new_id
         except Exception as e:
             conn.rollback()
@@ -754,6 +765,7 @@ class EmployeeModel:
                     "UPDATE attendance_logs SET end_datetime = NOW() WHERE employee_id = %s AND end_datetime IS NULL",
                     (emp_id,),
                 )
+                refresh_current_status(cur, [emp_id])
 
             cur.execute(query, tuple(params))
 
@@ -853,7 +865,15 @@ class EmployeeModel:
                         (emp_id,),
                     )
 
+            # Unit / activity changes move today's snapshot row
+            if "is_active" in data or any(
+                k in data for k in ["team_id", "section_id", "department_id"]
+            ):
+                refresh_daily_facts(cur, [emp_id])
+
             conn.commit()
+            invalidate_org_hierarchy()
+            bump_data_version()
             return True
         except Exception as e:
             conn.rollback()
@@ -919,6 +939,8 @@ class EmployeeModel:
             # Delete user
             cur.execute("DELETE FROM employees WHERE id = %s", (emp_id,))
             conn.commit()
+            invalidate_org_hierarchy()
+            bump_data_version()
             return True
         except Exception as e:
             conn.rollback()
@@ -941,6 +963,7 @@ class EmployeeModel:
                 (new_hash, user_id),
             )
             conn.commit()
+            invalidate_requester(user_id)
             return True, None
         except Exception as e:
             conn.rollback()
@@ -974,6 +997,7 @@ class EmployeeModel:
                 (new_hash, user_id),
             )
             conn.commit()
+            invalidate_requester(user_id)
             return True, "Success"
         except Exception as e:
             conn.rollback()
@@ -1011,6 +1035,7 @@ class EmployeeModel:
                 return False, "Missing identifier for delegation"
 
             conn.commit()
+            invalidate_requester()
             return True, "Delegation cancelled"
         except Exception as e:
             conn.rollback()
@@ -1060,6 +1085,7 @@ class EmployeeModel:
             delegation_id = cur.fetchone()[0]
 
             conn.commit()
+            invalidate_requester()
             return True, {
                 "message": "Delegation created",
                 "temp_password": temp_password,
@@ -1121,85 +1147,8 @@ class EmployeeModel:
 
     @staticmethod
     def get_structure_tree(requesting_user=None):
-        conn = get_db_connection()
-        if not conn:
-            return []
-        try:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-
-            # 1. Scoping Logic
-            dept_id = requesting_user.get("commands_department_id") if requesting_user else None
-            sect_id = requesting_user.get("commands_section_id") if requesting_user else None
-            team_id = requesting_user.get("commands_team_id") if requesting_user else None
-            is_admin = requesting_user.get("is_admin", False) if requesting_user else False
-
-            # Departments
-            dept_query = "SELECT d.id, d.name, d.commander_id, CONCAT(e.first_name, ' ', e.last_name) as commander_name FROM departments d LEFT JOIN employees e ON d.commander_id = e.id"
-            dept_params = []
-            if not is_admin:
-                if dept_id:
-                    dept_query += " WHERE d.id = %s"
-                    dept_params.append(dept_id)
-                elif sect_id:
-                    dept_query += " WHERE d.id = (SELECT department_id FROM sections WHERE id = %s)"
-                    dept_params.append(sect_id)
-                elif team_id:
-                    dept_query += " WHERE d.id = (SELECT department_id FROM sections WHERE id = (SELECT section_id FROM teams WHERE id = %s))"
-                    dept_params.append(team_id)
-            
-            dept_query += " ORDER BY d.name"
-            cur.execute(dept_query, tuple(dept_params))
-            depts = cur.fetchall()
-
-            # Sections
-            sect_query = "SELECT s.id, s.name, s.department_id, s.commander_id, CONCAT(e.first_name, ' ', e.last_name) as commander_name FROM sections s LEFT JOIN employees e ON s.commander_id = e.id"
-            sect_params = []
-            if not is_admin:
-                if dept_id:
-                    sect_query += " WHERE s.department_id = %s"
-                    sect_params.append(dept_id)
-                elif sect_id:
-                    sect_query += " WHERE s.id = %s"
-                    sect_params.append(sect_id)
-                elif team_id:
-                    sect_query += " WHERE s.id = (SELECT section_id FROM teams WHERE id = %s)"
-                    sect_params.append(team_id)
-            
-            sect_query += " ORDER BY s.name"
-            cur.execute(sect_query, tuple(sect_params))
-            sections = cur.fetchall()
-
-            # Teams
-            team_query = "SELECT t.id, t.name, t.section_id, t.commander_id, CONCAT(e.first_name, ' ', e.last_name) as commander_name FROM teams t LEFT JOIN employees e ON t.commander_id = e.id"
-            team_params = []
-            if not is_admin:
-                if dept_id:
-                    team_query += " WHERE t.section_id IN (SELECT id FROM sections WHERE department_id = %s)"
-                    team_params.append(dept_id)
-                elif sect_id:
-                    team_query += " WHERE t.section_id = %s"
-                    team_params.append(sect_id)
-                elif team_id:
-                    team_query += " WHERE t.id = %s"
-                    team_params.append(team_id)
-            
-            team_query += " ORDER BY t.name"
-            cur.execute(team_query, tuple(team_params))
-            teams = cur.fetchall()
-
-            structure = []
-            for d in depts:
-                dept_node = {**d, "sections": []}
-                dept_sections = [s for s in sections if s["department_id"] == d["id"]]
-                for s in dept_sections:
-                    sect_node = {**s, "teams": []}
-                    sect_teams = [t for t in teams if t["section_id"] == s["id"]]
-                    sect_node["teams"] = sect_teams
-                    dept_node["sections"].append(sect_node)
-                structure.append(dept_node)
-            return structure
-        finally:
-            conn.close()
+        # Served from the org hierarchy cache (no per-request queries)
+        return cached_structure_tree(requesting_user)
 
     @staticmethod
     def get_roles():
@@ -1239,6 +1188,7 @@ class EmployeeModel:
             query = f"UPDATE employees SET {', '.join(updates)} WHERE id = %s"
             cur.execute(query, tuple(params))
             conn.commit()
+            invalidate_requester(employee_id)
             return True
         except Exception as e:
             print(f"Error updating preferences: {e}")
@@ -1362,6 +1312,8 @@ class EmployeeModel:
                 count += 1
             
             conn.commit()
+            invalidate_org_hierarchy()
+            bump_data_version()
             return count, None
         except Exception as e:
             conn.rollback()
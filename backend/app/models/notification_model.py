@@ -1,4 +1,5 @@
 from app.utils.db import get_db_connection
+from app.utils.status_window import active_on_day
 from psycopg2.extras import RealDictCursor
 from datetime import date
 
@@ -195,16 +196,11 @@ class NotificationModel:
                 print(
                     f"DEBUG: Checking self report for user {requesting_user.get('id')} ({requesting_user.get('first_name')})"
                 )
-                self_missing_query = """
+                self_missing_query = f"""
                     SELECT 1 FROM attendance_logs al
                     JOIN status_types st ON al.status_type_id = st.id
                     WHERE al.employee_id = %s
-                    AND DATE(al.start_datetime) <= CURRENT_DATE
-                    AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= CURRENT_DATE)
-                    AND (
-                        DATE(al.start_datetime) = CURRENT_DATE
-                        OR st.is_persistent = TRUE
-                    )
+                    AND {active_on_day("CURRENT_DATE")}
                 """
                 cur.execute(self_missing_query, (requesting_user["id"],))
                 self_reported = cur.fetchone()
@@ -226,7 +222,7 @@ class NotificationModel:
             if requesting_user.get("notif_morning_report", True) and (
                 requesting_user.get("is_commander") or requesting_user.get("is_admin")
             ):
-                missing_query = """
+                missing_query = f"""
                     SELECT COUNT(e.id) as count
                     FROM employees e
                     LEFT JOIN teams t ON e.team_id = t.id
@@ -239,12 +235,7 @@ class NotificationModel:
                           SELECT 1 FROM attendance_logs al
                           JOIN status_types st ON al.status_type_id = st.id
                           WHERE al.employee_id = e.id
-                          AND DATE(al.start_datetime) <= CURRENT_DATE
-                          AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= CURRENT_DATE)
-                          AND (
-                              DATE(al.start_datetime) = CURRENT_DATE
-                              OR st.is_persistent = TRUE
-                          )
+                          AND {active_on_day("CURRENT_DATE")}
                       )
                 """
                 params_missing = [requesting_user["id"]]
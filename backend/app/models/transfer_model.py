@@ -1,4 +1,7 @@
 from app.utils.db import get_db_connection
+from app.utils.daily_facts import refresh_daily_facts
+from app.utils.org_hierarchy import invalidate_org_hierarchy
+from app.utils.stats_cache import bump_data_version
 from psycopg2.extras import RealDictCursor
 
 
@@ -454,7 +457,10 @@ class TransferModel:
             """,
                 (approver_user["id"], request_id),
             )
+            refresh_daily_facts(cur, [req["employee_id"]])
             conn.commit()
+            invalidate_org_hierarchy()
+            bump_data_version()
 
             # --- NOTIFICATION ---
             try:
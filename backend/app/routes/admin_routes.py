@@ -1,12 +1,25 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils.db import get_db_connection
+from app.utils.db import get_db_connection, get_pool_stats
+from app.utils.db_indexes import check_indexes
+from app.utils.status_registry import invalidate_status_registry
+from app.utils.org_hierarchy import invalidate_org_hierarchy
+from app.utils.archive_grants import invalidate_grants
+from app.utils.stats_cache import bump_data_version, get_stats_cache_info
 from app.services.backup_service import backup_service
+from app.utils.backup_stream import iter_backup
+from app.utils.change_tracking import prune_changes
+from app.utils.backup_restore import (
+    restore_backup_file,
+    get_restore_progress,
+    BackupFormatError,
+    RestoreInProgress,
+)
 from app.models.audit_log_model import AuditLogModel
 import json
 import datetime
-import io
 import os
+import tempfile
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -41,6 +54,9 @@ def update_backup_config():
         "enabled": data.get("enabled"),
         "interval_days": data.get("interval_days"),
     }
+    for key in ("incremental_enabled", "incremental_interval_hours", "retention"):
+        if key in data:
+            new_config[key] = data[key]
     backup_service.save_config(new_config)
     return jsonify({"success": True, "config": backup_service.get_config()})
 
@@ -66,6 +82,78 @@ def trigger_backup_now():
         return jsonify({"success": False, "error": result}), 500
 
 
+@admin_bp.route("/backup/list", methods=["GET"])
+@jwt_required()
+def list_backups():
+    """Restore points on disk (full and incremental), oldest first"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(backup_service.list_backups())
+
+
+@admin_bp.route("/backup/<path:file_name>/restore", methods=["POST"])
+@jwt_required()
+def restore_backup_point(file_name):
+    """Restore a backup from disk: its full base, then every delta up to it"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    user_id = _get_user_id_from_jwt()
+    try:
+        result = backup_service.restore(os.path.basename(file_name))
+    except RestoreInProgress as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"[BACKUP] Restore of {file_name} failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    invalidate_status_registry()
+    invalidate_org_hierarchy()
+    invalidate_grants()
+    bump_data_version()
+
+    AuditLogModel.log_action(
+        user_id=user_id,
+        action_type="DATABASE_RESTORE",
+        description=f"Database restored from server backup: {file_name}",
+        ip_address=request.remote_addr,
+        metadata=result,
+    )
+    return jsonify({"success": True, **result})
+
+
+@admin_bp.route("/db-pool", methods=["GET"])
+@jwt_required()
+def get_db_pool_stats():
+    """Connection pool metrics (size, idle/in-use, waits, timeouts, suspected leaks)"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(get_pool_stats())
+
+
+@admin_bp.route("/db-indexes", methods=["GET"])
+@jwt_required()
+def get_db_index_report():
+    """Managed attendance indexes: missing ones and indexes never scanned"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    report = check_indexes()
+    if report is None:
+        return jsonify({"error": "Index check failed"}), 500
+    return jsonify(report)
+
+
+@admin_bp.route("/stats-cache", methods=["GET"])
+@jwt_required()
+def get_stats_cache_stats():
+    """Dashboard stats cache: entries, hit rate, hits / misses / evictions"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(get_stats_cache_info())
+
+
 @admin_bp.route("/settings", methods=["GET"])
 @jwt_required()
 def get_system_settings():
@@ -199,57 +287,9 @@ def backup_database():
         return jsonify({"error": "Unauthorized"}), 403
 
     user_id = _get_user_id_from_jwt()
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    backup_data = {
-        "metadata": {"version": "1.0", "date": datetime.datetime.now().isoformat()},
-        "data": {},
-    }
-
-    # רשימת הטבלאות לגיבוי לפי סדר תלויות (חשוב לשחזור)
-    tables = [
-        "system_settings",
-        "roles",
-        "status_types",
-        "service_types",
-        "departments",
-        "sections",
-        "teams",
-        "employees",
-        "attendance_logs",
-        "transfer_requests",
-    ]
 
     try:
-        for table in tables:
-            cur.execute(f"SELECT * FROM {table}")
-            columns = [desc[0] for desc in cur.description]
-            rows = cur.fetchall()
-
-            # המרת נתונים לפורמט JSON-serializable
-            table_data = []
-            for row in rows:
-                item = {}
-                for i, col in enumerate(columns):
-                    val = row[i]
-                    if isinstance(val, (datetime.date, datetime.datetime)):
-                        val = val.isoformat()
-                    item[col] = val
-                table_data.append(item)
-
-            backup_data["data"][table] = table_data
-
-        # יצירת הקובץ בזיכרון
-        mem_file = io.BytesIO()
-        mem_file.write(
-            json.dumps(backup_data, indent=4, ensure_ascii=False).encode("utf-8")
-        )
-        mem_file.seek(0)
-
-        filename = (
-            f"shiftguard_backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        )
+        filename = f"shiftguard_backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
 
         # Log Backup
         AuditLogModel.log_action(
@@ -260,22 +300,26 @@ def backup_database():
             metadata={"filename": filename},
         )
 
-        return send_file(
-            mem_file,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/json",
+        # Same streamed format as the automatic backups (gzip NDJSON chunks + manifest)
+        response = Response(
+            stream_with_context(iter_backup(backup_type="manual")),
+            mimetype="application/gzip",
         )
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
 
 
 @admin_bp.route("/restore", methods=["POST"])
 @jwt_required()
 def restore_database():
+    """
+    Restore from an uploaded backup: a streamed .ndjson.gz backup or a legacy
+    JSON backup. The upload is spooled to disk and bulk-loaded with COPY
+    (see backup_restore.py); progress is at GET /restore/status.
+    """
     if not is_admin():
         return jsonify({"error": "Unauthorized"}), 403
 
@@ -287,93 +331,52 @@ def restore_database():
     if file.filename == "":
         return jsonify({"error": "No file selected"}), 400
 
+    fd, temp_path = tempfile.mkstemp(prefix="restore_", suffix=".upload")
+    os.close(fd)
     try:
-        content = json.load(file)
-        data = content.get("data", {})
-
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # התחלת טרנזקציה
-
-        # סדר טבלאות הפוך למחיקה (כדי למנוע בעיות Foreign Key)
-        tables_reversed = [
-            "transfer_requests",
-            "attendance_logs",
-            "employees",
-            "teams",
-            "sections",
-            "departments",
-            "service_types",
-            "status_types",
-            "roles",
-            "system_settings",
-        ]
-
-        # ניקוי טבלאות
-        for table in tables_reversed:
-            cur.execute(f"TRUNCATE TABLE {table} CASCADE")
-
-        # סדר טבלאות רגיל להוספה
-        tables = [
-            "system_settings",
-            "roles",
-            "status_types",
-            "service_types",
-            "departments",
-            "sections",
-            "teams",
-            "employees",
-            "attendance_logs",
-            "transfer_requests",
-        ]
-
-        for table in tables:
-            if table not in data:
-                continue
-
-            rows = data[table]
-            if not rows:
-                continue
-
-            columns = rows[0].keys()
-            cols_str = ", ".join(columns)
-            vals_str = ", ".join(["%s"] * len(columns))
-
-            query = f"INSERT INTO {table} ({cols_str}) VALUES ({vals_str})"
-
-            for row in rows:
-                values = [row[col] for col in columns]
-                cur.execute(query, values)
-
-            # עדכון ה-Sequence כדי למנוע שגיאות ID בעתיד
-            if "id" in columns:
-                cur.execute(
-                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1) ) FROM {table}"
-                )
-
-        conn.commit()
-
-        # Log Restore
-        AuditLogModel.log_action(
-            user_id=user_id,
-            action_type="DATABASE_RESTORE",
-            description=f"Database restoration completed from file: {file.filename}",
-            ip_address=request.remote_addr,
-            metadata={"filename": file.filename},
-        )
-        return jsonify({"success": True, "message": "Database restored successfully"})
-
+        file.save(temp_path)
+        totals = restore_backup_file(temp_path)
+    except RestoreInProgress as e:
+        return jsonify({"error": str(e)}), 409
+    except BackupFormatError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         import traceback
 
         traceback.print_exc()
-        if conn:
-            conn.rollback()
         return jsonify({"error": str(e)}), 500
     finally:
-        if conn:
-            conn.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    invalidate_status_registry()
+    invalidate_org_hierarchy()
+    invalidate_grants()
+    bump_data_version()
+    # Incremental backups restart from a new full base
+    prune_changes(None)
+    backup_service.request_full_backup()
+
+    # Log Restore
+    AuditLogModel.log_action(
+        user_id=user_id,
+        action_type="DATABASE_RESTORE",
+        description=f"Database restoration completed from file: {file.filename}",
+        ip_address=request.remote_addr,
+        metadata={"filename": file.filename, "tables": totals},
+    )
+    return jsonify(
+        {"success": True, "message": "Database restored successfully", "tables": totals}
+    )
+
+
+@admin_bp.route("/restore/status", methods=["GET"])
+@jwt_required()
+def get_restore_status():
+    """Progress of the running (or last) restore"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(get_restore_progress())
 
 
 @admin_bp.route("/reports/birthday/trigger", methods=["POST"])
@@ -435,3 +438,15 @@ def trigger_archive_cycle():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route("/archive/runs", methods=["GET"])
+@jwt_required()
+def list_archive_runs():
+    """Recent archive runs: checkpoint, batches, rows moved, duration"""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    from app.utils.archive_service import get_archive_runs
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify(get_archive_runs(min(max(limit, 1), 200)))
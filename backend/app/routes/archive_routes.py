@@ -4,6 +4,7 @@ from app.models.archive_model import ArchiveModel
 from app.models.employee_model import EmployeeModel
 from app.models.notification_model import NotificationModel
 from app.models.audit_log_model import AuditLogModel
+from app.utils.requester_context import get_requester
 
 import json
 
@@ -53,7 +54,7 @@ def _find_approver(requester):
 @jwt_required()
 def create_restore_request():
     user_id = _get_identity()
-    requester = EmployeeModel.get_employee_by_id(user_id)
+    requester = get_requester(user_id)
     if not requester:
         return jsonify({"error": "User not found"}), 404
 
@@ -99,7 +100,7 @@ def create_restore_request():
 @jwt_required()
 def get_pending_requests():
     user_id = _get_identity()
-    user = EmployeeModel.get_employee_by_id(user_id)
+    user = get_requester(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
@@ -116,7 +117,7 @@ def get_pending_requests():
 @jwt_required()
 def resolve_request(request_id):
     user_id = _get_identity()
-    approver = EmployeeModel.get_employee_by_id(user_id)
+    approver = get_requester(user_id)
     if not approver:
         return jsonify({"error": "User not found"}), 404
 
@@ -194,7 +195,7 @@ def get_my_requests():
 @jwt_required()
 def get_all_requests():
     user_id = _get_identity()
-    user = EmployeeModel.get_employee_by_id(user_id)
+    user = get_requester(user_id)
     if not user or not user.get('is_admin'):
         return jsonify({"error": "Unauthorized"}), 403
 
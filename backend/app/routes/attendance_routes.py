@@ -1,14 +1,25 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.models.attendance_model import AttendanceModel
 from app.models.audit_log_model import AuditLogModel
+from app.models.notification_model import NotificationModel
+from app.utils.requester_context import get_requester
+from app.utils.fanout import run_concurrently
+from app.utils.roster_matrix import build_roster_matrix
+from app.utils.roster_finalization import ensure_roster_finalized
+from app.utils.excel_stream import xlsx_response
+from app.services.report_service import build_history_report
+import hashlib
 import json
-import pandas as pd
-import io
+import time
 from datetime import datetime
 
 att_bp = Blueprint("attendance", __name__)
 
+# Upper bounds for one /roster-batch request: grid cells, and the days they expand to
+ROSTER_BATCH_MAX_CELLS = 1000
+ROSTER_BATCH_MAX_DAYS = 5000
+
 
 @att_bp.route("/", methods=["OPTIONS"])
 def options_root():
@@ -39,6 +50,24 @@ def get_status_types():
         return jsonify({"error": str(e)}), 500
 
 
+def _stats_payload(stats_data, birthdays):
+    """The /stats response body (also the "stats" section of /dashboard)."""
+    # Count unverified
+    unverified = sum(
+        int(s.get("unverified_count", 0)) for s in stats_data.get("stats", [])
+    )
+    return {
+        "stats": stats_data.get("stats", []),
+        "total_employees": stats_data.get("total_employees", 0),
+        "unverified_count": unverified,
+        "birthdays": birthdays,
+        "age_distribution": stats_data.get("age_distribution", []),
+        "average_age": stats_data.get("average_age", 0),
+        # Per-level breakdown (department / section / team) for drill-down
+        "units": stats_data.get("units", {}),
+    }
+
+
 @att_bp.route("/stats", methods=["GET"])
 @jwt_required()
 def get_stats():
@@ -58,12 +87,10 @@ def get_stats():
         except (json.JSONDecodeError, AttributeError):
             user_id = identity_str
 
-        from app.models.employee_model import EmployeeModel
-
-        requester = EmployeeModel.get_employee_by_id(user_id)
+        requester = get_requester(user_id)
 
-        # TRIGGER AUTO-ROSTER APPROVAL ON DASHBOARD LOAD
-        AttendanceModel.auto_approve_daily_roster()
+        # Verify roster entries that became due (throttled, usually a no-op)
+        ensure_roster_finalized()
 
         # Parse filters for drill-down
         filters = {}
@@ -95,20 +122,7 @@ def get_stats():
         # Pass the selected date to get_birthdays
         selected_date = filters.get('date') if filters else None
         birthdays = AttendanceModel.get_birthdays(requesting_user=requester, selected_date=selected_date)
-        # Count unverified
-        unverified = sum(
-            int(s.get("unverified_count", 0)) for s in stats_data.get("stats", [])
-        )
-        return jsonify(
-            {
-                "stats": stats_data.get("stats", []),
-                "total_employees": stats_data.get("total_employees", 0),
-                "unverified_count": unverified,
-                "birthdays": birthdays,
-                "age_distribution": stats_data.get("age_distribution", []),
-                "average_age": stats_data.get("average_age", 0),
-            }
-        )
+        return jsonify(_stats_payload(stats_data, birthdays))
     except Exception as e:
         print(f"[ERROR] Error in /stats: {e}")
         import traceback
@@ -129,9 +143,7 @@ def get_comparison_stats():
             pass
 
         user_id = identity.get("id") if isinstance(identity, dict) else identity
-        from app.models.employee_model import EmployeeModel
-
-        requester = EmployeeModel.get_employee_by_id(user_id)
+        requester = get_requester(user_id)
         if requester.get("is_temp_commander"):
             return (
                 jsonify(
@@ -179,9 +191,7 @@ def get_trend_stats():
             pass
 
         user_id = identity.get("id") if isinstance(identity, dict) else identity
-        from app.models.employee_model import EmployeeModel
-
-        requester = EmployeeModel.get_employee_by_id(user_id)
+        requester = get_requester(user_id)
         if requester.get("is_temp_commander"):
             return (
                 jsonify(
@@ -235,9 +245,7 @@ def get_daily_log():
         except (json.JSONDecodeError, AttributeError):
             user_id = identity_str
 
-        from app.models.employee_model import EmployeeModel
-
-        requester = EmployeeModel.get_employee_by_id(user_id)
+        requester = get_requester(user_id)
 
         date_str = request.args.get("date")
         if not date_str:
@@ -271,6 +279,132 @@ def get_daily_log():
         return jsonify({"error": str(e)}), 500
 
 
+def _int_arg(name):
+    value = request.args.get(name)
+    return int(value) if value and value.isdigit() else None
+
+
+@att_bp.route("/dashboard", methods=["GET"])
+@jwt_required()
+def get_dashboard_bundle():
+    """
+    Composite dashboard payload: stats, comparison, trend, daily log and alerts
+    in one response. The requester is resolved once; the independent model
+    queries run concurrently, each on its own pooled connection.
+
+    Query params: date, department_id, section_id, team_id, status_id,
+    serviceTypes, min_age, max_age, comparison_days (1), trend_days (7),
+    trend_date (defaults to date), debug=1 for per-section timings.
+    Sections use the same filters the dashboard page sends to the single endpoints.
+    """
+    started = time.perf_counter()
+    try:
+        identity = get_jwt_identity()
+        try:
+            if isinstance(identity, str):
+                identity = json.loads(identity)
+        except (json.JSONDecodeError, TypeError):
+            pass
+        raw_id = identity.get("id") if isinstance(identity, dict) else identity
+        try:
+            user_id = int(raw_id)
+        except (ValueError, TypeError):
+            user_id = raw_id
+
+        requester = get_requester(user_id)
+        if not requester:
+            return jsonify({"error": "User not found"}), 404
+
+        ensure_roster_finalized()
+
+        date_str = request.args.get("date") or datetime.now().strftime("%Y-%m-%d")
+        units = {
+            key: _int_arg(key)
+            for key in ("department_id", "section_id", "team_id")
+            if _int_arg(key) is not None
+        }
+        status_id = _int_arg("status_id")
+        service_types = request.args.get("serviceTypes")
+        ages = {key: request.args.get(key) for key in ("min_age", "max_age") if request.args.get(key)}
+
+        stats_filters = {**units, "date": date_str, **ages}
+        if service_types:
+            stats_filters["serviceTypes"] = service_types
+
+        # Comparison shows the peer list: no unit drill-down
+        comparison_filters = {}
+        trend_filters = {k: v for k, v in units.items() if k != "team_id"}
+        log_filters = dict(units)
+        if status_id:
+            comparison_filters["status_id"] = trend_filters["status_id"] = log_filters["status_id"] = status_id
+        if service_types:
+            comparison_filters["serviceTypes"] = trend_filters["serviceTypes"] = service_types
+
+        comparison_days = _int_arg("comparison_days") or 1
+        trend_days = _int_arg("trend_days") or 7
+        trend_date = request.args.get("trend_date") or date_str
+
+        def _alerts():
+            all_alerts = NotificationModel.get_alerts(requester) or []
+            read_ids = NotificationModel.get_read_notifications(requester["id"]) or []
+            return [a for a in all_alerts if str(a["id"]) not in read_ids]
+
+        # Temp commanders are not allowed comparison / trend (same as the single endpoints)
+        with_comparison = not requester.get("is_temp_commander")
+        # A single-day comparison comes out of the stats rollup (scope and status family resolved once)
+        comparison_in_stats = with_comparison and comparison_days == 1
+        stats_comparison = {"status_id": status_id} if comparison_in_stats else None
+
+        tasks = {
+            "stats": lambda: AttendanceModel.get_dashboard_stats(
+                requesting_user=requester, filters=stats_filters, comparison=stats_comparison
+            ),
+            "birthdays": lambda: AttendanceModel.get_birthdays(
+                requesting_user=requester, selected_date=date_str
+            ),
+            "daily_log": lambda: AttendanceModel.get_daily_attendance_log(
+                date_str, requesting_user=requester, filters=log_filters
+            ),
+            "alerts": _alerts,
+        }
+        if with_comparison:
+            if not comparison_in_stats:
+                tasks["comparison"] = lambda: AttendanceModel.get_unit_comparison_stats(
+                    requesting_user=requester, date=date_str, days=comparison_days, filters=comparison_filters
+                )
+            tasks["trend"] = lambda: AttendanceModel.get_attendance_trend(
+                days=trend_days, requesting_user=requester, end_date=trend_date, filters=trend_filters
+            )
+
+        results, errors, timings = run_concurrently(tasks)
+        if comparison_in_stats and results["stats"] is not None:
+            results["comparison"] = results["stats"].pop("comparison", None)
+
+        payload = {
+            "stats": (
+                _stats_payload(results["stats"], results["birthdays"] or [])
+                if results["stats"] is not None
+                else None
+            ),
+            "comparison": results.get("comparison"),
+            "trend": results.get("trend"),
+            "daily_log": results["daily_log"],
+            "alerts": results["alerts"],
+        }
+        if errors:
+            payload["errors"] = errors
+        if request.args.get("debug") == "1" or current_app.debug:
+            timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+            payload["timings_ms"] = timings
+        return jsonify(payload)
+    except Exception as e:
+        print(f"[ERROR] Error in /dashboard: {e}")
+        import traceback
+
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
 @att_bp.route("/log", methods=["POST"])
 @jwt_required()
 def log_status():
@@ -473,62 +607,19 @@ def export_employee_history(emp_id):
         start_date = request.args.get("start_date")
         end_date = request.args.get("end_date")
 
-        history = AttendanceModel.get_employee_history_export(
-            emp_id, start_date, end_date
-        )
-
-        if not history:
-            return jsonify({"error": "No history found for specified range"}), 404
-
-        # Convert to DataFrame
-        df = pd.DataFrame(history)
-
-        # Rename columns for Hebrew Report
-        columns = {
-            "status_name": "סטטוס",
-            "start_datetime": "התחלה",
-            "end_datetime": "סיום",
-            "note": "הערה",
-            "reported_by_name": 'דווח ע"י',
-        }
-
-        valid_cols = [c for c in columns.keys() if c in df.columns]
-        df = df[valid_cols].rename(columns=columns)
-
-        # Format dates
-        if "התחלה" in df.columns:
-            df["התחלה"] = pd.to_datetime(df["התחלה"]).dt.strftime("%d/%m/%Y %H:%M")
-        if "סיום" in df.columns:
-            df["סיום"] = pd.to_datetime(df["סיום"]).apply(
-                lambda x: x.strftime("%d/%m/%Y %H:%M") if pd.notnull(x) else "-"
-            )
-
-        # Export to Excel
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            workbook = writer.book
-            worksheet = workbook.create_sheet("History")
-            writer.sheets["History"] = worksheet
-
-            # Title
-            worksheet.merge_cells("A1:E1")
-            worksheet["A1"] = f"היסטוריית דיווחים - שוטר {emp_id}"
-            worksheet.sheet_view.rightToLeft = True
-
-            df.to_excel(writer, index=False, sheet_name="History", startrow=2)
-
-        output.seek(0)
         filename = f"history_{emp_id}"
         if start_date:
             filename += f"_{start_date}"
         filename += ".xlsx"
 
-        return send_file(
-            output,
-            download_name=filename,
-            as_attachment=True,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        response = xlsx_response(
+            lambda path: build_history_report(path, emp_id, start_date, end_date),
+            filename,
+            allow_empty=False,
         )
+        if response is None:
+            return jsonify({"error": "No history found for specified range"}), 404
+        return response
 
     except Exception as e:
         print(f"[ERROR] Error exporting history: {e}")
@@ -558,7 +649,7 @@ def get_roster_matrix():
 
         from app.models.employee_model import EmployeeModel
 
-        requester = EmployeeModel.get_employee_by_id(user_id)
+        requester = get_requester(user_id)
 
         # 1. Fetch Employees Scope
         filters = {}
@@ -586,6 +677,9 @@ def get_roster_matrix():
         # Let's just fetch all employees and filter manually if needed, or rely on a simple query.
         # Wait, I need the LIST of employees to render the grid rows.
 
+        if request.args.get("format") == "compact":
+            return _compact_roster_matrix(requester, filters, start_date, end_date, user_id)
+
         employees = EmployeeModel.get_all_employees(
             filters=filters, requesting_user=requester
         )
@@ -617,10 +711,50 @@ def get_roster_matrix():
         return jsonify({"error": str(e)}), 500
 
 
-@att_bp.route("/roster-update", methods=["POST"])
-@jwt_required()
-def update_roster():
-    data = request.get_json()
+def _compact_roster_matrix(requester, filters, start_date, end_date, user_id):
+    """
+    ?format=compact: the roster as a columnar, run-length encoded grid.
+        statuses   [{id, name, color}] indexed by status code (code 0 = no status)
+        employees  {"ids": [...], "names": [...]}
+        runs       per employee, [code, days, code, days, ...] from start_date
+    Tagged with an ETag of the body; If-None-Match gets a 304.
+    """
+    from app.models.employee_model import EmployeeModel
+
+    employees = EmployeeModel.get_roster_employees(filters, requesting_user=requester)
+    emp_ids = [e["id"] for e in employees]
+    logs = (
+        AttendanceModel.get_logs_for_employees(emp_ids, start_date, end_date, user_id)
+        if emp_ids
+        else []
+    )
+    matrix = build_roster_matrix(emp_ids, start_date, end_date, logs)
+
+    payload = {
+        "format": "compact",
+        "start_date": matrix.start.isoformat(),
+        "end_date": matrix.end.isoformat(),
+        "days": matrix.day_count,
+        "statuses": [None]
+        + [
+            {"id": s["status_type_id"], "name": s["status_name"], "color": s["status_color"]}
+            for s in matrix.statuses[1:]
+        ],
+        "employees": {
+            "ids": emp_ids,
+            "names": [f"{e['first_name']} {e['last_name']}" for e in employees],
+        },
+        "runs": matrix.run_lengths(),
+    }
+
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    # Always revalidate: the roster changes with every status update
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+def _roster_user_id():
     identity = get_jwt_identity()
     # ... identity parsing ... (standardize this?)
     try:
@@ -628,7 +762,14 @@ def update_roster():
             identity = json.loads(identity)
     except:
         pass
-    user_id = identity.get("id") if isinstance(identity, dict) else identity
+    return identity.get("id") if isinstance(identity, dict) else identity
+
+
+@att_bp.route("/roster-update", methods=["POST"])
+@jwt_required()
+def update_roster():
+    data = request.get_json()
+    user_id = _roster_user_id()
 
     employee_id = data.get("employee_id")
     status_id = data.get("status_id")
@@ -639,24 +780,51 @@ def update_roster():
         return jsonify({"error": "Missing fields"}), 400
 
     try:
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        end_date = start_date
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-
-        curr_date = start_date
-        while curr_date <= end_date:
-            AttendanceModel.upsert_roster_log(
-                employee_id, status_id, curr_date, reported_by=user_id
-            )
-            curr_date += pd.Timedelta(days=1)  # pandas is imported as pd
+        cell = {
+            "employee_id": employee_id,
+            "status_id": status_id,
+            "start_date": start_date_str,
+            "end_date": end_date_str,
+        }
+        if not AttendanceModel.apply_roster_batch([cell], reported_by=user_id):
+            return jsonify({"error": "Failed to update roster"}), 500
 
         return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error updating roster: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@att_bp.route("/roster-batch", methods=["POST"])
+@jwt_required()
+def update_roster_batch():
+    """
+    Applies a batch of roster grid cells in one transaction.
+    Body: {"cells": [{"employee_id", "status_id", "start_date", "end_date"?}, ...]}
+    """
+    data = request.get_json() or {}
+    cells = data.get("cells")
+    if not isinstance(cells, list) or not cells:
+        return jsonify({"error": "Missing cells"}), 400
+    if len(cells) > ROSTER_BATCH_MAX_CELLS:
+        return jsonify({"error": f"Too many cells (max {ROSTER_BATCH_MAX_CELLS})"}), 400
+
+    try:
+        if not AttendanceModel.apply_roster_batch(
+            cells, reported_by=_roster_user_id(), max_days=ROSTER_BATCH_MAX_DAYS
+        ):
+            return jsonify({"error": "Failed to update roster"}), 500
+
+        return jsonify({"success": True, "count": len(cells)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error updating roster batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @att_bp.route("/roster-verify", methods=["POST"])
 @jwt_required()
 def verify_roster_day():
@@ -162,10 +162,10 @@ def export_audit_logs():
     """
     Generates a detailed human-readable CSV report of system activity.
     """
-    from flask import request, make_response
-    import io
-    import csv
+    from flask import request
     from datetime import datetime
+    from app.services.report_service import AUDIT_HEADERS, audit_rows
+    from app.utils.excel_stream import csv_response
 
     identity_raw = get_jwt_identity()
     try:
@@ -177,58 +177,12 @@ def export_audit_logs():
         return jsonify({"error": "Unauthorized: Admins only"}), 403
 
     limit = request.args.get("limit", 1000, type=int)
-    logs = AuditLogModel.get_recent_activity(limit=limit)
-
-    output = io.StringIO()
-    output.write('\ufeff') # BOM for Excel Hebrew support
-    writer = csv.writer(output)
-    
-    writer.writerow([
-        "מזהה", "זמן", "משתמש", "סוג פעולה", "תיאור", "מטרה", "כתובת IP", "מידע טכני נוסף"
-    ])
-
-    # Hebrew Mapping for Export
-    ACTION_MAP = {
-        "LOGIN": "התחברות למערכת",
-        "FAILED_LOGIN": "ניסיון התחברות כושל",
-        "BLOCKED_LOGIN": "חסימת התחברות (אבטחה)",
-        "PASSWORD_CHANGE": "שינוי סיסמה",
-        "PROFILE_UPDATE": "עדכון פרטי פרופיל",
-        "TRANSFER_CREATE": "יצירת בקשת העברה",
-        "TRANSFER_APPROVE": "אישור בקשת העברה",
-        "TRANSFER_REJECT": "דחיית בקשת העברה",
-        "TRANSFER_CANCEL": "ביטול בקשת העברה",
-        "IMPERSONATION_START": "התחלת מצב התחזות מנהל",
-        "WEBAUTHN_REGISTER": "רישום מפתח ביומטרי",
-        "WEBAUTHN_LOGIN": "התחברות ביומטרית",
-        "EMPLOYEE_CREATE": "יצירת שוטר חדש",
-        "EMPLOYEE_UPDATE": "עדכון פרטי שוטר",
-        "REPORT_STATUS": "דיווח סטטוס נוכחות",
-    }
-
-    for log in logs:
-        action_he = ACTION_MAP.get(log.get("action_type"), log.get("action_type"))
-        meta_str = ""
-        if log.get("metadata"):
-            try:
-                meta_str = json.dumps(log["metadata"], ensure_ascii=False)
-            except:
-                meta_str = str(log["metadata"])
-
-        writer.writerow([
-            log.get("id"),
-            log.get("created_at").strftime("%d/%m/%Y %H:%M:%S") if log.get("created_at") else "",
-            log.get("user_name") or "מערכת",
-            action_he,
-            log.get("description"),
-            log.get("target_name") or "",
-            log.get("ip_address"),
-            meta_str
-        ])
-
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename=system_audit_report_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
-    response.headers["Content-type"] = "text/csv; charset=utf-8"
-    return response
+
+    # Rows are streamed from a server-side cursor straight into the response
+    return csv_response(
+        AUDIT_HEADERS,
+        audit_rows(limit),
+        f"system_audit_report_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+    )
 
 
@@ -1,7 +1,8 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.models.employee_model import EmployeeModel
 from app.models.audit_log_model import AuditLogModel
+from app.utils.requester_context import get_requester
 import pandas as pd
 import io
 import json
@@ -34,7 +35,7 @@ def get_employees():
         except (json.JSONDecodeError, AttributeError):
             user_id = identity_str
 
-        requester = EmployeeModel.get_employee_by_id(user_id)
+        requester = get_requester(user_id)
 
         filters = {
             "search": request.args.get("search"),
@@ -79,7 +80,7 @@ def create_employee():
     user_id = identity["id"] if isinstance(identity, dict) else identity
     claims = identity if isinstance(identity, dict) else {}
 
-    current_user = EmployeeModel.get_employee_by_id(user_id)
+    current_user = get_requester(user_id)
     if not current_user:
         return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -147,7 +148,7 @@ def update_employee(emp_id):
         user_id = identity["id"] if isinstance(identity, dict) else identity
         claims = identity if isinstance(identity, dict) else {}
 
-        current_user = EmployeeModel.get_employee_by_id(user_id)
+        current_user = get_requester(user_id)
         if not current_user:
             return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -233,7 +234,7 @@ def delete_employee(emp_id):
     user_id = identity["id"] if isinstance(identity, dict) else identity
     claims = identity if isinstance(identity, dict) else {}
 
-    current_user = EmployeeModel.get_employee_by_id(user_id)
+    current_user = get_requester(user_id)
     if not current_user:
         return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -266,7 +267,7 @@ def get_structure():
     except (json.JSONDecodeError, AttributeError):
         user_id = identity_str
 
-    requester = EmployeeModel.get_employee_by_id(user_id)
+    requester = get_requester(user_id)
     tree = EmployeeModel.get_structure_tree(requesting_user=requester)
     return jsonify(tree)
 
@@ -274,8 +275,8 @@ def get_structure():
 @emp_bp.route("/export", methods=["GET"])
 @jwt_required()
 def export_excel():
-    from app.models.attendance_model import AttendanceModel
-    from datetime import datetime, timedelta
+    from app.services.report_service import build_range_matrix_report, build_snapshot_report
+    from app.utils.excel_stream import xlsx_response
 
     identity_str = get_jwt_identity()
     try:
@@ -286,7 +287,7 @@ def export_excel():
     except (json.JSONDecodeError, AttributeError):
         user_id = identity_str
 
-    requester = EmployeeModel.get_employee_by_id(user_id)
+    requester = get_requester(user_id)
 
     if requester.get("is_temp_commander"):
         return (
@@ -310,129 +311,19 @@ def export_excel():
         if not employees:
             return jsonify({"error": "No employees found"}), 404
 
-        emp_map = {
-            e["id"]: f"{e['first_name']} {e['last_name']} ({e['username']})"
-            for e in employees
-        }
-        emp_ids = list(emp_map.keys())
-
-        # 2. Get Logs for these employees in range
-        logs = AttendanceModel.get_logs_for_employees(
-            emp_ids, start_date_str, end_date_str
+        # 2-4. Logs stream into the roster matrix; rows are written as they are decoded
+        return xlsx_response(
+            lambda path: build_range_matrix_report(path, employees, start_date_str, end_date_str),
+            "report.xlsx",
         )
 
-        # 3. Build Matrix
-        # Create Date Range
-        start = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        end = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-        delta = (end - start).days + 1
-        date_list = [start + timedelta(days=i) for i in range(delta)]
-        date_strs = [d.strftime("%Y-%m-%d") for d in date_list]
-        date_headers = [d.strftime("%d/%m") for d in date_list]
-
-        # Initialize data structure: { emp_id: { date_str: status } }
-        matrix_data = {eid: {d: "-" for d in date_strs} for eid in emp_ids}
-
-        # Populate with logs
-        # This approach assumes one status per day (the latest one active on that day)
-        # Since logs are intervals, we check overlap for each day.
-        # Optimization: Logs are ordered by start_time.
-        # For each log, mark the days it covers.
-        for log in logs:
-            eid = log["employee_id"]
-            if eid not in matrix_data:
-                continue
-
-            s_name = log["status_name"]
-            l_start = log["start_datetime"].date()
-            l_end = (
-                log["end_datetime"].date() if log["end_datetime"] else end
-            )  # If active, goes till end of report
-
-            # Clip to report range
-            overlap_start = max(start, l_start)
-            overlap_end = min(end, l_end)
-
-            if overlap_start <= overlap_end:
-                curr = overlap_start
-                while curr <= overlap_end:
-                    d_str = curr.strftime("%Y-%m-%d")
-                    matrix_data[eid][d_str] = s_name
-                    curr += timedelta(days=1)
-
-        # 4. Convert to DataFrame
-        # Rows: Employees
-        # Cols: Dates
-        rows = []
-        for emp in employees:
-            eid = emp["id"]
-            row = {
-                "שם מלא (פרטי ומשפחה)": f"{emp['first_name']} {emp['last_name']}",
-                "שם משתמש": emp["username"],
-                "מחלקה": emp["department_name"] or "-",
-                "מדור": emp["section_name"] or "-",
-                "חולייה": emp["team_name"] or "-",
-            }
-            # Add dates
-            for i, d_str in enumerate(date_strs):
-                row[date_headers[i]] = matrix_data[eid][d_str]
-            rows.append(row)
-
-        df = pd.DataFrame(rows)
-
-        report_title = f"דו\"ח ריכוז נוכחות - {start.strftime('%d/%m/%Y')} עד {end.strftime('%d/%m/%Y')}"
-
-    else:
-        # --- STANDARD SNAPSHOT REPORT ---
-        filters = dict(request.args)
-        employees = EmployeeModel.get_all_employees(filters, requesting_user=requester)
-        df = pd.DataFrame(employees)
-
-        columns = {
-            "first_name": "שם פרטי",
-            "last_name": "שם משפחה",
-            "username": "שם משתמש",
-            "status_name": "סטטוס",
-            "team_name": "חוליה",
-            "section_name": "מדור",
-            "department_name": "מחלקה",
-        }
-
-        # Keep only relevant columns if they exist in DB response
-        valid_cols = [c for c in columns.keys() if c in df.columns]
-        df = df[valid_cols].rename(columns=columns)
+    # --- STANDARD SNAPSHOT REPORT ---
+    filters = dict(request.args)
+    employees = EmployeeModel.get_all_employees(filters, requesting_user=requester)
 
-        # Determine Report Title
-        report_title = 'דו"ח מצבת כוח אדם'
-        if request.args.get("date"):
-            report_title += f" - נכון ליום {request.args.get('date')}"
-        else:
-            report_title += " - נכון להיום"
-
-    # Export to Excel (Shared Logic)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        workbook = writer.book
-        worksheet = workbook.create_sheet("Report")
-        writer.sheets["Report"] = worksheet
-
-        # Add Title Cell
-        worksheet.merge_cells("A1:G1")
-        cell = worksheet["A1"]
-        cell.value = report_title
-
-        # Set RTL Direction
-        worksheet.sheet_view.rightToLeft = True
-
-        # Write DataFrame
-        df.to_excel(writer, index=False, sheet_name="Report", startrow=2)
-
-    output.seek(0)
-    return send_file(
-        output,
-        download_name="report.xlsx",
-        as_attachment=True,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    return xlsx_response(
+        lambda path: build_snapshot_report(path, employees, request.args.get("date")),
+        "report.xlsx",
     )
 
 
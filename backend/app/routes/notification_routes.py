@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.notification_model import NotificationModel
 from app.models.employee_model import EmployeeModel
+from app.utils.requester_context import get_requester
 import json
 from datetime import datetime
 
@@ -26,7 +27,7 @@ def get_alerts():
         print(f"DEBUG: get_alerts called for user_id: {user_id}")
 
         # Get full user to get their notification settings and command scope
-        user = EmployeeModel.get_employee_by_id(user_id)
+        user = get_requester(user_id)
         if not user:
             return jsonify({"error": "User not found"}), 404
 
@@ -0,0 +1,90 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.requester_context import get_requester
+from app.utils.excel_stream import file_response
+from app.services.report_jobs import submit_report, get_job, REPORT_TYPES
+import json
+import os
+
+report_bp = Blueprint("reports", __name__)
+
+
+def _current_user_id():
+    identity = get_jwt_identity()
+    try:
+        if isinstance(identity, str):
+            identity = json.loads(identity)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    return identity.get("id") if isinstance(identity, dict) else identity
+
+
+def _can_access(job, requester):
+    return requester.get("is_admin") or job["requested_by"] == requester.get("id")
+
+
+@report_bp.route("/", methods=["POST"])
+@jwt_required()
+def create_report_job():
+    """
+    Queues a background export.
+    Body: {"type": "employees" | "history" | "audit", "params": {...}}
+        employees  same query params as GET /api/employees/export
+        history    employee_id, start_date, end_date
+        audit      limit
+    """
+    try:
+        requester = get_requester(_current_user_id())
+        if not requester:
+            return jsonify({"error": "User not found"}), 404
+
+        data = request.get_json() or {}
+        report_type = data.get("type")
+        params = data.get("params") or {}
+
+        if report_type not in REPORT_TYPES:
+            return jsonify({"error": f"Unknown report type: {report_type}"}), 400
+        if report_type == "employees" and requester.get("is_temp_commander"):
+            return (
+                jsonify({"error": "Unauthorized: Temp commanders cannot export reports"}),
+                403,
+            )
+        if report_type == "audit" and not requester.get("is_admin"):
+            return jsonify({"error": "Unauthorized: Admins only"}), 403
+        if report_type == "history" and not str(params.get("employee_id", "")).isdigit():
+            return jsonify({"error": "Missing employee_id"}), 400
+
+        job = submit_report(report_type, params, requester)
+        if not job:
+            return jsonify({"error": "Could not queue report"}), 500
+        return jsonify(job), 200 if job["status"] == "done" else 202
+    except Exception as e:
+        print(f"[ERROR] Error queuing report: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@report_bp.route("/<job_id>", methods=["GET"])
+@jwt_required()
+def get_report_job(job_id):
+    requester = get_requester(_current_user_id())
+    job = get_job(job_id)
+    if not job or not requester or not _can_access(job, requester):
+        return jsonify({"error": "Report not found"}), 404
+    job.pop("requested_by", None)
+    return jsonify(job)
+
+
+@report_bp.route("/<job_id>/download", methods=["GET"])
+@jwt_required()
+def download_report(job_id):
+    requester = get_requester(_current_user_id())
+    job = get_job(job_id, include_path=True)
+    if not job or not requester or not _can_access(job, requester):
+        return jsonify({"error": "Report not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Report is {job['status']}", "status": job["status"]}), 409
+    if not job["file_path"] or not os.path.exists(job["file_path"]):
+        return jsonify({"error": "Report file expired, please export again"}), 410
+
+    # The file stays on disk for identical re-exports (purged by the scheduler)
+    return file_response(job["file_path"], job["download_name"], job["mimetype"], delete=False)
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.models.transfer_model import TransferModel
 from app.models.audit_log_model import AuditLogModel
+from app.utils.requester_context import get_requester
 import json
 
 transfer_bp = Blueprint("transfers", __name__)
@@ -66,9 +67,7 @@ def get_pending():
         identity = identity_raw
     user_id = identity["id"] if isinstance(identity, dict) else identity
 
-    from app.models.employee_model import EmployeeModel
-
-    user = EmployeeModel.get_employee_by_id(user_id)
+    user = get_requester(user_id)
     requests = TransferModel.get_pending_requests(user)
     return jsonify(requests)
 
@@ -85,9 +84,7 @@ def get_history():
         identity = identity_raw
     user_id = identity["id"] if isinstance(identity, dict) else identity
 
-    from app.models.employee_model import EmployeeModel
-
-    user = EmployeeModel.get_employee_by_id(user_id)
+    user = get_requester(user_id)
     history = TransferModel.get_history(requesting_user=user)
     return jsonify(history)
 
@@ -104,9 +101,7 @@ def approve(req_id):
         identity = identity_raw
     user_id = identity["id"] if isinstance(identity, dict) else identity
 
-    from app.models.employee_model import EmployeeModel
-
-    user = EmployeeModel.get_employee_by_id(user_id)
+    user = get_requester(user_id)
 
     if TransferModel.approve_request(req_id, user):
         # Log Approval
@@ -138,9 +133,7 @@ def reject(req_id):
         identity = identity_raw
     user_id = identity["id"] if isinstance(identity, dict) else identity
 
-    from app.models.employee_model import EmployeeModel
-
-    user = EmployeeModel.get_employee_by_id(user_id)
+    user = get_requester(user_id)
 
     data = request.get_json() or {}
     reason = data.get("reason", "")
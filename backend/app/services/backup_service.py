@@ -5,6 +5,16 @@ import datetime
 import threading
 import time
 from app.utils.db import get_db_connection
+from app.utils.backup_stream import write_backup_file, manifest_path
+from app.utils.backup_restore import restore_backup_chain, restore_legacy_backup
+from app.utils.change_tracking import (
+    prune_changes,
+    current_backup_epoch,
+    request_full_backup,
+    snapshot_xmin,
+    sync_change_tracking,
+    tracking_since,
+)
 
 BACKUP_DIR = os.path.join(os.getcwd(), 'backups')
 CONFIG_FILE = os.path.join(os.getcwd(), 'backup_config.json')
@@ -33,8 +43,13 @@ class BackupService:
     def _load_config(self):
         default_config = {
             "enabled": False,
-            "interval_days": 1,  # 1=daily, 7=weekly
-            "last_backup": None
+            "interval_days": 1,  # full backup every N days (1=daily, 7=weekly)
+            "incremental_enabled": True,
+            "incremental_interval_hours": 1,  # delta backups between full ones
+            # Retention tiers: newest backup per hour / day / week is kept for this long
+            "retention": {"hourly_hours": 48, "daily_days": 14, "weekly_weeks": 8},
+            "last_backup": None,
+            "last_full_backup": None,
         }
         if os.path.exists(CONFIG_FILE):
             try:
@@ -55,6 +70,12 @@ class BackupService:
         self.config.pop("interval_hours", None)
         with open(CONFIG_FILE, 'w') as f:
             json.dump(self.config, f, indent=4)
+        if "enabled" in new_config or "incremental_enabled" in new_config:
+            sync_change_tracking(self._tracking_wanted())
+
+    def _tracking_wanted(self):
+        """The triggers log changes only while delta backups can read them."""
+        return bool(self.config.get("enabled") and self.config.get("incremental_enabled"))
             
     def get_config(self):
         return self.config
@@ -68,94 +89,267 @@ class BackupService:
         except Exception as e:
             print(f"[BACKUP] Archive cycle failed (non-fatal): {e}")
 
-    def perform_backup(self):
-        try:
-            # 1. Run archive cycle first (move old data out of active logs)
-            self._run_archive()
+    # --- Backup catalog ---
 
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            backup_data = {
-                "metadata": {
-                    "version": "2.0",
-                    "date": datetime.datetime.now().isoformat(),
-                    "type": "automatic"
-                },
-                "data": {}
-            }
-            
-            tables = [
-                "roles", "status_types", "service_types",
-                "departments", "sections", "teams",
-                "employees", "attendance_logs", "attendance_logs_archive",
-                "transfer_requests", "system_settings"
-            ]
-            
-            for table in tables:
+    def list_backups(self):
+        """
+        Restore points on disk, oldest first. Streamed backups carry their
+        manifest (kind, base, parent, snapshot); legacy auto_backup_*.json
+        dumps are listed as standalone full backups.
+        """
+        points = []
+        for name in os.listdir(BACKUP_DIR):
+            path = os.path.join(BACKUP_DIR, name)
+            if name.endswith(".manifest.json"):
                 try:
-                    cur.execute(f"SELECT * FROM {table}")
-                    columns = [desc[0] for desc in cur.description]
-                    rows = cur.fetchall()
-                    
-                    table_data = []
-                    for row in rows:
-                        item = {}
-                        for i, col in enumerate(columns):
-                            val = row[i]
-                            if isinstance(val, (datetime.date, datetime.datetime)):
-                                val = val.isoformat()
-                            item[col] = val
-                        table_data.append(item)
-                    
-                    backup_data["data"][table] = table_data
-                except Exception as te:
-                    print(f"[BACKUP] Skipping table {table}: {te}")
-                    backup_data["data"][table] = []
-                
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"auto_backup_{timestamp}.json"
-            filepath = os.path.join(BACKUP_DIR, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, indent=4, ensure_ascii=False)
-                
-            self.config["last_backup"] = datetime.datetime.now().isoformat()
+                    with open(path, 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                except Exception as e:
+                    print(f"[BACKUP] Unreadable manifest {name}: {e}")
+                    continue
+                data_file = manifest.get("file")
+                if data_file and os.path.exists(os.path.join(BACKUP_DIR, data_file)):
+                    points.append({**manifest, "manifest": name})
+            elif name.startswith("auto_backup_") and name.endswith(".json"):
+                try:
+                    created = datetime.datetime.strptime(name[len("auto_backup_"):-len(".json")], '%Y%m%d_%H%M%S')
+                except ValueError:
+                    continue
+                points.append({
+                    "file": name,
+                    "kind": "full",
+                    "legacy": True,
+                    "created_at": created.isoformat(),
+                    "size_bytes": os.path.getsize(path),
+                })
+        points.sort(key=lambda p: p["created_at"])
+        return points
+
+    def _chain(self, file_name, points=None):
+        """Files to replay for a restore point: its full base, then each delta up to it."""
+        by_file = {p["file"]: p for p in (points or self.list_backups())}
+        chain = []
+        current = by_file.get(file_name)
+        while current:
+            chain.append(current)
+            if current.get("kind") == "full":
+                return list(reversed(chain))
+            current = by_file.get(current.get("parent"))
+        raise ValueError(f"Backup chain of {file_name} is incomplete")
+
+    def _delta_parent(self):
+        """
+        The restore point a new delta can follow (latest streamed backup), or
+        None - also when an untracked write (partition move, restore) moved the
+        backup epoch since it was taken, or when its snapshot may miss writes
+        made while change tracking was being switched on.
+        """
+        points = [p for p in self.list_backups() if not p.get("legacy") and p.get("snapshot")]
+        if not points:
+            return None
+        latest = points[-1]
+        try:
+            self._chain(latest["file"], points)
+        except ValueError:
+            return None
+        epoch = current_backup_epoch()
+        if epoch is None or latest.get("epoch") != epoch:
+            return None
+        since = tracking_since()
+        if since is None or snapshot_xmin(latest["snapshot"]) <= since:
+            return None
+        return latest
+
+    # --- Backup ---
+
+    def perform_backup(self, kind="full"):
+        """
+        kind: "full" or "delta" (a delta silently becomes a full backup when
+        there is no streamed parent to follow or a full one was requested).
+        """
+        lock_conn = get_db_connection()
+        if not lock_conn:
+            return False, "Database connection failed"
+        try:
+            # One backup at a time across processes (the worker runs in every process)
+            lock_cur = lock_conn.cursor()
+            lock_cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('backup_service'))")
+            if not lock_cur.fetchone()[0]:
+                print("[BACKUP] Another backup is running - skipped")
+                return False, "Another backup is already running"
+
+            parent = self._delta_parent() if kind == "delta" else None
+            if kind == "delta" and parent is None:
+                kind = "full"
+
+            if kind == "full":
+                # Run archive cycle first (move old data out of active logs)
+                self._run_archive()
+
+            filename, filepath, manifest = self._write_backup(kind, parent)
+            if kind == "delta" and manifest.get("epoch") != parent.get("epoch"):
+                # An untracked write committed between the epoch check and the delta's snapshot
+                print(f"[BACKUP] Backup epoch moved during delta {filename} - taking a full backup instead")
+                os.remove(filepath)
+                kind = "full"
+                filename, filepath, manifest = self._write_backup(kind, None)
+
+            # Manifest (row counts + per-table checksums + chain links) next to the data file
+            with open(manifest_path(filepath), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+            # Changes up to this backup's snapshot are covered now
+            prune_changes(manifest["snapshot"])
+
+            # Re-read first: other processes write the same file
+            self.config = self._load_config()
+            now = datetime.datetime.now().isoformat()
+            self.config["last_backup"] = now
+            if kind == "full":
+                self.config["last_full_backup"] = now
             self.save_config({})
-            
-            conn.close()
-            print(f"[BACKUP] Backup saved: {filename}")
+
+            print(f"[BACKUP] {kind.capitalize()} backup saved: {filename} ({manifest['size_bytes']} bytes)")
+            self.apply_retention()
             return True, filepath
         except Exception as e:
             print(f"[BACKUP] Backup failed: {e}")
             return False, str(e)
+        finally:
+            lock_conn.rollback()
+            lock_conn.close()
+
+    def _write_backup(self, kind, parent):
+        """Streams every table (or the changed rows) into gzip NDJSON chunks. Returns (name, path, manifest)."""
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        suffix = "" if kind == "full" else "_delta"
+        filename = f"auto_backup_{timestamp}{suffix}.ndjson.gz"
+        filepath = os.path.join(BACKUP_DIR, filename)
+
+        extra = {}
+        if kind == "delta":
+            extra = {
+                "parent": parent["file"],
+                "base": parent["file"] if parent.get("kind") == "full" else parent.get("base"),
+            }
+        manifest = write_backup_file(
+            filepath,
+            backup_type="automatic",
+            since_snapshot=parent["snapshot"] if kind == "delta" else None,
+            extra_header=extra,
+        )
+        return filename, filepath, manifest
+
+    def request_full_backup(self, reason="full backup requested"):
+        """
+        The next backup must be a full one (e.g. after a restore): moves the
+        backup epoch in the database, so every process sees it.
+        """
+        request_full_backup(reason)
+
+    # --- Retention ---
+
+    def apply_retention(self, now=None):
+        """
+        Keeps the newest restore point per hour / day / ISO week inside the
+        configured windows (plus the latest one) and every file those points
+        depend on; deletes the rest. Returns the removed file names.
+        """
+        now = now or datetime.datetime.now()
+        tiers = self.config.get("retention") or {}
+        points = self.list_backups()
+        if not points:
+            return []
+
+        windows = [
+            (datetime.timedelta(hours=tiers.get("hourly_hours", 48)), lambda t: t.strftime('%Y%m%d%H')),
+            (datetime.timedelta(days=tiers.get("daily_days", 14)), lambda t: t.strftime('%Y%m%d')),
+            (datetime.timedelta(weeks=tiers.get("weekly_weeks", 8)), lambda t: "%d-%02d" % t.isocalendar()[:2]),
+        ]
+        keep = {points[-1]["file"]}
+        for window, bucket_of in windows:
+            newest = {}
+            for p in points:
+                created = datetime.datetime.fromisoformat(p["created_at"])
+                if now - created <= window:
+                    newest[bucket_of(created)] = p["file"]  # points are oldest first
+            keep.update(newest.values())
+
+        # A kept delta needs its base and every delta before it
+        for file_name in list(keep):
+            try:
+                keep.update(p["file"] for p in self._chain(file_name, points))
+            except ValueError:
+                pass
+
+        removed = []
+        for p in points:
+            if p["file"] in keep:
+                continue
+            for name in (p["file"], p.get("manifest")):
+                if name and os.path.exists(os.path.join(BACKUP_DIR, name)):
+                    os.remove(os.path.join(BACKUP_DIR, name))
+            removed.append(p["file"])
+        if removed:
+            print(f"[BACKUP] Retention removed {len(removed)} old backups")
+        return removed
+
+    # --- Restore ---
+
+    def restore(self, file_name, progress=None):
+        """Restores a restore point from disk: its full base, then its deltas."""
+        chain = self._chain(file_name)
+        paths = [os.path.join(BACKUP_DIR, p["file"]) for p in chain]
+        if chain and chain[0].get("legacy"):
+            totals = restore_legacy_backup(paths[0], progress=progress)
+        else:
+            totals = restore_backup_chain(paths, progress=progress)
+        # Restored rows were written by the restore itself: start a new chain
+        prune_changes(None)
+        self.request_full_backup()
+        return {"files": [p["file"] for p in chain], "tables": totals}
 
     def _backup_worker(self):
         print("Starting Backup Worker...")
         while not self.stop_event.is_set():
             try:
-                if self.config.get("enabled"):
-                    last_backup_str = self.config.get("last_backup")
-                    interval_days = self.config.get("interval_days", 1)
-                    interval_seconds = interval_days * 86400  # convert days to seconds
-                    
-                    should_backup = False
-                    if not last_backup_str:
-                        should_backup = True
-                    else:
-                        last_backup = datetime.datetime.fromisoformat(last_backup_str)
-                        diff = datetime.datetime.now() - last_backup
-                        if diff.total_seconds() >= interval_seconds:
-                            should_backup = True
-                    
-                    if should_backup:
-                        print("[BACKUP] Starting scheduled backup...")
-                        self.perform_backup()
-                        
+                # Another process may have backed up meanwhile
+                self.config = self._load_config()
+                # Config edits may come from another process; a no-op unless the state changes
+                sync_change_tracking(self._tracking_wanted())
+                kind = self._due_backup()
+                if kind:
+                    print(f"[BACKUP] Starting scheduled {kind} backup...")
+                    self.perform_backup(kind)
+
                 time.sleep(300)  # Check every 5 minutes
             except Exception as e:
                 print(f"[BACKUP] Error in backup worker: {e}")
                 time.sleep(300)
 
+    def _due_backup(self):
+        """"full", "delta" or None according to the schedule."""
+        if not self.config.get("enabled"):
+            return None
+        now = datetime.datetime.now()
+
+        last_full_str = self.config.get("last_full_backup")
+        interval_days = self.config.get("interval_days", 1)
+        if (
+            not last_full_str
+            or (now - datetime.datetime.fromisoformat(last_full_str)).total_seconds() >= interval_days * 86400
+        ):
+            return "full"
+
+        if self.config.get("incremental_enabled"):
+            if self._delta_parent() is None:
+                # Chain invalidated (restore, partition move): start a new one now
+                return "full"
+            last_str = self.config.get("last_backup") or last_full_str
+            hours = self.config.get("incremental_interval_hours", 1)
+            if (now - datetime.datetime.fromisoformat(last_str)).total_seconds() >= hours * 3600:
+                return "delta"
+        return None
+
 # Global Accessor
 backup_service = BackupService()
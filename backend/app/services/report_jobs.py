@@ -0,0 +1,375 @@
+"""
+Background Report Jobs
+======================
+Large exports run on a small worker pool instead of inside the request:
+
+    POST /api/reports              -> {job_id, status}   (202)
+    GET  /api/reports/<id>         -> status / row count / error
+    GET  /api/reports/<id>/download once status == "done"
+
+Job state lives in the report_jobs table, generated files under
+REPORTS_DIR on local disk. A job's cache key is (report type, parameters
+with the snapshot date resolved, requester scope, data version); submitting a
+report whose key matches a queued / running / finished job returns that job,
+so an identical re-export is instant until a write moves the data version.
+Audit reports are never reused (the audit log changes with every request).
+
+Finished files are removed after REPORT_RESULT_TTL_HOURS
+(purge_expired_reports, run hourly by the scheduler). Every process
+heartbeats its queued / running jobs every REPORT_HEARTBEAT_SECONDS; a job
+whose heartbeat is older than REPORT_ORPHAN_SECONDS (its process died or was
+restarted) is reported as failed - by whichever worker the poll lands on.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from flask import current_app
+from psycopg2.extras import RealDictCursor, Json
+from app.utils.db import get_db_connection
+from app.utils.stats_cache import data_version
+from app.utils.excel_stream import XLSX_MIMETYPE
+
+REPORTS_DIR = os.path.join(os.getcwd(), "reports")
+REPORT_WORKERS = 2
+REPORT_RESULT_TTL_HOURS = 24
+REPORT_HEARTBEAT_SECONDS = 30
+REPORT_ORPHAN_SECONDS = 120
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+_worker_token = uuid.uuid4().hex  # identifies the process that ran a job (diagnostics)
+_active_lock = threading.Lock()
+_active_jobs = set()  # queued / running in this process
+_heartbeat_thread = None
+
+
+def _build_employees(path, params, requester):
+    from app.models.employee_model import EmployeeModel
+    from app.services.report_service import build_range_matrix_report, build_snapshot_report
+
+    employees = EmployeeModel.get_all_employees(dict(params), requesting_user=requester)
+    if params.get("start_date") and params.get("end_date"):
+        if not employees:
+            raise ValueError("No employees found")
+        return build_range_matrix_report(path, employees, params["start_date"], params["end_date"])
+    return build_snapshot_report(path, employees, params.get("date"))
+
+
+def _build_history(path, params, requester):
+    from app.services.report_service import build_history_report
+
+    return build_history_report(
+        path, int(params["employee_id"]), params.get("start_date"), params.get("end_date")
+    )
+
+
+def _build_audit(path, params, requester):
+    from app.services.report_service import build_audit_csv
+
+    return build_audit_csv(path, limit=int(params.get("limit") or 1000))
+
+
+# report type -> how to build it
+REPORT_TYPES = {
+    "employees": {
+        "build": _build_employees,
+        "extension": "xlsx",
+        "mimetype": XLSX_MIMETYPE,
+        "download_name": lambda p: "report.xlsx",
+        "empty_error": None,
+        "cacheable": True,
+    },
+    "history": {
+        "build": _build_history,
+        "extension": "xlsx",
+        "mimetype": XLSX_MIMETYPE,
+        "download_name": lambda p: f"history_{p['employee_id']}"
+        + (f"_{p['start_date']}" if p.get("start_date") else "")
+        + ".xlsx",
+        "empty_error": "No history found for specified range",
+        "cacheable": True,
+    },
+    "audit": {
+        "build": _build_audit,
+        "extension": "csv",
+        "mimetype": "text/csv; charset=utf-8",
+        "download_name": lambda p: f"system_audit_report_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+        "empty_error": None,
+        "cacheable": False,
+    },
+}
+
+
+def _key_params(report_type, params):
+    """Parameters as they determine the file: a snapshot without a date is today's."""
+    if report_type == "employees" and not params.get("date") and not (
+        params.get("start_date") and params.get("end_date")
+    ):
+        return {**params, "date": date.today().isoformat()}
+    return params
+
+
+def _cache_key(report_type, params, requester):
+    scope = {
+        "id": requester.get("id"),
+        "is_admin": bool(requester.get("is_admin")),
+        "commands": [
+            requester.get("commands_department_id"),
+            requester.get("commands_section_id"),
+            requester.get("commands_team_id"),
+        ],
+    }
+    # Shared by every worker; None (version unreadable) or an uncacheable type never matches
+    version = data_version(requester) if REPORT_TYPES[report_type]["cacheable"] else None
+    if version is None:
+        version = uuid.uuid4().hex
+    raw = json.dumps(
+        [report_type, _key_params(report_type, params), scope, version], sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _public(job):
+    if not job:
+        return None
+    return {
+        "job_id": job["id"],
+        "report_type": job["report_type"],
+        "status": job["status"],
+        "row_count": job.get("row_count"),
+        "error": job.get("error"),
+        "download_name": job.get("download_name"),
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+    }
+
+
+def _update_job(job_id, **fields):
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        assignments = ", ".join(f"{name} = %s" for name in fields)
+        cur.execute(
+            f"UPDATE report_jobs SET {assignments} WHERE id = %s",
+            tuple(fields.values()) + (job_id,),
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[REPORTS] Failed to update job {job_id}: {e}")
+    finally:
+        conn.close()
+
+
+def _heartbeat_loop(app):
+    while True:
+        time.sleep(REPORT_HEARTBEAT_SECONDS)
+        with _active_lock:
+            job_ids = sorted(_active_jobs)
+        if not job_ids:
+            continue
+        with app.app_context():
+            conn = get_db_connection()
+            if not conn:
+                continue
+            try:
+                cur = conn.cursor()
+                cur.execute(
+                    "UPDATE report_jobs SET heartbeat_at = NOW() WHERE id = ANY(%s)",
+                    (job_ids,),
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"[REPORTS] Heartbeat failed: {e}")
+            finally:
+                conn.close()
+
+
+def _ensure_heartbeat(app):
+    global _heartbeat_thread
+    with _active_lock:
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(
+                target=_heartbeat_loop, args=(app,), name="report-heartbeat", daemon=True
+            )
+            _heartbeat_thread.start()
+
+
+def _run_job(app, job_id, report_type, params, requester):
+    spec = REPORT_TYPES[report_type]
+    final_path = os.path.join(REPORTS_DIR, f"{job_id}.{spec['extension']}")
+    part_path = final_path + ".part"
+
+    with app.app_context():
+        _update_job(job_id, status="running", started_at=datetime.now(), heartbeat_at=datetime.now())
+        try:
+            os.makedirs(REPORTS_DIR, exist_ok=True)
+            count = spec["build"](part_path, params, requester)
+            if not count and spec["empty_error"]:
+                raise ValueError(spec["empty_error"])
+            os.replace(part_path, final_path)
+            _update_job(
+                job_id,
+                status="done",
+                file_path=final_path,
+                row_count=count,
+                finished_at=datetime.now(),
+            )
+            print(f"[REPORTS] Job {job_id} ({report_type}) done: {count} rows")
+        except Exception as e:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            print(f"[REPORTS] Job {job_id} ({report_type}) failed: {e}")
+            _update_job(job_id, status="failed", error=str(e), finished_at=datetime.now())
+        finally:
+            with _active_lock:
+                _active_jobs.discard(job_id)
+
+
+def submit_report(report_type, params, requester):
+    """
+    Queues a report (or returns the matching cached / in-flight job).
+    Returns the public job dict, or None if the job could not be recorded.
+    """
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type: {report_type}")
+    params = {k: v for k, v in (params or {}).items() if v not in (None, "")}
+    cache_key = _cache_key(report_type, params, requester)
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            """
+            SELECT * FROM report_jobs
+            WHERE cache_key = %s AND status IN ('queued', 'running', 'done')
+            ORDER BY created_at DESC LIMIT 1
+            """,
+            (cache_key,),
+        )
+        existing = cur.fetchone()
+        if existing and (existing["status"] != "done" or os.path.exists(existing["file_path"] or "")):
+            conn.rollback()
+            return _public(existing)
+
+        job_id = uuid.uuid4().hex
+        cur.execute(
+            """
+            INSERT INTO report_jobs
+                (id, report_type, params, requested_by, cache_key, worker_token,
+                 status, download_name, mimetype, heartbeat_at)
+            VALUES (%s, %s, %s, %s, %s, %s, 'queued', %s, %s, NOW())
+            RETURNING *
+            """,
+            (
+                job_id,
+                report_type,
+                Json(params),
+                requester.get("id"),
+                cache_key,
+                _worker_token,
+                REPORT_TYPES[report_type]["download_name"](params),
+                REPORT_TYPES[report_type]["mimetype"],
+            ),
+        )
+        job = cur.fetchone()
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[REPORTS] Failed to queue {report_type} report: {e}")
+        return None
+    finally:
+        conn.close()
+
+    app = current_app._get_current_object()
+    with _active_lock:
+        _active_jobs.add(job_id)
+    _ensure_heartbeat(app)
+    _executor.submit(_run_job, app, job_id, report_type, params, dict(requester))
+    return _public(job)
+
+
+def get_job(job_id, include_path=False):
+    """The job as stored (None if unknown). Orphans (heartbeat timed out) are failed here."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            """
+            UPDATE report_jobs
+            SET status = 'failed', error = 'Interrupted by a server restart', finished_at = NOW()
+            WHERE id = %s AND status IN ('queued', 'running')
+              AND COALESCE(heartbeat_at, created_at) < NOW() - make_interval(secs => %s)
+            RETURNING *
+            """,
+            (job_id, REPORT_ORPHAN_SECONDS),
+        )
+        job = cur.fetchone()
+        conn.commit()
+        if not job:
+            cur.execute("SELECT * FROM report_jobs WHERE id = %s", (job_id,))
+            job = cur.fetchone()
+        if not job:
+            return None
+        result = _public(job)
+        result["requested_by"] = job["requested_by"]
+        if include_path:
+            result["file_path"] = job["file_path"]
+            result["mimetype"] = job["mimetype"]
+        return result
+    except Exception as e:
+        conn.rollback()
+        print(f"[REPORTS] Failed to read job {job_id}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def purge_expired_reports(max_age_hours=REPORT_RESULT_TTL_HOURS):
+    """Deletes report files and job rows older than max_age_hours. Returns the number of jobs removed."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DELETE FROM report_jobs
+            WHERE created_at < %s
+              AND (status IN ('done', 'failed')
+                   OR COALESCE(heartbeat_at, created_at) < NOW() - make_interval(secs => %s))
+            RETURNING file_path
+            """,
+            (datetime.now() - timedelta(hours=max_age_hours), REPORT_ORPHAN_SECONDS),
+        )
+        removed = cur.rowcount
+        paths = [r[0] for r in cur.fetchall() if r[0]]
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[REPORTS] Purge failed: {e}")
+        return 0
+    finally:
+        conn.close()
+
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"[REPORTS] Could not remove {path}: {e}")
+    if removed:
+        print(f"[REPORTS] Purged {removed} expired report jobs")
+    return removed
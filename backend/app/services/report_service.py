@@ -0,0 +1,162 @@
+"""
+Report builders for the Excel / CSV exports.
+Each build_* function writes one finished report to `path` row by row
+(see app/utils/excel_stream.py) and returns the number of data rows.
+"""
+
+import json
+from datetime import datetime
+from app.models.attendance_model import AttendanceModel
+from app.models.audit_log_model import AuditLogModel
+from app.utils.excel_stream import write_report_xlsx, csv_lines
+from app.utils.roster_matrix import build_roster_matrix
+
+EMPLOYEE_INFO_HEADERS = ["שם מלא (פרטי ומשפחה)", "שם משתמש", "מחלקה", "מדור", "חולייה"]
+
+SNAPSHOT_COLUMNS = {
+    "first_name": "שם פרטי",
+    "last_name": "שם משפחה",
+    "username": "שם משתמש",
+    "status_name": "סטטוס",
+    "team_name": "חוליה",
+    "section_name": "מדור",
+    "department_name": "מחלקה",
+}
+
+HISTORY_HEADERS = ["סטטוס", "התחלה", "סיום", "הערה", 'דווח ע"י']
+
+AUDIT_HEADERS = ["מזהה", "זמן", "משתמש", "סוג פעולה", "תיאור", "מטרה", "כתובת IP", "מידע טכני נוסף"]
+
+# Hebrew Mapping for Export
+AUDIT_ACTION_MAP = {
+    "LOGIN": "התחברות למערכת",
+    "FAILED_LOGIN": "ניסיון התחברות כושל",
+    "BLOCKED_LOGIN": "חסימת התחברות (אבטחה)",
+    "PASSWORD_CHANGE": "שינוי סיסמה",
+    "PROFILE_UPDATE": "עדכון פרטי פרופיל",
+    "TRANSFER_CREATE": "יצירת בקשת העברה",
+    "TRANSFER_APPROVE": "אישור בקשת העברה",
+    "TRANSFER_REJECT": "דחיית בקשת העברה",
+    "TRANSFER_CANCEL": "ביטול בקשת העברה",
+    "IMPERSONATION_START": "התחלת מצב התחזות מנהל",
+    "WEBAUTHN_REGISTER": "רישום מפתח ביומטרי",
+    "WEBAUTHN_LOGIN": "התחברות ביומטרית",
+    "EMPLOYEE_CREATE": "יצירת שוטר חדש",
+    "EMPLOYEE_UPDATE": "עדכון פרטי שוטר",
+    "REPORT_STATUS": "דיווח סטטוס נוכחות",
+}
+
+
+def _format_dt(value, empty="-"):
+    if not value:
+        return empty
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime("%d/%m/%Y %H:%M")
+
+
+def build_range_matrix_report(path, employees, start_date, end_date):
+    """Attendance summary: one row per employee, one status column per day."""
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    emp_ids = [e["id"] for e in employees]
+
+    # Logs arrive ordered by (start_datetime, id) straight from the cursor
+    matrix = build_roster_matrix(
+        emp_ids,
+        start,
+        end,
+        AttendanceModel.iter_logs_for_employees(emp_ids, start_date, end_date),
+        presorted=True,
+    )
+
+    def rows():
+        for emp, days in zip(employees, matrix.label_rows()):
+            yield [
+                f"{emp['first_name']} {emp['last_name']}",
+                emp["username"],
+                emp["department_name"] or "-",
+                emp["section_name"] or "-",
+                emp["team_name"] or "-",
+            ] + days
+
+    title = f"דו\"ח ריכוז נוכחות - {start.strftime('%d/%m/%Y')} עד {end.strftime('%d/%m/%Y')}"
+    return write_report_xlsx(
+        path,
+        "Report",
+        title,
+        EMPLOYEE_INFO_HEADERS + matrix.day_strings("%d/%m"),
+        rows(),
+        title_columns=7,
+    )
+
+
+def build_snapshot_report(path, employees, date_str=None):
+    """Manpower snapshot: one row per employee with the current / dated status."""
+    title = 'דו"ח מצבת כוח אדם'
+    title += f" - נכון ליום {date_str}" if date_str else " - נכון להיום"
+
+    keys = list(SNAPSHOT_COLUMNS.keys())
+    return write_report_xlsx(
+        path,
+        "Report",
+        title,
+        [SNAPSHOT_COLUMNS[k] for k in keys],
+        ([emp.get(k) for k in keys] for emp in employees),
+        title_columns=7,
+    )
+
+
+def build_history_report(path, employee_id, start_date=None, end_date=None):
+    """Status history of one employee (consecutive identical statuses merged)."""
+    rows = (
+        [
+            h["status_name"],
+            _format_dt(h["start_datetime"], empty=""),
+            _format_dt(h["end_datetime"]),
+            h["note"],
+            h["reported_by_name"],
+        ]
+        for h in AttendanceModel.iter_employee_history_export(employee_id, start_date, end_date)
+    )
+    return write_report_xlsx(
+        path,
+        "History",
+        f"היסטוריית דיווחים - שוטר {employee_id}",
+        HISTORY_HEADERS,
+        rows,
+        title_columns=5,
+    )
+
+
+def audit_rows(limit=1000):
+    """Human-readable audit log rows, streamed from the database."""
+    for log in AuditLogModel.iter_recent_activity(limit=limit):
+        meta_str = ""
+        if log.get("metadata"):
+            try:
+                meta_str = json.dumps(log["metadata"], ensure_ascii=False)
+            except Exception:
+                meta_str = str(log["metadata"])
+
+        yield [
+            log.get("id"),
+            log.get("created_at").strftime("%d/%m/%Y %H:%M:%S") if log.get("created_at") else "",
+            log.get("user_name") or "מערכת",
+            AUDIT_ACTION_MAP.get(log.get("action_type"), log.get("action_type")),
+            log.get("description"),
+            log.get("target_name") or "",
+            log.get("ip_address"),
+            meta_str,
+        ]
+
+
+
+def build_audit_csv(path, limit=1000):
+    """Audit report written to a CSV file (same content as the streamed export)."""
+    count = -1  # header line
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in csv_lines(AUDIT_HEADERS, audit_rows(limit)):
+            f.write(chunk)
+            count += 1
+    return count
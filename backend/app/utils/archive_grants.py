@@ -0,0 +1,133 @@
+"""
+Archive Access Grants
+=====================
+A user's approved, unexpired data_restore_requests, loaded with one query
+into an in-memory interval set of (start_date, end_date, expires_at) and
+memoized:
+
+  - per request in flask.g, so the log-source planner, the dashboard's
+    has_archive_access flag and the /check-access route share one load
+  - across requests until the earliest loaded grant expires (or at most
+    GRANTS_TTL_SECONDS, so approvals made by another worker show up)
+
+ArchiveModel.resolve_request() drops the requester's entry via
+invalidate_grants(); expired grants stop answering on their own.
+"""
+
+import threading
+import time
+from datetime import datetime
+from flask import g, has_request_context
+from app.utils.db import get_db_connection
+from app.utils.log_source import as_date
+
+GRANTS_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_cache = {}  # {user_id: (valid_until, GrantSet)}
+
+
+class GrantSet:
+    """Approved archive ranges of one user: containment answered in memory."""
+
+    def __init__(self, grants):
+        # [(start_date, end_date, expires_at)] sorted by start
+        self.grants = sorted(grants)
+
+    def covers(self, start, end=None, now=None):
+        """True when a single unexpired grant covers [start, end] (end defaults to start)."""
+        start = as_date(start)
+        end = as_date(end) or start
+        if start is None:
+            return False
+        now = now or datetime.now()
+        for grant_start, grant_end, expires_at in self.grants:
+            if grant_start > start:
+                break
+            if end <= grant_end and expires_at > now:
+                return True
+        return False
+
+    def valid_until(self, loaded_at):
+        """Monotonic deadline for the cross-request entry."""
+        deadline = loaded_at + GRANTS_TTL_SECONDS
+        if self.grants:
+            first_expiry = min(expires_at for _, _, expires_at in self.grants)
+            deadline = min(deadline, loaded_at + max((first_expiry - datetime.now()).total_seconds(), 0))
+        return deadline
+
+
+def _key(user_id):
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+
+def _load(user_id):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT start_date, end_date, expires_at FROM data_restore_requests
+            WHERE requester_id = %s
+            AND status = 'approved'
+            AND expires_at > NOW()
+            """,
+            (user_id,),
+        )
+        return GrantSet(cur.fetchall())
+    finally:
+        conn.close()
+
+
+def get_grants(user_id):
+    """The user's GrantSet (empty when there are none or the database is unreachable)."""
+    key = _key(user_id)
+
+    memo = None
+    if has_request_context():
+        memo = g.setdefault("_archive_grants", {})
+        if key in memo:
+            return memo[key]
+
+    entry = _cache.get(key)
+    if entry and time.monotonic() < entry[0]:
+        grants = entry[1]
+    else:
+        loaded_at = time.monotonic()
+        grants = _load(key)
+        if grants is None:
+            # No connection: deny, but do not remember it
+            return GrantSet([])
+        with _lock:
+            _cache[key] = (grants.valid_until(loaded_at), grants)
+
+    if memo is not None:
+        memo[key] = grants
+    return grants
+
+
+def has_archive_access(user_id, start, end=None):
+    if user_id is None:
+        return False
+    return get_grants(user_id).covers(start, end)
+
+
+def invalidate_grants(user_id=None):
+    """Drops one user's cached grants, or everyone's when user_id is None."""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(_key(user_id), None)
+    if has_request_context():
+        memo = g.get("_archive_grants")
+        if memo:
+            if user_id is None:
+                memo.clear()
+            else:
+                memo.pop(_key(user_id), None)
@@ -1,6 +1,265 @@
-from datetime import datetime, timedelta
+"""
+Attendance Archive Cycle
+========================
+Moves attendance_logs that started before the cutoff (the first day of last
+month) into attendance_logs_archive - except logs still active at the cutoff
+(open, or ending on/after it), which stay live until they end, so live-period
+queries never read the archive:
+
+    1. whole months: on partitioned installs every live month partition that
+       ends before the cutoff is detached from attendance_logs and attached to
+       attendance_logs_archive (see log_partitions.py) - no rows are copied;
+       the move bumps the backup epoch in the same transaction, since the
+       change triggers do not see it
+    2. leftovers (rows in the default partition, or everything on unpartitioned
+       installs) in bounded batches:
+       - each batch takes the next ARCHIVE_BATCH_SIZE old rows by id,
+         DELETE ... RETURNING them and inserts the returned rows into the
+         archive, all in one statement and one short transaction
+       - the run's checkpoint (last moved id) and metrics are stored in
+         archive_runs in the same transaction as the batch, so an interrupted
+         run (crash / restart) resumes from its checkpoint
+       - the cycle pauses ARCHIVE_BATCH_PAUSE seconds between batches so live
+         traffic is not starved of locks and I/O
+    3. archived logs that are active again (archived before this rule, or
+       reopened / extended in the archive) move back to attendance_logs
+
+A session advisory lock keeps a single cycle running at a time (scheduler,
+backup service and the admin trigger all call run_archive_cycle).
+Audit log rotation runs afterwards, on its own connection.
+"""
+
+import time
+from psycopg2.extras import RealDictCursor
 from app.utils.db import get_db_connection
 from app.utils.audit_rotation import rotate_audit_logs
+from app.utils.current_status import refresh_current_status
+from app.utils.stats_cache import bump_data_version
+from app.utils.change_tracking import bump_backup_epoch
+from app.utils.log_partitions import (
+    LOG_COLUMNS,
+    archive_cutoff,
+    add_partition_bound,
+    archivable_partitions,
+    ensure_log_partitions,
+    move_partition_to_archive,
+    still_active_condition,
+    validate_partition_bound,
+)
+
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_BATCH_PAUSE = 0.2  # seconds between batches
+ARCHIVE_LOCK_KEY = "archive_cycle"
+
+
+def _start_run(cur, cutoff):
+    """Resumes an unfinished run (same or earlier cutoff) or starts a new one."""
+    cur.execute(
+        """
+        SELECT id, last_id, cutoff_date FROM archive_runs
+        WHERE status = 'running' AND cutoff_date <= %s
+        ORDER BY id DESC LIMIT 1
+        """,
+        (cutoff,),
+    )
+    row = cur.fetchone()
+    if row:
+        run_id, last_id, run_cutoff = row
+        cur.execute(
+            "UPDATE archive_runs SET resumes = resumes + 1, cutoff_date = %s, updated_at = NOW() WHERE id = %s",
+            (cutoff, run_id),
+        )
+        print(f"[ARCHIVE] Resuming run {run_id} after id {last_id} (cutoff was {run_cutoff})")
+        return run_id, last_id, True
+
+    cur.execute(
+        "INSERT INTO archive_runs (cutoff_date) VALUES (%s) RETURNING id",
+        (cutoff,),
+    )
+    return cur.fetchone()[0], 0, False
+
+
+def _move_batch(cur, run_id, cutoff, after_id):
+    """Moves the next batch; returns (last id, rows deleted, rows archived, employee ids)."""
+    cur.execute(
+        f"""
+        WITH batch AS (
+            SELECT id FROM attendance_logs
+            WHERE id > %(after)s AND start_datetime < %(cutoff)s
+            AND NOT {still_active_condition("%(cutoff)s")}
+            ORDER BY id
+            LIMIT %(limit)s
+            FOR UPDATE
+        ), moved AS (
+            DELETE FROM attendance_logs al
+            USING batch
+            WHERE al.id = batch.id AND al.start_datetime < %(cutoff)s
+            RETURNING al.*
+        ), archived AS (
+            INSERT INTO attendance_logs_archive ({LOG_COLUMNS})
+            SELECT {LOG_COLUMNS} FROM moved
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        )
+        SELECT
+            MAX(id),
+            COUNT(*),
+            (SELECT COUNT(*) FROM archived),
+            ARRAY_AGG(DISTINCT employee_id)
+        FROM moved
+        """,
+        {"after": after_id, "cutoff": cutoff, "limit": ARCHIVE_BATCH_SIZE},
+    )
+    last_id, deleted, archived, employee_ids = cur.fetchone()
+    if not deleted:
+        return None, 0, 0, []
+
+    # Keep the current-status projection pointing at the (now archived) rows
+    refresh_current_status(cur, employee_ids)
+
+    # Checkpoint commits together with the batch
+    cur.execute(
+        """
+        UPDATE archive_runs
+        SET last_id = %s, batches = batches + 1,
+            rows_deleted = rows_deleted + %s, rows_archived = rows_archived + %s,
+            updated_at = NOW()
+        WHERE id = %s
+        """,
+        (last_id, deleted, archived, run_id),
+    )
+    return last_id, deleted, archived, employee_ids
+
+
+def _move_partitions(conn, cur, run_id, cutoff):
+    """Archives whole month partitions, one short transaction each. Returns their names."""
+    moved = []
+    if not ensure_log_partitions(cur):
+        conn.commit()
+        return moved
+    conn.commit()
+
+    for month, name in archivable_partitions(cur, cutoff):
+        try:
+            # Bound proven first, each step committed on its own: the scan does not block writers
+            add_partition_bound(cur, month, name)
+            conn.commit()
+            validate_partition_bound(cur, name)
+            conn.commit()
+
+            move_partition_to_archive(cur, month, name, cutoff)
+            # DETACH / ATTACH bypasses the change triggers: invalidate delta chains atomically
+            bump_backup_epoch(cur, f"partition {name} archived")
+            cur.execute(
+                "UPDATE archive_runs SET partitions_moved = partitions_moved + 1, updated_at = NOW() WHERE id = %s",
+                (run_id,),
+            )
+            conn.commit()
+            moved.append(name)
+        except Exception as e:
+            # Left attached: its rows are picked up by the batched move below
+            conn.rollback()
+            print(f"[ARCHIVE] Could not move partition {name}: {e}")
+    if moved:
+        print(f"[ARCHIVE] Moved partitions to archive: {', '.join(moved)}")
+    return moved
+
+
+def _return_active_logs(cur, cutoff):
+    """Moves archived logs still active at the cutoff back to attendance_logs. Returns (count, employee ids)."""
+    cur.execute(
+        f"""
+        WITH returned AS (
+            DELETE FROM attendance_logs_archive
+            WHERE {still_active_condition("%(cutoff)s")}
+            RETURNING {LOG_COLUMNS}
+        ), inserted AS (
+            INSERT INTO attendance_logs ({LOG_COLUMNS})
+            SELECT {LOG_COLUMNS} FROM returned
+            RETURNING employee_id
+        )
+        SELECT COUNT(*), ARRAY_AGG(DISTINCT employee_id) FROM inserted
+        """,
+        {"cutoff": cutoff},
+    )
+    count, employee_ids = cur.fetchone()
+    return count, employee_ids or []
+
+
+def _archive_attendance(conn):
+    cur = conn.cursor()
+    cutoff = archive_cutoff()
+    run_id, last_id, resumed = _start_run(cur, cutoff)
+    conn.commit()
+    print(f"[ARCHIVE] Starting attendance archive run {run_id}. Cutoff: {cutoff}")
+
+    started = time.monotonic()
+    batches = deleted_total = archived_total = returned = 0
+    partitions = []
+    try:
+        partitions = _move_partitions(conn, cur, run_id, cutoff)
+        while True:
+            batch_last_id, deleted, archived, _ = _move_batch(cur, run_id, cutoff, last_id)
+            if not deleted:
+                conn.rollback()
+                break
+            conn.commit()
+            last_id = batch_last_id
+            batches += 1
+            deleted_total += deleted
+            archived_total += archived
+            if deleted < ARCHIVE_BATCH_SIZE:
+                break
+            time.sleep(ARCHIVE_BATCH_PAUSE)
+
+        returned, returned_employees = _return_active_logs(cur, cutoff)
+        if returned:
+            refresh_current_status(cur, returned_employees)
+        conn.commit()
+
+        duration = round(time.monotonic() - started, 2)
+        cur.execute(
+            """
+            UPDATE archive_runs
+            SET status = 'done', finished_at = NOW(), updated_at = NOW(),
+                duration_seconds = duration_seconds + %s
+            WHERE id = %s
+            """,
+            (duration, run_id),
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        # Stays 'running': the next cycle resumes from the last committed batch
+        cur.execute(
+            """
+            UPDATE archive_runs
+            SET error = %s, updated_at = NOW(), duration_seconds = duration_seconds + %s
+            WHERE id = %s
+            """,
+            (str(e), round(time.monotonic() - started, 2), run_id),
+        )
+        conn.commit()
+        raise
+
+    if deleted_total or partitions or returned:
+        bump_data_version()
+    print(
+        f"[ARCHIVE] Run {run_id}: {len(partitions)} partitions and {deleted_total} rows "
+        f"moved in {batches} batches, {returned} active logs returned to live ({duration}s)"
+    )
+    return {
+        "run_id": run_id,
+        "resumed": resumed,
+        "cutoff": cutoff.isoformat(),
+        "partitions": partitions,
+        "archived": archived_total,
+        "deleted": deleted_total,
+        "returned": returned,
+        "batches": batches,
+        "duration_seconds": duration,
+    }
+
 
 def run_archive_cycle():
     """
@@ -9,51 +268,48 @@ def run_archive_cycle():
     conn = get_db_connection()
     if not conn:
         return
-    
+
     results = {}
-    
+    locked = False
     try:
         cur = conn.cursor()
-        
-        # --- 1. ATTENDANCE LOGS (Monthly) ---
-        today = datetime.now().date()
-        first_day_this_month = today.replace(day=1)
-        last_month_end = first_day_this_month - timedelta(days=1)
-        cutoff_date_attendance = last_month_end.replace(day=1)
-        
-        print(f"[ARCHIVE] Starting attendance archive. Cutoff: {cutoff_date_attendance}")
-        
-        cur.execute("""
-            INSERT INTO attendance_logs_archive (
-                id, employee_id, status_type_id, start_datetime, end_datetime, 
-                note, reported_by, is_verified, verified_at, created_at
-            )
-            SELECT 
-                id, employee_id, status_type_id, start_datetime, end_datetime, 
-                note, reported_by, is_verified, verified_at, created_at
-            FROM attendance_logs
-            WHERE start_datetime < %s
-            ON CONFLICT (id) DO NOTHING
-        """, (cutoff_date_attendance,))
-        copied_att = cur.rowcount
-        
-        cur.execute("DELETE FROM attendance_logs WHERE start_datetime < %s", (cutoff_date_attendance,))
-        deleted_att = cur.rowcount
-        
-        results["attendance"] = {"archived": copied_att, "deleted": deleted_att}
-
-        # --- 2. AUDIT LOGS (Weekly, to FILE) ---
-        # Using unified service
-        audit_res = rotate_audit_logs()
-        results["audit"] = audit_res or {"status": "no activity"}
-
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (ARCHIVE_LOCK_KEY,))
+        locked = cur.fetchone()[0]
         conn.commit()
-        return results
+        if not locked:
+            print("[ARCHIVE] Another archive cycle is running, skipping")
+            return {"status": "already running"}
+
+        # --- 1. ATTENDANCE LOGS (Monthly, batched) ---
+        results["attendance"] = _archive_attendance(conn)
     except Exception as e:
-        if conn:
-            conn.rollback()
+        conn.rollback()
         print(f"[ARCHIVE] Error: {e}")
         return {"error": str(e)}
     finally:
-        if conn:
-            conn.close()
+        if locked:
+            try:
+                cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (ARCHIVE_LOCK_KEY,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+        conn.close()
+
+    # --- 2. AUDIT LOGS (Weekly, to FILE) ---
+    # Using unified service
+    audit_res = rotate_audit_logs()
+    results["audit"] = audit_res or {"status": "no activity"}
+    return results
+
+
+def get_archive_runs(limit=20):
+    """Latest archive runs with their checkpoint and metrics."""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM archive_runs ORDER BY id DESC LIMIT %s", (limit,))
+        return cur.fetchall()
+    finally:
+        conn.close()
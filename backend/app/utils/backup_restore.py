@@ -0,0 +1,692 @@
+"""
+Backup Restore
+==============
+Restores backups in one transaction, without ever holding a whole file in
+memory. Two input formats are accepted:
+
+    streamed    gzip NDJSON written by backup_stream.py (full base + deltas)
+    legacy      {"metadata": ..., "data": {table: [row objects]}} JSON,
+                plain or gzip'ed, parsed incrementally (_JsonStream)
+
+A restore runs in phases:
+
+    1. foreign keys of the backed-up tables are dropped and their user
+       triggers (change tracking) disabled
+    2. the tables the file contains are emptied (TRUNCATE ... CASCADE) and
+       their secondary indexes dropped: a streamed full backup lists them up
+       front, a legacy file is truncated table by table as its "data" entries
+       are reached - tables it does not hold (e.g. attendance_logs_archive in
+       old manual backups) are kept
+    3. full tables are bulk-loaded with COPY FROM STDIN in batches of
+       COPY_BATCH rows; delta rows are upserted by key, deleted keys removed
+    4. indexes are rebuilt and foreign keys re-added (validated once per
+       table instead of once per row), sequences follow the restored ids
+    5. derived tables (current status, daily facts) are rebuilt
+
+Streamed files are verified table by table (row count / SHA-256 of the row
+lines) before the transaction commits.
+
+A session advisory lock (RESTORE_LOCK_KEY) lets a single restore run across
+all workers; a second one fails with RestoreInProgress. Progress is written
+to the restore_progress row on its own autocommit connection, so
+get_restore_progress() answers from any worker while the restore's
+transaction is still open.
+"""
+
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import re
+from psycopg2.extras import execute_values, Json
+from app.utils.db import get_db_connection
+from app.utils.backup_stream import FORMAT_NAME, BACKUP_TABLES
+from app.utils.change_tracking import table_key, bump_backup_epoch
+from app.utils.current_status import refresh_current_status
+from app.utils.daily_facts import reset_daily_facts
+
+ROW_BATCH = 1000
+COPY_BATCH = 20000
+READ_CHARS = 256 * 1024
+HEADER_CHARS = 64 * 1024
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+RESTORE_LOCK_KEY = "database_restore"
+
+_progress = {"running": False}  # the restore running in this process
+_progress_conn = None  # autocommit connection persisting _progress meanwhile
+
+
+class BackupFormatError(Exception):
+    """The file is not a valid / intact backup."""
+
+
+class RestoreInProgress(Exception):
+    """Another restore is already running (in any worker)."""
+
+
+def get_restore_progress():
+    """Snapshot of the running (or last) restore: phase, table, rows loaded."""
+    conn = get_db_connection()
+    if not conn:
+        return dict(_progress)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT state FROM restore_progress WHERE id = 1")
+        row = cur.fetchone()
+        state = dict(row[0]) if row and row[0] else {"running": False}
+        if state.get("running"):
+            # Lock free = the worker that ran it died mid-restore (its transaction rolled back)
+            cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (RESTORE_LOCK_KEY,))
+            if cur.fetchone()[0]:
+                cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (RESTORE_LOCK_KEY,))
+                state.update(running=False, phase="interrupted")
+        conn.rollback()
+        return state
+    except Exception as e:
+        conn.rollback()
+        print(f"[RESTORE] Could not read progress: {e}")
+        return dict(_progress)
+    finally:
+        conn.close()
+
+
+def _save_progress():
+    if _progress_conn is None:
+        return
+    try:
+        _progress_conn.cursor().execute(
+            """
+            INSERT INTO restore_progress (id, state, updated_at) VALUES (1, %s, NOW())
+            ON CONFLICT (id) DO UPDATE SET state = EXCLUDED.state, updated_at = NOW()
+            """,
+            (Json(_progress),),
+        )
+    except Exception as e:
+        print(f"[RESTORE] Could not save progress: {e}")
+
+
+def _report(**changes):
+    _progress.update(changes)
+    _save_progress()
+    if "table" in changes or "phase" in changes:
+        table = f" {_progress.get('table')}" if _progress.get("table") else ""
+        print(f"[RESTORE] {_progress.get('phase')}{table}: {_progress.get('rows', 0)} rows")
+
+
+def read_manifest(path):
+    """Header record of a backup file (cheap: only the first line is read)."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline(HEADER_CHARS))
+    if header.get("kind") != "header" or header.get("format") != FORMAT_NAME:
+        raise BackupFormatError(f"{path} is not a streamed backup")
+    return header
+
+
+def _check_names(table, columns):
+    """Table / column names come from the file - only known tables and plain identifiers."""
+    if table not in BACKUP_TABLES:
+        raise BackupFormatError(f"Unknown table in backup: {table}")
+    for column in columns:
+        if not _IDENTIFIER.match(column):
+            raise BackupFormatError(f"Invalid column name in {table}: {column}")
+
+
+def _adapt(value):
+    return Json(value) if isinstance(value, (dict, list)) else value
+
+
+def _copy_value(value):
+    """One value in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class _CopyLoader:
+    """Bulk-loads rows of one (emptied) table with COPY FROM STDIN."""
+
+    def __init__(self, cur, table, columns):
+        self.cur = cur
+        self.table = table
+        self.count = 0
+        self.digest = hashlib.sha256()
+        self.sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        self.buffer = io.StringIO()
+        self.pending = 0
+
+    def add(self, values, line=None):
+        if line is not None:
+            self.digest.update(line.encode("utf-8"))
+        self.buffer.write("\t".join(_copy_value(v) for v in values))
+        self.buffer.write("\n")
+        self.count += 1
+        self.pending += 1
+        if self.pending >= COPY_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.buffer.seek(0)
+            self.cur.copy_expert(self.sql, self.buffer)
+            self.buffer = io.StringIO()
+            self.pending = 0
+            _report(table_rows=self.count)
+
+
+class _UpsertLoader:
+    """
+    Batches delta rows of one table into INSERT ... ON CONFLICT (key) statements.
+    Tables without a unique index on the key alone (the partitioned attendance
+    tables, keyed by (id, start_datetime)) replace their rows instead:
+    DELETE by key, then INSERT.
+    """
+
+    def __init__(self, cur, table, columns, upsert_key):
+        self.cur = cur
+        self.table = table
+        self.rows = []
+        self.count = 0
+        self.digest = hashlib.sha256()
+        self.key_index = columns.index(upsert_key)
+        self.upsert_key = upsert_key
+        cols = ", ".join(columns)
+        self.query = f"INSERT INTO {table} ({cols}) VALUES %s"
+        self.replace = not _has_unique_key(cur, table, upsert_key)
+        if not self.replace:
+            updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != upsert_key)
+            self.query += f" ON CONFLICT ({upsert_key}) DO " + (
+                f"UPDATE SET {updates}" if updates else "NOTHING"
+            )
+
+    def add(self, values, line=None):
+        if line is not None:
+            self.digest.update(line.encode("utf-8"))
+        self.rows.append([_adapt(v) for v in values])
+        self.count += 1
+        if len(self.rows) >= ROW_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            if self.replace:
+                self.cur.execute(
+                    f"DELETE FROM {self.table} WHERE {self.upsert_key}::text = ANY(%s)",
+                    ([str(row[self.key_index]) for row in self.rows],),
+                )
+            execute_values(self.cur, self.query, self.rows, page_size=ROW_BATCH)
+            self.rows = []
+
+
+def _has_unique_key(cur, table, column):
+    cur.execute(
+        """
+        SELECT 1 FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = to_regclass(%s) AND i.indisunique AND i.indnatts = 1 AND a.attname = %s
+        """,
+        (table, column),
+    )
+    return cur.fetchone() is not None
+
+
+def _finish_table(loader, applied, source, progress):
+    applied[loader.table] = applied.get(loader.table, 0) + loader.count
+    _report(
+        phase="load",
+        table=loader.table,
+        rows=_progress.get("rows", 0) + loader.count,
+        tables_done=_progress.get("tables_done", 0) + 1,
+    )
+    if progress:
+        progress(source, loader.table, loader.count)
+
+
+def _apply_stream_file(cur, path, expect_full, progress=None):
+    """Applies one streamed backup file. Returns {table: rows applied}."""
+    applied = {}
+    loader = None
+    header = None
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("["):
+                if loader is None:
+                    raise BackupFormatError(f"{path}: row outside of a table")
+                loader.add(json.loads(line), line)
+                continue
+
+            record = json.loads(line)
+            kind = record.get("kind")
+
+            if kind == "header":
+                header = record
+                if header.get("format") != FORMAT_NAME:
+                    raise BackupFormatError(f"{path}: unknown backup format")
+                is_full = header.get("kind", "full") == "full"
+                if is_full != expect_full:
+                    raise BackupFormatError(
+                        f"{path}: expected a {'full' if expect_full else 'delta'} backup"
+                    )
+
+            elif kind == "table":
+                if header is None:
+                    raise BackupFormatError(f"{path}: missing header")
+                _check_names(record["table"], record["columns"])
+                _report(table=record["table"], table_rows=0)
+                if expect_full:
+                    loader = _CopyLoader(cur, record["table"], record["columns"])
+                else:
+                    loader = _UpsertLoader(
+                        cur, record["table"], record["columns"], table_key(record["table"])
+                    )
+
+            elif kind == "table_end":
+                loader.flush()
+                if loader.count != record["rows"] or loader.digest.hexdigest() != record["sha256"]:
+                    raise BackupFormatError(f"{path}: checksum mismatch in table {loader.table}")
+                _finish_table(loader, applied, path, progress)
+                loader = None
+
+            elif kind == "delete":
+                _check_names(record["table"], [record["key"]])
+                cur.execute(
+                    f"DELETE FROM {record['table']} WHERE {record['key']}::text = ANY(%s)",
+                    (record["keys"],),
+                )
+
+            elif kind == "manifest":
+                return applied
+
+    raise BackupFormatError(f"{path}: truncated backup (no manifest)")
+
+
+class _JsonStream:
+    """
+    Minimal pull parser over a text stream: walks objects / arrays one value at
+    a time, so only the current row is ever decoded (json.JSONDecoder.raw_decode
+    on a sliding buffer).
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), "" at the end of the file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise BackupFormatError(f"Invalid backup JSON: expected '{char}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next read
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise BackupFormatError("Invalid backup JSON")
+            self._fill()
+
+    def _separator(self, closing):
+        sep = self.peek()
+        self.pos += 1
+        if sep == closing:
+            return False
+        if sep != ",":
+            raise BackupFormatError(f"Invalid backup JSON: expected ',' or '{closing}'")
+        return True
+
+    def keys(self):
+        """Keys of an object (after its "{"); the caller consumes each value."""
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self._separator("}"):
+                return
+
+    def elements(self):
+        """Values of an array (after its "[")."""
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if not self._separator("]"):
+                return
+
+
+def _open_text(path):
+    """Text stream of a plain or gzip'ed file (a UTF-8 BOM is skipped)."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8-sig")
+    return open(path, "r", encoding="utf-8-sig")
+
+
+def _apply_legacy_file(cur, truncate, path, progress=None):
+    """
+    Loads a legacy JSON backup table by table, emptying each table just before
+    its rows. Returns {table: rows applied}.
+    """
+    applied = {}
+    with _open_text(path) as f:
+        stream = _JsonStream(f)
+        stream.expect("{")
+        found_data = False
+        for key in stream.keys():
+            if key != "data":
+                stream.value()  # metadata
+                continue
+            found_data = True
+            stream.expect("{")
+            for table in stream.keys():
+                stream.expect("[")
+                if table not in BACKUP_TABLES:
+                    # Older files may hold tables this version does not restore
+                    for _ in stream.elements():
+                        pass
+                    continue
+                truncate(table)
+                _report(phase="load", table=table, table_rows=0)
+                loader = None
+                for row in stream.elements():
+                    if loader is None:
+                        columns = list(row.keys())
+                        _check_names(table, columns)
+                        loader = _CopyLoader(cur, table, columns)
+                    loader.add([row.get(c) for c in columns])
+                if loader:
+                    loader.flush()
+                    _finish_table(loader, applied, path, progress)
+        if not found_data:
+            raise BackupFormatError(f"{path}: no \"data\" section")
+    return applied
+
+
+def _drop_indexes(cur, table):
+    """
+    Drops the secondary (non-unique) indexes of an emptied table; returns the
+    statements that re-create them. Primary keys and unique indexes stay:
+    delta upserts rely on them.
+    """
+    cur.execute(
+        """
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s)
+          AND NOT i.indisunique AND NOT i.indisprimary
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """,
+        (table,),
+    )
+    indexes = cur.fetchall()
+    for name, _definition in indexes:
+        cur.execute(f"DROP INDEX {name}")
+    # Partitioned tables: "ON ONLY" would re-create the parent index without its partitions
+    return [definition.replace(" ON ONLY ", " ON ", 1) for _name, definition in indexes]
+
+
+class _Truncation:
+    """
+    Empties the restored tables, each once, and drops their secondary indexes
+    for the load. Runs after _defer_constraints, so the CASCADE only reaches
+    dependent tables outside the backup (derived tables, audit,
+    notifications), never a backed-up table the file does not hold.
+    """
+
+    def __init__(self, cur, tables):
+        self.cur = cur
+        self.run_tables = tables
+        self.tables = []
+        self.indexes = []
+
+    def __call__(self, table):
+        if table not in self.tables and table in self.run_tables:
+            self.cur.execute(f"TRUNCATE TABLE {table} CASCADE")
+            self.indexes.extend(_drop_indexes(self.cur, table))
+            self.tables.append(table)
+
+    def all(self):
+        _report(phase="truncate", table=None)
+        # Children first
+        for table in reversed(self.run_tables):
+            self(table)
+
+
+def _defer_constraints(cur, tables):
+    """
+    Drops the foreign keys of `tables` and disables their user triggers.
+    Returns the statements that put them back.
+    """
+    cur.execute(
+        """
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s)
+        """,
+        (tables,),
+    )
+    foreign_keys = cur.fetchall()
+
+    for table, name, _definition in foreign_keys:
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+    for table in tables:
+        cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+
+    return {
+        "foreign_keys": [
+            (table, f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+            for table, name, definition in foreign_keys
+        ],
+        "tables": tables,
+    }
+
+
+def _restore_deferred(cur, deferred, truncate):
+    """
+    Puts indexes, foreign keys and triggers back. Foreign keys of kept tables
+    (not emptied by the restore) may point at rows the file no longer has: they are
+    re-added NOT VALID instead of failing the restore, so new rows are checked
+    and the kept history stays.
+    """
+    _report(phase="indexes", table=None)
+    cur.execute("SET LOCAL maintenance_work_mem = '256MB'")
+    for statement in truncate.indexes:
+        cur.execute(statement)
+    _report(phase="constraints", table=None)
+    for table, statement in deferred["foreign_keys"]:
+        if table in truncate.tables:
+            cur.execute(statement)
+            continue
+        cur.execute("SAVEPOINT kept_fk")
+        try:
+            cur.execute(statement)
+            cur.execute("RELEASE SAVEPOINT kept_fk")
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT kept_fk")
+            cur.execute(statement + " NOT VALID")
+            print(f"[RESTORE] {table} keeps rows the backup does not reference, constraint left NOT VALID: {e}")
+    for table in deferred["tables"]:
+        cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+
+
+def _reset_sequences(cur, tables):
+    """Sequences follow the restored ids."""
+    for table in tables:
+        cur.execute(
+            """
+            SELECT pg_get_serial_sequence(table_name, 'id') FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'
+            """,
+            (table,),
+        )
+        row = cur.fetchone()
+        if row and row[0]:
+            cur.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {table}), 1))", (row[0],))
+
+
+def _run_restore(tables, load):
+    """
+    Shared transaction around a restore: defer constraints,
+    load(cur, truncate) -> {table: rows} (truncate(table) empties a table the
+    file holds), rebuild, commit.
+    """
+    global _progress_conn
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("Database connection failed")
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (RESTORE_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        conn.rollback()
+        conn.close()
+        raise RestoreInProgress("A restore is already running")
+
+    try:
+        _progress_conn = get_db_connection()
+        if _progress_conn:
+            _progress_conn.autocommit = True
+        _progress.clear()
+        _report(
+            running=True,
+            phase="starting",
+            table=None,
+            rows=0,
+            tables_done=0,
+            started_at=datetime.datetime.now().isoformat(),
+        )
+        existing = []
+        for table in tables:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+            if cur.fetchone()[0]:
+                existing.append(table)
+        tables = existing
+
+        deferred = _defer_constraints(cur, tables)
+        truncate = _Truncation(cur, tables)
+        totals = load(cur, truncate)
+        restored = [table for table in tables if table in truncate.tables]
+        _restore_deferred(cur, deferred, truncate)
+        _reset_sequences(cur, restored)
+
+        # Derived tables were emptied by the TRUNCATE ... CASCADE
+        _report(phase="derived", table=None)
+        refresh_current_status(cur)
+        reset_daily_facts(cur)
+        for table in restored:
+            cur.execute(f"ANALYZE {table}")
+        # Loaded with the change triggers disabled: existing delta chains no longer apply
+        bump_backup_epoch(cur, "database restored")
+        conn.commit()
+
+        _report(phase="done", running=False, finished_at=datetime.datetime.now().isoformat())
+        return totals
+    except Exception as e:
+        conn.rollback()
+        _report(phase="failed", running=False, error=str(e))
+        raise
+    finally:
+        # Session lock: release it before the connection goes back to the pool
+        try:
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (RESTORE_LOCK_KEY,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        conn.close()
+        if _progress_conn:
+            _progress_conn.close()
+        _progress_conn = None
+
+
+def restore_backup_chain(paths, progress=None):
+    """
+    Restores a full streamed backup followed by its deltas (in order), atomically.
+    Returns {table: rows applied} summed over the chain.
+    """
+    if not paths:
+        raise BackupFormatError("Nothing to restore")
+    header = read_manifest(paths[0])
+    if header.get("kind", "full") != "full":
+        raise BackupFormatError(f"{paths[0]}: expected a full backup")
+    for table in header.get("table_list") or []:
+        _check_names(table, [])
+
+    tables = header.get("table_list") or BACKUP_TABLES
+
+    def load(cur, truncate):
+        truncate.all()
+        totals = {}
+        for i, path in enumerate(paths):
+            _report(file=path)
+            for table, count in _apply_stream_file(cur, path, expect_full=(i == 0), progress=progress).items():
+                totals[table] = totals.get(table, 0) + count
+        return totals
+
+    return _run_restore(tables, load)
+
+
+def restore_legacy_backup(path, progress=None):
+    """Restores a legacy JSON backup (plain or gzip'ed). Returns {table: rows applied}."""
+    return _run_restore(
+        BACKUP_TABLES, lambda cur, truncate: _apply_legacy_file(cur, truncate, path, progress)
+    )
+
+
+def is_streamed_backup(path):
+    try:
+        read_manifest(path)
+        return True
+    except (OSError, EOFError, ValueError, BackupFormatError):
+        return False
+
+
+def restore_backup_file(path, progress=None):
+    """Restores an uploaded backup of either format (detected from its content)."""
+    if is_streamed_backup(path):
+        return restore_backup_chain([path], progress=progress)
+    return restore_legacy_backup(path, progress=progress)
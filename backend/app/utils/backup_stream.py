@@ -0,0 +1,250 @@
+"""
+Streamed Backup Format
+======================
+Backups are written table by table from server-side cursors as gzip-compressed
+NDJSON, so memory stays flat regardless of table size.
+
+The file is a sequence of independent gzip members (one per chunk of about
+CHUNK_BYTES of NDJSON). Any gzip reader decompresses it as one stream;
+a chunk can be sent as soon as it is complete. The decompressed lines are:
+
+    {"kind": "header", "format": "mishmarot-backup", "version": 3, ...}
+    {"kind": "table", "table": "roles", "columns": ["id", "name", ...]}
+    [1, "admin", ...]                          one JSON array per row
+    {"kind": "table_end", "table": "roles", "rows": 12, "sha256": "..."}
+    {"kind": "delete", "table": "roles", "key": "id", "keys": ["7"]}   deltas only
+    ...
+    {"kind": "manifest", "tables": {"roles": {"rows": 12, "sha256": "..."}, ...}}
+
+A table's checksum is the SHA-256 of its row lines (UTF-8, newline
+terminated), so a restore can verify every table independently. All tables
+are read in one REPEATABLE READ transaction, i.e. from the same snapshot,
+whose txid snapshot is recorded in the manifest ("snapshot").
+
+A full backup holds every row. A delta (incremental backup) holds the rows
+changed since an earlier backup's snapshot and the keys deleted since then;
+restoring replays the full base, then each delta in order.
+"""
+
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from app.utils.db import get_db_connection
+from app.utils.change_tracking import changed_rows_condition, deleted_keys_query, read_backup_epoch, table_key
+
+FORMAT_NAME = "mishmarot-backup"
+FORMAT_VERSION = 3
+CHUNK_BYTES = 1024 * 1024
+FETCH_ROWS = 2000
+DELETE_BATCH = 1000
+
+# Dependency order (parents first) - restore loads in this order
+BACKUP_TABLES = [
+    "system_settings",
+    "roles",
+    "status_types",
+    "service_types",
+    "departments",
+    "sections",
+    "teams",
+    "employees",
+    "attendance_logs",
+    "attendance_logs_archive",
+    "transfer_requests",
+]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (memoryview, bytes, bytearray)):
+        return "\\x" + bytes(value).hex()
+    return str(value)
+
+
+def _line(obj):
+    return json.dumps(obj, ensure_ascii=False, default=_json_default, separators=(",", ":")) + "\n"
+
+
+class _Chunker:
+    """Collects NDJSON lines and emits them as gzip members of ~CHUNK_BYTES."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, text):
+        data = text.encode("utf-8")
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= CHUNK_BYTES:
+            return self.flush()
+        return None
+
+    def flush(self):
+        if not self.parts:
+            return None
+        member = gzip.compress(b"".join(self.parts), compresslevel=6)
+        self.parts, self.size = [], 0
+        return member
+
+
+def iter_backup(backup_type="manual", tables=None, since_snapshot=None, extra_header=None):
+    """
+    Yields the backup as gzip chunks (bytes). The final manifest is also
+    the generator's return value (see write_backup_file).
+    since_snapshot: write a delta - only rows changed since that transaction
+    snapshot, plus the keys deleted since then (see change_tracking.py).
+    """
+    tables = tables or BACKUP_TABLES
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "backup_type": backup_type,
+        "kind": "delta" if since_snapshot else "full",
+        "created_at": datetime.datetime.now().isoformat(),
+        **(extra_header or {}),
+        "tables": {},
+    }
+    chunker = _Chunker()
+
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("Database connection failed")
+    try:
+        cur = conn.cursor()
+        # One consistent snapshot for every table
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cur.execute("SELECT txid_current_snapshot()::text")
+        manifest["snapshot"] = cur.fetchone()[0]
+        # Read in the same snapshot: an untracked write is either in this backup's data and epoch, or in neither
+        manifest["epoch"] = read_backup_epoch(cur)
+
+        header = {"kind": "header", **{k: v for k, v in manifest.items() if k != "tables"}, "table_list": tables}
+        chunk = chunker.add(_line(header))
+        if chunk:
+            yield chunk
+
+        for table in tables:
+            where, params = "", None
+            if since_snapshot:
+                where = f" WHERE {changed_rows_condition(table)}"
+                params = (table, since_snapshot)
+            order = " ORDER BY id" if _has_id(cur, table) else ""
+
+            cur.execute("SAVEPOINT backup_table")
+            try:
+                named = conn.cursor(name=f"backup_{table}")
+                named.itersize = FETCH_ROWS
+                named.execute(f"SELECT * FROM {table}{where}{order}", params)
+            except Exception as te:
+                cur.execute("ROLLBACK TO SAVEPOINT backup_table")
+                print(f"[BACKUP] Skipping table {table}: {te}")
+                continue
+
+            digest = hashlib.sha256()
+            count = 0
+            columns = None
+            for row in named:
+                if columns is None:
+                    columns = [desc[0] for desc in named.description]
+                    chunk = chunker.add(_line({"kind": "table", "table": table, "columns": columns}))
+                    if chunk:
+                        yield chunk
+                text = _line(list(row))
+                digest.update(text.encode("utf-8"))
+                count += 1
+                chunk = chunker.add(text)
+                if chunk:
+                    yield chunk
+            if columns is None:
+                columns = [desc[0] for desc in named.description] if named.description else []
+                chunk = chunker.add(_line({"kind": "table", "table": table, "columns": columns}))
+                if chunk:
+                    yield chunk
+            named.close()
+            cur.execute("RELEASE SAVEPOINT backup_table")
+
+            manifest["tables"][table] = {"rows": count, "sha256": digest.hexdigest()}
+
+            if since_snapshot:
+                # Keys removed since the previous backup (replayed as deletes)
+                cur.execute(deleted_keys_query(table), (table, since_snapshot))
+                deleted = [r[0] for r in cur.fetchall()]
+                for i in range(0, len(deleted), DELETE_BATCH):
+                    chunk = chunker.add(
+                        _line(
+                            {
+                                "kind": "delete",
+                                "table": table,
+                                "key": table_key(table),
+                                "keys": deleted[i : i + DELETE_BATCH],
+                            }
+                        )
+                    )
+                    if chunk:
+                        yield chunk
+                manifest["tables"][table]["deleted"] = len(deleted)
+            chunk = chunker.add(
+                _line({"kind": "table_end", "table": table, **manifest["tables"][table]})
+            )
+            if chunk:
+                yield chunk
+
+        manifest["completed_at"] = datetime.datetime.now().isoformat()
+        chunker.add(_line({"kind": "manifest", **manifest}))
+        chunk = chunker.flush()
+        if chunk:
+            yield chunk
+        return manifest
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _has_id(cur, table):
+    cur.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'
+        """,
+        (table,),
+    )
+    return cur.fetchone() is not None
+
+
+def manifest_path(path):
+    """auto_backup_X.ndjson.gz -> auto_backup_X.manifest.json"""
+    base = path[: -len(".ndjson.gz")] if path.endswith(".ndjson.gz") else path
+    return base + ".manifest.json"
+
+
+def write_backup_file(path, **kwargs):
+    """Writes iter_backup(**kwargs) to `path` (via a .part file). Returns the manifest."""
+    part_path = path + ".part"
+    generator = iter_backup(**kwargs)
+    try:
+        with open(part_path, "wb") as f:
+            while True:
+                try:
+                    f.write(next(generator))
+                except StopIteration as done:
+                    manifest = done.value
+                    break
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    os.replace(part_path, path)
+    manifest["file"] = os.path.basename(path)
+    manifest["size_bytes"] = os.path.getsize(path)
+    return manifest
@@ -0,0 +1,287 @@
+"""
+Change Tracking (incremental backups)
+=====================================
+Row-level triggers on the backed-up tables record every insert / update /
+delete in backup_changes as (table, row key, txid). An incremental backup
+takes the rows whose changes are not visible in the previous backup's
+transaction snapshot:
+
+    NOT txid_visible_in_snapshot(txid, <previous snapshot>)
+
+Using snapshots instead of a "last change id" watermark also catches
+transactions that started before the previous backup but committed after it.
+Changes already covered by the latest backup are pruned after each run.
+
+Writes the triggers do not see (archiving a month partition with DETACH /
+ATTACH, a restore, pruning the change log) bump the backup epoch instead, in
+the same transaction where possible. Every backup records the epoch it read
+in its own snapshot; a delta may only follow a backup of the current epoch.
+
+The triggers only log while the "tracking" flag in backup_epoch is set, i.e.
+while incremental backups are on (sync_change_tracking, from the backup
+worker). Switching it on bumps the epoch and, in a second transaction,
+records tracking_since: a txid allocated after the switch. A backup is a
+valid delta parent only once every writer that may have missed the switch is
+visible in its snapshot (snapshot xmin > tracking_since).
+"""
+
+from app.utils.db import get_db_connection
+
+CHANGES_TABLE = "backup_changes"
+EPOCH_TABLE = "backup_epoch"
+
+# Row key per tracked table (default: id)
+TABLE_KEYS = {"system_settings": "key"}
+
+
+def table_key(table):
+    return TABLE_KEYS.get(table, "id")
+
+
+def ensure_change_tracking(cur, tables):
+    """Creates the changes table and the per-table triggers (called from setup_database)."""
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+            id BIGSERIAL PRIMARY KEY,
+            table_name VARCHAR(64) NOT NULL,
+            row_key TEXT NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            txid BIGINT NOT NULL DEFAULT txid_current(),
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cur.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{CHANGES_TABLE}_table ON {CHANGES_TABLE}(table_name, row_key)"
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {EPOCH_TABLE} (
+            id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            epoch BIGINT NOT NULL DEFAULT 0,
+            reason TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cur.execute(f"ALTER TABLE {EPOCH_TABLE} ADD COLUMN IF NOT EXISTS tracking BOOLEAN NOT NULL DEFAULT FALSE")
+    cur.execute(f"ALTER TABLE {EPOCH_TABLE} ADD COLUMN IF NOT EXISTS tracking_since BIGINT")
+    cur.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION track_backup_change() RETURNS trigger AS $$
+        DECLARE
+            -- Partitioned tables: the trigger fires on the partition, record the parent
+            tracked_table TEXT := COALESCE(TG_ARGV[1], TG_TABLE_NAME);
+        BEGIN
+            -- Incremental backups off: nothing reads the change log
+            IF NOT COALESCE((SELECT tracking FROM {EPOCH_TABLE} WHERE id = 1), FALSE) THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO {CHANGES_TABLE} (table_name, row_key, op)
+                VALUES (tracked_table, to_jsonb(OLD) ->> TG_ARGV[0], TG_OP);
+                RETURN OLD;
+            END IF;
+            IF TG_OP = 'UPDATE' AND (to_jsonb(OLD) ->> TG_ARGV[0]) IS DISTINCT FROM (to_jsonb(NEW) ->> TG_ARGV[0]) THEN
+                -- Key changed: the old key is gone
+                INSERT INTO {CHANGES_TABLE} (table_name, row_key, op)
+                VALUES (tracked_table, to_jsonb(OLD) ->> TG_ARGV[0], 'DELETE');
+            END IF;
+            INSERT INTO {CHANGES_TABLE} (table_name, row_key, op)
+            VALUES (tracked_table, to_jsonb(NEW) ->> TG_ARGV[0], TG_OP);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in tables:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+        if not cur.fetchone()[0]:
+            continue
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_backup_change ON {table}")
+        cur.execute(
+            f"""
+            CREATE TRIGGER trg_backup_change
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION track_backup_change('{table_key(table)}', '{table}')
+            """
+        )
+
+
+def changed_rows_condition(table):
+    """WHERE fragment (2 params: table, snapshot) for rows changed since the snapshot."""
+    return (
+        f"{table_key(table)}::text IN ("
+        f"SELECT row_key FROM {CHANGES_TABLE} "
+        f"WHERE table_name = %s AND NOT txid_visible_in_snapshot(txid, %s::txid_snapshot))"
+    )
+
+
+def deleted_keys_query(table):
+    """Query (2 params: table, snapshot) for keys changed since the snapshot that no longer exist."""
+    key = table_key(table)
+    return f"""
+        SELECT DISTINCT c.row_key FROM {CHANGES_TABLE} c
+        WHERE c.table_name = %s
+          AND NOT txid_visible_in_snapshot(c.txid, %s::txid_snapshot)
+          AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key}::text = c.row_key)
+    """
+
+
+def bump_backup_epoch(cur, reason):
+    """Untracked write in this transaction: the next backup must be a full one."""
+    cur.execute(
+        f"""
+        INSERT INTO {EPOCH_TABLE} (id, epoch, reason) VALUES (1, 1, %s)
+        ON CONFLICT (id) DO UPDATE
+        SET epoch = {EPOCH_TABLE}.epoch + 1, reason = EXCLUDED.reason, updated_at = NOW()
+        """,
+        (reason,),
+    )
+
+
+def read_backup_epoch(cur):
+    """Current backup epoch as seen by the cursor's snapshot (0 before the first bump)."""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (EPOCH_TABLE,))
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute(f"SELECT epoch FROM {EPOCH_TABLE} WHERE id = 1")
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def current_backup_epoch():
+    """read_backup_epoch on its own connection; None when the database is unreachable."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        return read_backup_epoch(conn.cursor())
+    except Exception as e:
+        print(f"[BACKUP] Reading backup epoch failed: {e}")
+        return None
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def request_full_backup(reason):
+    """bump_backup_epoch on its own connection (after writes that are already committed)."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        bump_backup_epoch(conn.cursor(), reason)
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[BACKUP] Bumping backup epoch failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def read_tracking_state(cur):
+    """(tracking, tracking_since) as seen by the cursor; (False, None) before the first switch."""
+    cur.execute(f"SELECT tracking, tracking_since FROM {EPOCH_TABLE} WHERE id = 1")
+    row = cur.fetchone()
+    return (bool(row[0]), row[1]) if row else (False, None)
+
+
+def tracking_since():
+    """
+    txid a delta parent's snapshot xmin must be past, or None while change
+    tracking is off (or not settled yet, or the database is unreachable).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        tracking, since = read_tracking_state(conn.cursor())
+        return since if tracking else None
+    except Exception as e:
+        print(f"[BACKUP] Reading change tracking state failed: {e}")
+        return None
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def sync_change_tracking(enabled):
+    """
+    Switches the triggers' change logging on or off to match the backup
+    configuration. Only writes when the state changes (or tracking_since is
+    still missing), so it is cheap to call on every worker round.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(f"INSERT INTO {EPOCH_TABLE} (id) VALUES (1) ON CONFLICT (id) DO NOTHING")
+        cur.execute(f"SELECT tracking, tracking_since FROM {EPOCH_TABLE} WHERE id = 1 FOR UPDATE")
+        tracking, since = cur.fetchone()
+
+        if enabled and not tracking:
+            # Start from an empty log; changes made before now are only in a full backup
+            cur.execute(f"DELETE FROM {CHANGES_TABLE}")
+            cur.execute(f"UPDATE {EPOCH_TABLE} SET tracking = TRUE, tracking_since = NULL WHERE id = 1")
+            bump_backup_epoch(cur, "change tracking enabled")
+            conn.commit()
+            print("[BACKUP] Change tracking enabled")
+        elif not enabled and tracking:
+            cur.execute(f"UPDATE {EPOCH_TABLE} SET tracking = FALSE, tracking_since = NULL WHERE id = 1")
+            cur.execute(f"DELETE FROM {CHANGES_TABLE}")
+            conn.commit()
+            print("[BACKUP] Change tracking disabled")
+            return
+        elif not enabled or since is not None:
+            conn.rollback()
+            return
+
+        # Allocated after the switch committed: writers that still saw it off have smaller txids
+        cur.execute(
+            f"""
+            UPDATE {EPOCH_TABLE} SET tracking_since = txid_current()
+            WHERE id = 1 AND tracking AND tracking_since IS NULL
+            """
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[BACKUP] Switching change tracking failed: {e}")
+    finally:
+        conn.close()
+
+
+def snapshot_xmin(snapshot):
+    """xmin of a txid_snapshot text ("xmin:xmax:xip,...")."""
+    return int(str(snapshot).split(":", 1)[0])
+
+
+def prune_changes(snapshot=None):
+    """
+    Drops change rows already covered by the backup taken at `snapshot`
+    (None = everything, e.g. after a restore).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        if snapshot:
+            cur.execute(
+                f"DELETE FROM {CHANGES_TABLE} WHERE txid_visible_in_snapshot(txid, %s::txid_snapshot)",
+                (snapshot,),
+            )
+        else:
+            # DELETE, not TRUNCATE: no ACCESS EXCLUSIVE lock against the logging triggers
+            cur.execute(f"DELETE FROM {CHANGES_TABLE}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[BACKUP] Pruning change log failed: {e}")
+    finally:
+        conn.close()
@@ -0,0 +1,181 @@
+"""
+Current Status Projection
+=========================
+employee_current_status holds, per employee, the latest attendance log that
+started on or before today (live + archive). It is maintained inside the same
+transaction as every write to attendance_logs, and rolled over once a day so
+that non-persistent statuses expire and future-dated roster entries kick in.
+
+"Today" queries join it directly instead of running a
+LATERAL (... ORDER BY start_datetime DESC LIMIT 1) per employee.
+"""
+
+import threading
+from datetime import date, datetime
+from app.utils.db import get_db_connection
+from app.utils.stats_cache import bump_data_version
+
+_LOG_COLS = "id, employee_id, status_type_id, start_datetime, end_datetime, note, is_verified"
+
+_LOCK_NAMESPACE = "employee_current_status"  # advisory lock keys: (namespace, employee id / 0)
+
+_rollover_lock = threading.Lock()
+_fresh_for = None  # date the projection was last confirmed fresh (per process)
+
+
+def refresh_current_status(cur, employee_ids=None):
+    """
+    Recomputes the projection rows for the given employees (or everyone).
+    Must be called with the cursor of the writing transaction so the projection
+    commits / rolls back together with the logs.
+
+    Concurrent refreshes are serialized with transaction advisory locks: one
+    per employee (writers) under a shared global lock that a full rebuild
+    takes exclusively. Each statement after the lock sees the logs the other
+    transaction committed; rows are upserted and only employees the query no
+    longer produces are deleted.
+    """
+    if employee_ids is not None:
+        ids = sorted({int(i) for i in employee_ids if i is not None})
+        if not ids:
+            return
+        cur.execute("SELECT pg_advisory_xact_lock_shared(hashtext(%s), 0)", (_LOCK_NAMESPACE,))
+        # In id order (unnest keeps the sorted array's order): two writers cannot deadlock
+        cur.execute(
+            "SELECT pg_advisory_xact_lock(hashtext(%s), id) FROM unnest(%s::int[]) AS id",
+            (_LOCK_NAMESPACE, ids),
+        )
+        emp_filter = "AND employee_id = ANY(%(ids)s)"
+        stale_filter = "ecs.employee_id = ANY(%(ids)s) AND"
+        params = {"ids": ids}
+    else:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s), 0)", (_LOCK_NAMESPACE,))
+        emp_filter = ""
+        stale_filter = ""
+        params = {}
+
+    cur.execute(
+        f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (al.employee_id)
+                al.employee_id, al.id, al.status_type_id, al.start_datetime, al.end_datetime,
+                al.note, al.is_verified
+            FROM (
+                SELECT {_LOG_COLS} FROM attendance_logs
+                WHERE start_datetime < CURRENT_DATE + 1 {emp_filter}
+                UNION ALL
+                SELECT {_LOG_COLS} FROM attendance_logs_archive
+                WHERE start_datetime < CURRENT_DATE + 1 {emp_filter}
+            ) al
+            JOIN employees e ON e.id = al.employee_id
+            ORDER BY al.employee_id, al.start_datetime DESC, al.id DESC
+        ), removed AS (
+            DELETE FROM employee_current_status ecs
+            WHERE {stale_filter} NOT EXISTS (SELECT 1 FROM latest l WHERE l.employee_id = ecs.employee_id)
+        )
+        INSERT INTO employee_current_status (
+            employee_id, log_id, status_type_id, start_datetime, end_datetime,
+            note, is_verified, status_date, updated_at
+        )
+        SELECT employee_id, id, status_type_id, start_datetime, end_datetime,
+               note, is_verified, CURRENT_DATE, NOW()
+        FROM latest
+        ON CONFLICT (employee_id) DO UPDATE SET
+            log_id = EXCLUDED.log_id,
+            status_type_id = EXCLUDED.status_type_id,
+            start_datetime = EXCLUDED.start_datetime,
+            end_datetime = EXCLUDED.end_datetime,
+            note = EXCLUDED.note,
+            is_verified = EXCLUDED.is_verified,
+            status_date = EXCLUDED.status_date,
+            updated_at = EXCLUDED.updated_at
+        """,
+        params,
+    )
+
+
+def run_status_rollover():
+    """
+    Daily rollover: rebuilds the whole projection for the new day.
+    Scheduled right after midnight; also used as a lazy fallback.
+    """
+    global _fresh_for
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        refresh_current_status(cur)
+        count = cur.rowcount
+        conn.commit()
+        _fresh_for = date.today()
+        # Non-persistent statuses expired / roster entries kicked in for everyone
+        bump_data_version()
+        print(f"[CURRENT-STATUS] Rollover completed for {_fresh_for} ({count} employees)")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[CURRENT-STATUS] Rollover failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def ensure_current_status_fresh():
+    """
+    Cheap guard for read paths: the first call of each day (per process) checks
+    whether the nightly rollover ran, and runs it if it did not.
+    """
+    global _fresh_for
+    today = date.today()
+    if _fresh_for == today:
+        return
+    with _rollover_lock:
+        if _fresh_for == today:
+            return
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT 1 FROM employee_current_status WHERE status_date < CURRENT_DATE LIMIT 1"
+            )
+            stale = cur.fetchone() is not None
+        finally:
+            conn.close()
+
+        if stale:
+            run_status_rollover()
+        else:
+            _fresh_for = today
+
+
+def is_today(value):
+    """True if value (None / 'YYYY-MM-DD' / date / datetime) refers to today."""
+    if not value:
+        return True
+    if isinstance(value, datetime):
+        return value.date() == date.today()
+    if isinstance(value, date):
+        return value == date.today()
+    return str(value)[:10] == date.today().isoformat()
+
+
+def current_status_join(alias="last_log", employee_ref="e.id"):
+    """
+    LEFT JOIN fragment exposing today's active status as `alias`
+    (employee_id, id, status_type_id, start_datetime, end_datetime, note,
+    is_verified, is_persistent). Smart Continuity is applied to the projected
+    log: a dated log is active while end >= today, an open log only if its
+    status is persistent or it started today.
+    """
+    return f"""LEFT JOIN (
+        SELECT ecs.employee_id, ecs.log_id AS id, ecs.status_type_id,
+               ecs.start_datetime, ecs.end_datetime, ecs.note, ecs.is_verified,
+               sti.is_persistent
+        FROM employee_current_status ecs
+        JOIN status_types sti ON ecs.status_type_id = sti.id
+        WHERE (ecs.end_datetime IS NOT NULL AND ecs.end_datetime >= CURRENT_DATE)
+           OR (ecs.end_datetime IS NULL AND (sti.is_persistent = TRUE OR ecs.start_datetime >= CURRENT_DATE))
+    ) {alias} ON {alias}.employee_id = {employee_ref}"""
@@ -0,0 +1,204 @@
+"""
+Daily Status Facts
+==================
+daily_status_facts stores one row per (day, employee) with the status that was
+in effect on that day (Smart Continuity applied) and the employee's unit ids on
+that day. Trend and multi-day comparison analytics aggregate from it instead of
+re-deriving every (day, employee) cell from attendance_logs + archive.
+
+Coverage is tracked in system_settings:
+- daily_facts_covered_from / daily_facts_covered_to: the closed date range that
+  is fully populated. Queries outside it fall back to the live computation.
+
+Maintenance:
+- refresh_daily_facts(): called inside write transactions for the affected
+  employees and days (only within the covered range)
+- run_daily_facts_job(): nightly, extends coverage up to today in chunks
+  (initial backfill of FACTS_HISTORY_DAYS on first run, resumable)
+"""
+
+from datetime import date, datetime, timedelta
+from app.utils.db import get_db_connection
+from app.utils.status_window import active_on_day
+
+FACTS_HISTORY_DAYS = 365
+BACKFILL_CHUNK_DAYS = 31
+
+_LOG_COLS = "id, employee_id, status_type_id, start_datetime, end_datetime"
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _get_setting(cur, key):
+    cur.execute("SELECT value FROM system_settings WHERE key = %s", (key,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row["value"] if isinstance(row, dict) else row[0]
+
+
+def _set_setting(cur, key, value):
+    cur.execute(
+        """
+        INSERT INTO system_settings (key, value, description)
+        VALUES (%s, %s, 'daily_status_facts coverage')
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP
+        """,
+        (key, value),
+    )
+
+
+def get_facts_coverage(cur):
+    """Returns (covered_from, covered_to) as dates, or (None, None) before the first backfill."""
+    covered_from = _get_setting(cur, "daily_facts_covered_from")
+    covered_to = _get_setting(cur, "daily_facts_covered_to")
+    if not covered_from or not covered_to:
+        return None, None
+    return _to_date(covered_from), _to_date(covered_to)
+
+
+def facts_cover(cur, start_date, end_date):
+    """True if every day in [start_date, end_date] is populated in daily_status_facts."""
+    covered_from, covered_to = get_facts_coverage(cur)
+    if not covered_from:
+        return False
+    return covered_from <= _to_date(start_date) and _to_date(end_date) <= covered_to
+
+
+def reset_daily_facts(cur):
+    """
+    Drops all facts and the coverage watermark (e.g. after a database restore);
+    the next nightly run backfills again.
+    """
+    cur.execute("DELETE FROM daily_status_facts")
+    cur.execute(
+        "DELETE FROM system_settings WHERE key IN ('daily_facts_covered_from', 'daily_facts_covered_to')"
+    )
+
+
+def _compute_facts(cur, start_date, end_date, employee_ids=None):
+    emp_filter = ""
+    params = {"start": start_date, "end": end_date}
+    if employee_ids is not None:
+        emp_filter = "AND e.id = ANY(%(ids)s)"
+        params["ids"] = employee_ids
+
+    cur.execute(
+        f"""
+        INSERT INTO daily_status_facts (
+            fact_date, employee_id, status_type_id, is_presence,
+            team_id, section_id, department_id, computed_at
+        )
+        SELECT
+            days.fact_date,
+            e.id,
+            lg.status_type_id,
+            lg.is_presence,
+            e.team_id,
+            COALESCE(t.section_id, e.section_id),
+            COALESCE(s.department_id, s_dir.department_id, e.department_id),
+            NOW()
+        FROM (
+            SELECT d::date AS fact_date
+            FROM generate_series(%(start)s::date, %(end)s::date, INTERVAL '1 day') d
+        ) days
+        CROSS JOIN employees e
+        LEFT JOIN teams t ON e.team_id = t.id
+        LEFT JOIN sections s ON t.section_id = s.id
+        LEFT JOIN sections s_dir ON e.section_id = s_dir.id
+        LEFT JOIN LATERAL (
+            SELECT al.status_type_id, st.is_presence
+            FROM (
+                SELECT {_LOG_COLS} FROM attendance_logs
+                UNION ALL
+                SELECT {_LOG_COLS} FROM attendance_logs_archive
+            ) al
+            JOIN status_types st ON al.status_type_id = st.id
+            WHERE al.employee_id = e.id
+              AND {active_on_day("days.fact_date")}
+            ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
+        ) lg ON TRUE
+        WHERE e.username != 'admin' {emp_filter}
+        ON CONFLICT (fact_date, employee_id) DO UPDATE SET
+            status_type_id = EXCLUDED.status_type_id,
+            is_presence = EXCLUDED.is_presence,
+            team_id = EXCLUDED.team_id,
+            section_id = EXCLUDED.section_id,
+            department_id = EXCLUDED.department_id,
+            computed_at = EXCLUDED.computed_at
+        """,
+        params,
+    )
+
+
+def refresh_daily_facts(cur, employee_ids, start_date=None, end_date=None):
+    """
+    Recomputes facts for the given employees over [start_date, end_date]
+    (defaults: today), clipped to the covered range. Use the writing
+    transaction's cursor so facts commit together with the logs.
+    """
+    ids = sorted({int(i) for i in (employee_ids or []) if i is not None})
+    if not ids:
+        return
+
+    covered_from, covered_to = get_facts_coverage(cur)
+    if not covered_from:
+        return  # Nothing materialized yet - the first nightly run will compute it
+
+    today = date.today()
+    start = max(_to_date(start_date) or today, covered_from)
+    end = min(_to_date(end_date) or today, covered_to)
+    if start > end:
+        return
+    _compute_facts(cur, start, end, ids)
+
+
+def run_daily_facts_job():
+    """
+    Nightly job: re-finalizes the last covered day and extends coverage up to today.
+    On the first run it backfills FACTS_HISTORY_DAYS of history in chunks;
+    each chunk commits and advances the watermark, so an interrupted run resumes.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        today = date.today()
+        covered_from, covered_to = get_facts_coverage(cur)
+
+        if not covered_from:
+            covered_from = today - timedelta(days=FACTS_HISTORY_DAYS)
+            start = covered_from
+            _set_setting(cur, "daily_facts_covered_from", covered_from.isoformat())
+            _set_setting(cur, "daily_facts_covered_to", (covered_from - timedelta(days=1)).isoformat())
+            conn.commit()
+        else:
+            # Recompute the last covered day too (it may have been "today" when computed)
+            start = min(covered_to, today)
+
+        chunks = 0
+        while start <= today:
+            chunk_end = min(start + timedelta(days=BACKFILL_CHUNK_DAYS - 1), today)
+            _compute_facts(cur, start, chunk_end)
+            _set_setting(cur, "daily_facts_covered_to", chunk_end.isoformat())
+            conn.commit()
+            chunks += 1
+            start = chunk_end + timedelta(days=1)
+
+        print(f"[DAILY-FACTS] Coverage {covered_from} .. {today} ({chunks} chunk(s) computed)")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[DAILY-FACTS] Job failed: {e}")
+        return False
+    finally:
+        conn.close()
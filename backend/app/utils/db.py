@@ -1,32 +1,394 @@
+import os
+import sys
+import threading
+import time
+import weakref
+import atexit
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 from flask import current_app, g, has_app_context
 
-def get_db_connection():
-    """יצירת חיבור למסד הנתונים"""
+
+def _get_config():
     # בדיקה אם אנחנו בתוך קונטקסט של אפליקציה
     if not has_app_context():
         # זה קורה אם מנסים להתחבר מחוץ לבקשה, כמו בסקריפט ההקמה
         # במקרה כזה, נייבא את האפליקציה ישירות כדי לקבל גישה לתצורה
         from run import app
-        config = app.config
-    else:
-        # הדרך הרגילה והמועדפת בתוך בקשת HTTP
-        config = current_app.config
+        return app.config
+    # הדרך הרגילה והמועדפת בתוך בקשת HTTP
+    return current_app.config
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became available within DB_POOL_TIMEOUT."""
+
+
+class PooledConnection:
+    """
+    Thin proxy over a psycopg2 connection.
+    Behaves like the raw connection, except that close() hands the
+    connection back to the pool instead of tearing down the socket.
+    """
+
+    def __init__(self, pool, raw, created_at, origin):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_raw", raw)
+        object.__setattr__(self, "_created_at", created_at)
+        object.__setattr__(self, "_checked_out_at", time.monotonic())
+        object.__setattr__(self, "_origin", origin)
+        object.__setattr__(self, "_leak_reported", False)
+
+    def __getattr__(self, name):
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        # e.g. conn.autocommit = True
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        setattr(raw, name, value)
+
+    @property
+    def closed(self):
+        raw = object.__getattribute__(self, "_raw")
+        return 1 if raw is None else raw.closed
+
+    def close(self):
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            return
+        object.__setattr__(self, "_raw", None)
+        self._pool._release(self, raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Same semantics as psycopg2: end the transaction, keep the connection
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def __del__(self):
+        try:
+            raw = object.__getattribute__(self, "_raw")
+        except AttributeError:
+            return
+        if raw is not None:
+            print(f"[DB POOL] Leaked connection reclaimed (checked out at {self._origin})")
+            object.__setattr__(self, "_raw", None)
+            self._pool._release(self, raw, leaked=True)
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+    - min/max size with blocking checkout (up to `timeout` seconds)
+    - health check on checkout (cheap state check, SELECT 1 after `ping_after` idle seconds)
+    - connections are recycled after `max_lifetime` seconds
+    - connections held longer than `leak_timeout` seconds are reported as leaks
+    """
+
+    def __init__(
+        self,
+        connect_kwargs,
+        minconn=2,
+        maxconn=20,
+        timeout=10,
+        max_lifetime=1800,
+        ping_after=30,
+        leak_timeout=120,
+    ):
+        self.connect_kwargs = connect_kwargs
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.leak_timeout = leak_timeout
+        self.pid = os.getpid()
+
+        self._lock = threading.RLock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []  # LIFO stack of (raw, created_at, returned_at)
+        self._checked_out = 0
+        self._waiting = 0
+        self._active = weakref.WeakSet()
+        self._counters = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "timeouts": 0,
+            "leaks_detected": 0,
+            "leaks_reclaimed": 0,
+        }
+
+        # Warm up the minimum number of connections
+        for _ in range(self.minconn):
+            try:
+                raw = self._connect()
+                self._idle.append((raw, time.monotonic(), time.monotonic()))
+            except Exception as e:
+                print(f"[DB POOL] Warm-up connection failed: {e}")
+                break
+
+    def _connect(self):
+        raw = psycopg2.connect(**self.connect_kwargs)
+        with self._lock:
+            self._counters["connections_created"] += 1
+        return raw
+
+    @staticmethod
+    def _close_raw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, raw, created_at, returned_at):
+        now = time.monotonic()
+        if raw.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            with self._lock:
+                self._counters["connections_recycled"] += 1
+            return False
+        if raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - returned_at > self.ping_after:
+            try:
+                raw.autocommit = True
+                cur = raw.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                raw.autocommit = False
+            except Exception:
+                with self._lock:
+                    self._counters["health_check_failures"] += 1
+                return False
+        return True
+
+    @staticmethod
+    def _caller():
+        """Short description of the code that checked the connection out (for leak reports)."""
+        frame = sys._getframe(1)
+        while frame and frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+        if not frame:
+            return "unknown"
+        return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} ({frame.f_code.co_name})"
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            raw = None
+            created_at = returned_at = None
+            with self._available:
+                while True:
+                    if self._idle:
+                        raw, created_at, returned_at = self._idle.pop()
+                        self._checked_out += 1
+                        break
+                    if self._checked_out < self.maxconn:
+                        # Reserve a slot and open a new connection outside the lock
+                        self._checked_out += 1
+                        break
 
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        self._detect_leaks()
+                        raise PoolTimeoutError(
+                            f"No database connection available within {self.timeout}s "
+                            f"(max={self.maxconn}, in use={self._checked_out})"
+                        )
+                    self._counters["waits"] += 1
+                    self._waiting += 1
+                    wait_started = time.monotonic()
+                    self._available.wait(remaining)
+                    self._waiting -= 1
+                    self._counters["wait_time_ms"] += (time.monotonic() - wait_started) * 1000
+
+            if raw is not None:
+                if self._is_healthy(raw, created_at, returned_at):
+                    return self._wrap(raw, created_at)
+                # Broken / expired connection - drop it and try again
+                self._close_raw(raw)
+                with self._available:
+                    self._checked_out -= 1
+                    self._available.notify()
+                continue
+
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._available:
+                    self._checked_out -= 1
+                    self._available.notify()
+                raise
+            return self._wrap(raw, time.monotonic())
+
+    def _wrap(self, raw, created_at):
+        proxy = PooledConnection(self, raw, created_at, self._caller())
+        with self._lock:
+            self._counters["checkouts"] += 1
+            self._active.add(proxy)
+        return proxy
+
+    def _release(self, proxy, raw, leaked=False):
+        now = time.monotonic()
+        created_at = object.__getattribute__(proxy, "_created_at")
+        reusable = False
+        try:
+            if not raw.closed and os.getpid() == self.pid:
+                # Read-only callers never commit - end their transaction here
+                if raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+                if raw.autocommit:
+                    raw.autocommit = False
+                reusable = not self.max_lifetime or now - created_at <= self.max_lifetime
+        except Exception:
+            reusable = False
+
+        if not reusable:
+            self._close_raw(raw)
+
+        with self._available:
+            self._checked_out -= 1
+            self._active.discard(proxy)
+            if leaked:
+                self._counters["leaks_reclaimed"] += 1
+            if reusable:
+                self._idle.append((raw, created_at, now))
+            self._available.notify()
+
+    def _detect_leaks(self):
+        """Report connections checked out for longer than leak_timeout (once per connection)."""
+        now = time.monotonic()
+        leaks = []
+        with self._lock:
+            for proxy in list(self._active):
+                held = now - object.__getattribute__(proxy, "_checked_out_at")
+                if held < self.leak_timeout:
+                    continue
+                origin = object.__getattribute__(proxy, "_origin")
+                leaks.append({"origin": origin, "held_seconds": round(held, 1)})
+                if not object.__getattribute__(proxy, "_leak_reported"):
+                    object.__setattr__(proxy, "_leak_reported", True)
+                    self._counters["leaks_detected"] += 1
+                    print(f"[DB POOL] Possible connection leak: held {held:.0f}s, checked out at {origin}")
+        return leaks
+
+    def stats(self):
+        leaks = self._detect_leaks()
+        with self._lock:
+            counters = dict(self._counters)
+            counters["wait_time_ms"] = round(counters["wait_time_ms"], 1)
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._checked_out + len(self._idle),
+                "idle": len(self._idle),
+                "in_use": self._checked_out,
+                "waiting": self._waiting,
+                "timeout_seconds": self.timeout,
+                "max_lifetime_seconds": self.max_lifetime,
+                "leak_timeout_seconds": self.leak_timeout,
+                "counters": counters,
+                "suspected_leaks": leaks,
+            }
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw, _, _ in idle:
+            self._close_raw(raw)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it on first use (and again after a fork)."""
+    global _pool
+    if _pool is not None and _pool.pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            config = _get_config()
+            _pool = ConnectionPool(
+                connect_kwargs={
+                    "host": config.get('DB_HOST'),
+                    "database": config.get('DB_NAME'),
+                    "user": config.get('DB_USER'),
+                    "password": config.get('DB_PASS'),
+                    "port": config.get('DB_PORT', 5432),
+                },
+                minconn=config.get('DB_POOL_MIN', 2),
+                maxconn=config.get('DB_POOL_MAX', 20),
+                timeout=config.get('DB_POOL_TIMEOUT', 10),
+                max_lifetime=config.get('DB_POOL_MAX_LIFETIME', 1800),
+                ping_after=config.get('DB_POOL_PING_AFTER', 30),
+                leak_timeout=config.get('DB_POOL_LEAK_TIMEOUT', 120),
+            )
+    return _pool
+
+
+def get_pool_stats():
+    """מדדי מאגר החיבורים (לתצוגת מנהל)"""
+    if _pool is None or _pool.pid != os.getpid():
+        return {"initialized": False}
+    return {"initialized": True, **_pool.stats()}
+
+
+def get_db_connection():
+    """קבלת חיבור ממאגר החיבורים. conn.close() מחזיר את החיבור למאגר."""
     try:
-        conn = psycopg2.connect(
-            host=config.get('DB_HOST'),
-            database=config.get('DB_NAME'),
-            user=config.get('DB_USER'),
-            password=config.get('DB_PASS'),
-            port=config.get('DB_PORT', 5432)
-        )
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         print(f"ERROR: Database connection failed: {e}")
         return None
 
+
+def stream_query(query, params=None, itersize=2000):
+    """
+    מריץ שאילתה עם server-side cursor ומחזיר את השורות (RealDict) אחת אחת,
+    כך שדוחות גדולים לא נטענים לזיכרון בבת אחת.
+    החיבור מוחזק עד סוף המעבר על השורות (או סגירת ה-generator).
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("Database connection failed")
+    try:
+        cur = conn.cursor(name=f"stream_{threading.get_ident()}_{time.monotonic_ns()}", cursor_factory=RealDictCursor)
+        cur.itersize = itersize
+        cur.execute(query, params)
+        for row in cur:
+            yield row
+        cur.close()
+    finally:
+        # Read-only: end the transaction the named cursor lived in
+        conn.rollback()
+        conn.close()
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.closeall()
+
+
 def get_db():
     """חיבור לשימוש בתוך בקשה (Request context)"""
     if 'db' not in g:
@@ -37,4 +399,4 @@ def close_db(e=None):
     """סגירת החיבור בסיום הבקשה"""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,128 @@
+"""
+Managed Indexes
+===============
+Indexes that the attendance hot paths rely on. setup_database() creates them
+(CREATE INDEX IF NOT EXISTS); check_indexes() runs at startup and reports
+managed indexes that are missing, plus indexes on the attendance tables that
+pg_stat_user_indexes shows as never scanned.
+"""
+
+from psycopg2.extras import RealDictCursor
+from app.utils.db import get_db_connection
+
+MANAGED_INDEXES = [
+    # "Latest log per employee" - the ordering used by every LATERAL / DISTINCT ON lookup
+    (
+        "idx_attendance_logs_emp_start",
+        "attendance_logs",
+        "(employee_id, start_datetime DESC, id DESC)",
+    ),
+    (
+        "idx_attendance_logs_archive_emp_start",
+        "attendance_logs_archive",
+        "(employee_id, start_datetime DESC, id DESC)",
+    ),
+    # Day-window scans (daily log, roster, history exports)
+    (
+        "idx_attendance_logs_start_end",
+        "attendance_logs",
+        "(start_datetime, end_datetime)",
+    ),
+    # Open statuses: "close previous" updates and Smart Continuity lookups
+    (
+        "idx_attendance_logs_open",
+        "attendance_logs",
+        "(employee_id, start_datetime DESC) WHERE end_datetime IS NULL",
+    ),
+    # Archived logs still active at the cutoff (archive_service._return_active_logs)
+    (
+        "idx_attendance_logs_archive_end",
+        "attendance_logs_archive",
+        "(end_datetime)",
+    ),
+    # Roster approval only touches unverified rows
+    (
+        "idx_attendance_logs_unverified",
+        "attendance_logs",
+        "(start_datetime) WHERE is_verified = FALSE",
+    ),
+]
+
+# No longer used by any query (DATE(...) predicates became sargable ranges, see status_window.py)
+RETIRED_INDEXES = [
+    "idx_attendance_logs_start_day",
+    "idx_attendance_logs_end_day",
+]
+
+MANAGED_TABLES = sorted({table for _, table, _ in MANAGED_INDEXES})
+
+
+def ensure_indexes(cur):
+    """Creates any missing managed index and drops retired ones (called from setup_database)."""
+    for name in RETIRED_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name};")
+    for name, table, definition in MANAGED_INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition};")
+
+
+def get_index_report(cur):
+    """
+    Returns {"missing": [...], "unused": [...], "indexes": [...]} for the
+    managed tables. "unused" lists non-unique indexes with idx_scan = 0
+    (statistics are cumulative since the last pg_stat_reset).
+    On partitioned tables scans and size are summed over the partitions' indexes.
+    """
+    cur.execute(
+        """
+        SELECT t.relname AS table_name, ic.relname AS index_name,
+               (SELECT COALESCE(SUM(s.idx_scan), 0)::bigint
+                FROM pg_partition_tree(ic.oid) pt
+                JOIN pg_stat_user_indexes s ON s.indexrelid = pt.relid) AS idx_scan,
+               (SELECT COALESCE(SUM(pg_relation_size(pt.relid)), 0)::bigint
+                FROM pg_partition_tree(ic.oid) pt) AS size_bytes,
+               i.indisunique AS is_unique
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relname = ANY(%s) AND t.relnamespace = current_schema()::regnamespace
+        ORDER BY t.relname, ic.relname
+        """,
+        (MANAGED_TABLES,),
+    )
+    indexes = [dict(r) for r in cur.fetchall()]
+    existing = {r["index_name"] for r in indexes}
+    managed = {name for name, _, _ in MANAGED_INDEXES}
+
+    return {
+        "missing": [name for name, _, _ in MANAGED_INDEXES if name not in existing],
+        "unused": [
+            r["index_name"]
+            for r in indexes
+            if r["idx_scan"] == 0 and not r["is_unique"]
+        ],
+        "indexes": [
+            {**r, "managed": r["index_name"] in managed} for r in indexes
+        ],
+    }
+
+
+def check_indexes():
+    """Startup check - prints missing / never-used indexes on the attendance tables."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        report = get_index_report(cur)
+        if report["missing"]:
+            print(f"[INDEXES] Missing managed indexes: {', '.join(report['missing'])}")
+        if report["unused"]:
+            print(f"[INDEXES] Indexes never scanned: {', '.join(report['unused'])}")
+        if not report["missing"] and not report["unused"]:
+            print("[INDEXES] All managed indexes present and in use.")
+        return report
+    except Exception as e:
+        print(f"[INDEXES] Index check failed: {e}")
+        return None
+    finally:
+        conn.close()
@@ -0,0 +1,129 @@
+"""
+Streaming Report Export
+=======================
+Reports are written row by row instead of through a pandas DataFrame and an
+in-memory BytesIO:
+
+    rows (server-side cursor / matrix) -> xlsxwriter constant_memory
+    -> temp file -> chunked response (temp file removed once sent)
+
+In constant_memory mode xlsxwriter flushes every finished row to disk, so
+memory stays flat regardless of the report size. An .xlsx is a zip whose
+directory is written last, so the workbook is completed on disk first and
+then sent in chunks; CSV needs no container and streams directly.
+
+Layout matches the previous exports: right-to-left sheet, merged Hebrew
+title in row 1, bold headers in row 3, data from row 4.
+"""
+
+import csv
+import io
+import os
+import tempfile
+import xlsxwriter
+from flask import Response, stream_with_context
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNK_SIZE = 64 * 1024
+
+
+def write_report_xlsx(path, sheet_name, title, headers, rows, title_columns=None):
+    """
+    Writes one report sheet to `path`. `rows` is any iterable of value lists
+    (consumed once, in order). Returns the number of data rows written.
+    """
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.right_to_left()
+
+        title_format = workbook.add_format({"bold": True, "font_size": 14})
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+
+        # constant_memory: rows must be written top to bottom
+        span = max(title_columns or len(headers), 1)
+        if span > 1:
+            worksheet.merge_range(0, 0, 0, span - 1, title, title_format)
+        else:
+            worksheet.write(0, 0, title, title_format)
+        worksheet.write_row(2, 0, headers, header_format)
+
+        count = 0
+        for row in rows:
+            worksheet.write_row(3 + count, 0, row)
+            count += 1
+        return count
+    finally:
+        workbook.close()
+
+
+def file_response(path, download_name, mimetype, delete=True):
+    """Sends a file in CHUNK_SIZE pieces; removes it afterwards when `delete`."""
+    size = os.path.getsize(path)
+
+    def generate():
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            if delete and os.path.exists(path):
+                os.remove(path)
+
+    response = Response(generate(), mimetype=mimetype, direct_passthrough=True)
+    response.headers["Content-Length"] = str(size)
+    response.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+    return response
+
+
+def xlsx_response(build, download_name, allow_empty=True):
+    """
+    build(path) writes the workbook (e.g. via write_report_xlsx) into a temp
+    file, which is then streamed back and deleted.
+    Returns None when build reported 0 rows and allow_empty is False.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="report_")
+    os.close(fd)
+    try:
+        count = build(path)
+    except Exception:
+        os.remove(path)
+        raise
+    if not allow_empty and not count:
+        os.remove(path)
+        return None
+    return file_response(path, download_name, XLSX_MIMETYPE)
+
+
+def csv_lines(headers, rows, bom=True):
+    """Encodes header + rows as CSV text, one chunk per row (BOM for Hebrew in Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return text
+
+    if bom:
+        buffer.write("\ufeff")
+    writer.writerow(headers)
+    yield flush()
+    for row in rows:
+        writer.writerow(row)
+        yield flush()
+
+
+def csv_response(headers, rows, download_name):
+    """Streams a CSV straight from `rows` (kept inside the request context)."""
+    response = Response(
+        stream_with_context(csv_lines(headers, rows)),
+        mimetype="text/csv",
+    )
+    response.headers["Content-type"] = "text/csv; charset=utf-8"
+    response.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+    return response
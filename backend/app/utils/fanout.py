@@ -0,0 +1,48 @@
+"""
+Concurrent Query Fan-out
+========================
+Runs independent model calls of one request in parallel. Each task runs in
+its own app context on a shared worker pool and checks its own connection out
+of the DB pool (get_db_connection), so the calls overlap instead of running
+one after the other.
+
+Keep FANOUT_WORKERS well below DB_POOL_MAX: every running task holds one
+pooled connection.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+FANOUT_WORKERS = 6
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def run_concurrently(tasks):
+    """
+    tasks: {name: zero-argument callable}.
+    Returns (results, errors, timings_ms); a failed task yields None in results
+    and its message in errors - one slow or broken section never fails the rest.
+    """
+    app = current_app._get_current_object()
+
+    def _run(func):
+        started = time.perf_counter()
+        with app.app_context():
+            try:
+                return func(), None, (time.perf_counter() - started) * 1000
+            except Exception as e:
+                return None, str(e), (time.perf_counter() - started) * 1000
+
+    futures = {name: _executor.submit(_run, func) for name, func in tasks.items()}
+
+    results, errors, timings = {}, {}, {}
+    for name, future in futures.items():
+        value, error, elapsed_ms = future.result()
+        results[name] = value
+        timings[name] = round(elapsed_ms, 1)
+        if error:
+            print(f"[FANOUT] Task '{name}' failed: {error}")
+            errors[name] = error
+    return results, errors, timings
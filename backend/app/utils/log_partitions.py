@@ -0,0 +1,313 @@
+"""
+Attendance Log Partitions
+=========================
+attendance_logs and attendance_logs_archive are range-partitioned by month on
+start_datetime:
+
+    attendance_logs           attendance_logs_p2025_02 ... (+ MONTHS_AHEAD), attendance_logs_default
+    attendance_logs_archive   attendance_logs_p2025_01, ...,                  attendance_logs_archive_default
+
+A month partition keeps its name for life. Archiving a month detaches its
+partition from attendance_logs and attaches it to attendance_logs_archive
+(metadata only - a check constraint, validated beforehand in its own
+transaction, lets the ATTACH skip its scan), so no rows are copied - except
+the month's logs that are still active (open, or ending on/after the
+cutoff), which move back into attendance_logs (its default partition) and
+stay live until they end. Rows whose month has no partition on that
+side (backdated entries for an archived month, roster entries planned beyond
+MONTHS_AHEAD) land in the default partition; the archive cycle moves the old
+ones in batches, and creating a month partition adopts its rows from the
+default partition.
+
+Queries constrained on start_datetime only touch the matching partitions
+(partition pruning); the archive only holds months before archive_cutoff().
+
+Plain (unpartitioned) tables from older installs keep working - every helper
+here is a no-op for them until migrate_log_partitions.py converts them.
+Helpers expect a plain (tuple) cursor.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+LIVE_TABLE = "attendance_logs"
+ARCHIVE_TABLE = "attendance_logs_archive"
+MONTHS_AHEAD = 3
+PARTITION_LOCK_KEY = "attendance_log_partitions"  # serializes partition creation
+
+LOG_COLUMNS = (
+    "id, employee_id, status_type_id, start_datetime, end_datetime, "
+    "note, reported_by, is_verified, verified_at, created_at"
+)
+
+
+def still_active_condition(param="%s"):
+    """WHERE fragment for logs that stay live at the archive cutoff `param`: open, or ending on/after it."""
+    return f"(end_datetime IS NULL OR end_datetime >= {param})"
+
+
+_PARTITION_NAME = re.compile(r"^attendance_logs_p(\d{4})_(\d{2})$")
+
+
+def month_start(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(today=None):
+    """First day of last month: on March 1st, everything before February is archived."""
+    today = today or datetime.now().date()
+    last_month_end = today.replace(day=1) - timedelta(days=1)
+    return last_month_end.replace(day=1)
+
+
+def partition_name(month):
+    return f"attendance_logs_p{month.year}_{month.month:02d}"
+
+
+def is_partitioned(cur, table):
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def month_partitions(cur, parent):
+    """{month: partition name} of the month partitions currently attached to `parent`."""
+    cur.execute(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        (parent,),
+    )
+    months = {}
+    for (name,) in cur.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+def _adopt_default_rows(cur, parent, name, month):
+    """Moves the month's rows out of parent's default partition into `name` (not attached yet)."""
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {parent}_default
+            WHERE start_datetime >= %s AND start_datetime < %s
+            RETURNING {LOG_COLUMNS}
+        )
+        INSERT INTO {name} ({LOG_COLUMNS}) SELECT {LOG_COLUMNS} FROM moved
+        """,
+        (month.isoformat(), add_months(month, 1).isoformat()),
+    )
+    return cur.rowcount
+
+
+def create_month_partition(cur, month):
+    """Creates the live partition for `month`, taking over its rows from the default partition."""
+    name = partition_name(month)
+    cur.execute(f"CREATE TABLE {name} (LIKE {LIVE_TABLE} INCLUDING DEFAULTS)")
+    _adopt_default_rows(cur, LIVE_TABLE, name, month)
+    cur.execute(
+        f"ALTER TABLE {LIVE_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+        (month.isoformat(), add_months(month, 1).isoformat()),
+    )
+    return name
+
+
+def ensure_log_partitions(cur, today=None):
+    """
+    Default partitions plus live month partitions from the archive cutoff up to
+    MONTHS_AHEAD months ahead (called from setup_database and the archive cycle).
+    Returns False when the attendance tables are not partitioned.
+    """
+    if not is_partitioned(cur, LIVE_TABLE):
+        return False
+    # Concurrent setup_database runs / archive cycles: one creator at a time,
+    # and the partitions are (re)read only after the lock is held
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (PARTITION_LOCK_KEY,))
+    for parent in (LIVE_TABLE, ARCHIVE_TABLE):
+        if is_partitioned(cur, parent):
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {parent}_default PARTITION OF {parent} DEFAULT")
+
+    existing = set(month_partitions(cur, LIVE_TABLE)) | set(month_partitions(cur, ARCHIVE_TABLE))
+    today = today or datetime.now().date()
+    month = archive_cutoff(today)
+    last = add_months(month_start(today), MONTHS_AHEAD)
+    while month <= last:
+        if month not in existing:
+            create_month_partition(cur, month)
+        month = add_months(month, 1)
+    return True
+
+
+def archivable_partitions(cur, cutoff):
+    """[(month, name)] of live month partitions that end on or before the cutoff."""
+    if not (is_partitioned(cur, LIVE_TABLE) and is_partitioned(cur, ARCHIVE_TABLE)):
+        return []
+    return [
+        (month, name)
+        for month, name in sorted(month_partitions(cur, LIVE_TABLE).items())
+        if add_months(month, 1) <= cutoff
+    ]
+
+
+def _bound_name(name):
+    return f"{name}_bound"
+
+
+def add_partition_bound(cur, month, name):
+    """
+    Adds the month's range as a NOT VALID check constraint (brief lock, no scan).
+    Commit it, then validate_partition_bound() in a separate transaction.
+    Kept when a move fails, so a later cycle reuses it.
+    """
+    bound = _bound_name(name)
+    cur.execute(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(%s) AND conname = %s",
+        (name, bound),
+    )
+    if cur.fetchone():
+        return
+    cur.execute(
+        f"""
+        ALTER TABLE {name} ADD CONSTRAINT {bound}
+        CHECK (start_datetime IS NOT NULL AND start_datetime >= %s AND start_datetime < %s) NOT VALID
+        """,
+        (month.isoformat(), add_months(month, 1).isoformat()),
+    )
+
+
+def validate_partition_bound(cur, name):
+    """The validation scan (SHARE UPDATE EXCLUSIVE: writers keep going); run in its own transaction."""
+    cur.execute(f"ALTER TABLE {name} VALIDATE CONSTRAINT {_bound_name(name)}")
+
+
+def move_partition_to_archive(cur, month, name, cutoff):
+    """
+    Detaches a live month partition and attaches it to the archive. Only the
+    month's still-active logs are copied (back into attendance_logs).
+    Expects the validated bound from add_partition_bound / validate_partition_bound,
+    so the ATTACH skips its scan.
+    Returns the number of logs kept live.
+    """
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+
+    cur.execute(f"ALTER TABLE {LIVE_TABLE} DETACH PARTITION {name}")
+    # Detached: the month is no longer covered, so these land in the live default partition
+    cur.execute(
+        f"""
+        WITH kept AS (
+            DELETE FROM {name} WHERE {still_active_condition()}
+            RETURNING {LOG_COLUMNS}
+        )
+        INSERT INTO {LIVE_TABLE} ({LOG_COLUMNS}) SELECT {LOG_COLUMNS} FROM kept
+        """,
+        (cutoff.isoformat(),),
+    )
+    kept = cur.rowcount
+    _adopt_default_rows(cur, ARCHIVE_TABLE, name, month)
+    cur.execute(
+        f"ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+        (lower, upper),
+    )
+    cur.execute(f"ALTER TABLE {name} DROP CONSTRAINT {_bound_name(name)}")
+    return kept
+
+
+def _foreign_keys(cur, table):
+    cur.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        (table,),
+    )
+    return cur.fetchall()
+
+
+def _add_foreign_keys(cur, table, foreign_keys):
+    for name, definition in foreign_keys:
+        cur.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+
+
+def _convert_archive(cur, cutoff):
+    """
+    The existing archive table becomes a single partition (MINVALUE up to the
+    month after its newest row) of a new partitioned attendance_logs_archive.
+    No rows are copied; its indexes are renamed so the parent's indexes can
+    reuse the managed names and adopt them.
+    """
+    legacy = f"{ARCHIVE_TABLE}_legacy"
+    cur.execute(f"SELECT MAX(start_datetime) FROM {ARCHIVE_TABLE}")
+    newest = cur.fetchone()[0]
+    upper = cutoff if newest is None or month_start(newest) < cutoff else add_months(month_start(newest), 1)
+
+    foreign_keys = _foreign_keys(cur, ARCHIVE_TABLE)
+    cur.execute(f"ALTER TABLE {ARCHIVE_TABLE} RENAME TO {legacy}")
+    cur.execute(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = to_regclass(%s)",
+        (legacy,),
+    )
+    for (index_name,) in cur.fetchall():
+        cur.execute(f'ALTER INDEX "{index_name}" RENAME TO "{(index_name + "_legacy")[:63]}"')
+
+    cur.execute(
+        f"CREATE TABLE {ARCHIVE_TABLE} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (start_datetime)"
+    )
+    cur.execute(
+        f"ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO (%s)",
+        (upper.isoformat(),),
+    )
+    cur.execute(f"ALTER TABLE {ARCHIVE_TABLE} ADD PRIMARY KEY (id, start_datetime)")
+    _add_foreign_keys(cur, ARCHIVE_TABLE, foreign_keys)
+    return {"partition": legacy, "upper_bound": upper.isoformat()}
+
+
+def _convert_live(cur, today):
+    """
+    attendance_logs is rebuilt as a partitioned table and its rows copied over
+    (it only holds the last two months plus planned days); the id sequence is
+    handed over to the new table.
+    """
+    legacy = f"{LIVE_TABLE}_unpartitioned"
+    foreign_keys = _foreign_keys(cur, LIVE_TABLE)
+    cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (LIVE_TABLE,))
+    sequence = cur.fetchone()[0]
+
+    cur.execute(f"ALTER TABLE {LIVE_TABLE} RENAME TO {legacy}")
+    cur.execute(
+        f"CREATE TABLE {LIVE_TABLE} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (start_datetime)"
+    )
+    ensure_log_partitions(cur, today)
+    cur.execute(f"INSERT INTO {LIVE_TABLE} SELECT * FROM {legacy}")
+    copied = cur.rowcount
+
+    if sequence:
+        cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {LIVE_TABLE}.id")
+    cur.execute(f"DROP TABLE {legacy}")
+    # Constraints after the copy: one index build / validation pass each
+    cur.execute(f"ALTER TABLE {LIVE_TABLE} ADD PRIMARY KEY (id, start_datetime)")
+    _add_foreign_keys(cur, LIVE_TABLE, foreign_keys)
+    return {"rows_copied": copied}
+
+
+def convert_to_partitioned(cur, today=None):
+    """
+    In-place migration of plain attendance tables (run by migrate_log_partitions.py,
+    in one transaction). Managed indexes and change-tracking triggers are
+    re-created afterwards by setup_database().
+    """
+    summary = {}
+    cutoff = archive_cutoff(today)
+    if not is_partitioned(cur, ARCHIVE_TABLE):
+        summary["archive"] = _convert_archive(cur, cutoff)
+    if not is_partitioned(cur, LIVE_TABLE):
+        summary["live"] = _convert_live(cur, today)
+    ensure_log_partitions(cur, today)
+    return summary
@@ -0,0 +1,81 @@
+"""
+Log Source Planner
+==================
+Attendance logs live in two relations (both partitioned by month, see
+log_partitions.py):
+
+    attendance_logs           logs that started on or after archive_cutoff(),
+                              older logs still active at the cutoff (open, or
+                              ending on/after it), and stragglers the archive
+                              cycle has not moved yet
+    attendance_logs_archive   logs that started and ended before it
+
+Every log query reads logs that started on or before a day of its window, so
+plan_log_source() returns the smallest relation expression for a
+[window_start, window_end] window:
+
+    window starts on/after the cutoff    attendance_logs
+    window starts before the cutoff      archive + live, both bounded to
+                                         start_datetime < window_end + 1 day
+                                         (each side prunes to its partitions)
+      ... without archive access         attendance_logs if the window
+                                         reaches the live period, otherwise
+                                         nothing
+
+A log active on a day of the live period is never in the archive: the
+archive cycle keeps still-active logs (e.g. an open persistent status that
+started months ago) in attendance_logs, and moves any archived log that is
+still active back there. So live-window queries read attendance_logs alone and
+still see the same logs as current_status / daily_facts, which read the
+full history (test_log_source.py checks this).
+"""
+
+from datetime import date, datetime, timedelta
+from app.utils.log_partitions import LIVE_TABLE, ARCHIVE_TABLE, archive_cutoff
+
+LOG_SOURCE_COLUMNS = (
+    "id, employee_id, status_type_id, start_datetime, end_datetime, "
+    "note, reported_by, created_at, is_verified, verified_at"
+)
+
+# Access denied: same columns, no rows
+EMPTY_LOG_SOURCE = f"(SELECT {LOG_SOURCE_COLUMNS} FROM {LIVE_TABLE} WHERE FALSE)"
+
+
+def as_date(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def needs_archive(window_start, today=None):
+    """True when logs of the window may already be in the archive (None = unbounded)."""
+    start = as_date(window_start)
+    return start is None or start < archive_cutoff(today)
+
+
+def plan_log_source(window_start, window_end=None, archive_allowed=False, today=None):
+    """
+    Relation expression (table name or parenthesised subquery) for logs read by
+    a query over [window_start, window_end]; window_end defaults to window_start.
+    None for window_start means "all history".
+    """
+    start = as_date(window_start)
+    end = as_date(window_end) or start
+    cutoff = archive_cutoff(today)
+
+    live_window = start is not None and start >= cutoff
+    if live_window or not archive_allowed:
+        if end is not None and end < cutoff:
+            return EMPTY_LOG_SOURCE  # archived period without access
+        return LIVE_TABLE
+
+    bound = f" WHERE start_datetime < '{(end + timedelta(days=1)).isoformat()}'" if end else ""
+    return (
+        f"(SELECT {LOG_SOURCE_COLUMNS} FROM {ARCHIVE_TABLE}{bound}"
+        f" UNION ALL SELECT {LOG_SOURCE_COLUMNS} FROM {LIVE_TABLE}{bound})"
+    )
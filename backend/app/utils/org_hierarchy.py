@@ -0,0 +1,301 @@
+"""
+Org Hierarchy Cache
+===================
+In-process index of departments -> sections -> teams and of employee
+placement, shared by the models instead of re-joining teams / sections /
+departments (plus the s_dir / d_dir fallbacks) in every scoped query:
+
+    unit     -> name, parent, commander, ancestors, member employee ids
+    employee -> effective team / section / department, commanded units
+
+Employees belong to a unit through any of their links, the same rule the
+SQL scoping used:
+    team       e.team_id
+    section    team's section, or e.section_id
+    department team's section's department, direct section's department,
+               or e.department_id
+
+Structure / placement changes (employee create / update / delete / import,
+transfer approval, restore, setup) call invalidate_org_hierarchy(), which
+also tells the other workers through the shared stats "org" version.
+A short TTL reload covers edits made outside the app.
+"""
+
+import threading
+import time
+from psycopg2.extras import RealDictCursor
+from app.utils.db import get_db_connection
+
+HIERARCHY_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = 0.0
+_generation = 0  # bumped on every invalidation (dependent caches compare it)
+
+
+def _commander_name(row):
+    # Same output as CONCAT(e.first_name, ' ', e.last_name) over a LEFT JOIN
+    return f"{row.get('commander_first_name') or ''} {row.get('commander_last_name') or ''}"
+
+
+def _load():
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            """
+            SELECT d.id, d.name, d.commander_id,
+                   c.first_name as commander_first_name, c.last_name as commander_last_name
+            FROM departments d LEFT JOIN employees c ON d.commander_id = c.id
+            ORDER BY d.name
+        """
+        )
+        departments = [dict(r) for r in cur.fetchall()]
+        cur.execute(
+            """
+            SELECT s.id, s.name, s.department_id, s.commander_id,
+                   c.first_name as commander_first_name, c.last_name as commander_last_name
+            FROM sections s LEFT JOIN employees c ON s.commander_id = c.id
+            ORDER BY s.name
+        """
+        )
+        sections = [dict(r) for r in cur.fetchall()]
+        cur.execute(
+            """
+            SELECT t.id, t.name, t.section_id, t.commander_id,
+                   c.first_name as commander_first_name, c.last_name as commander_last_name
+            FROM teams t LEFT JOIN employees c ON t.commander_id = c.id
+            ORDER BY t.name
+        """
+        )
+        teams = [dict(r) for r in cur.fetchall()]
+        cur.execute("SELECT id, team_id, section_id, department_id FROM employees")
+        employees = cur.fetchall()
+    finally:
+        conn.close()
+
+    index = {
+        "departments": {},
+        "sections": {},
+        "teams": {},
+        "department_order": [],
+        "employees": {},
+        "commands": {},
+    }
+
+    for level, rows in (("department", departments), ("section", sections), ("team", teams)):
+        units = index[f"{level}s"]
+        for row in rows:
+            row["commander_name"] = _commander_name(row)
+            del row["commander_first_name"], row["commander_last_name"]
+            row["children"] = []
+            row["members"] = set()
+            units[row["id"]] = row
+            if row["commander_id"]:
+                # Lowest id wins when one employee is listed on several units of a level
+                commands = index["commands"].setdefault(row["commander_id"], {})
+                key = f"commands_{level}_id"
+                if not commands.get(key) or row["id"] < commands[key]:
+                    commands[key] = row["id"]
+
+    index["department_order"] = [d["id"] for d in departments]
+    for s in sections:
+        dept = index["departments"].get(s["department_id"])
+        if dept:
+            dept["children"].append(s["id"])
+    for t in teams:
+        sect = index["sections"].get(t["section_id"])
+        if sect:
+            sect["children"].append(t["id"])
+
+    for emp in employees:
+        team = index["teams"].get(emp["team_id"])
+        team_section = index["sections"].get(team["section_id"]) if team else None
+        direct_section = index["sections"].get(emp["section_id"])
+
+        team_ids = {team["id"]} if team else set()
+        section_ids = {s["id"] for s in (team_section, direct_section) if s}
+        dept_ids = {
+            s["department_id"] for s in (team_section, direct_section)
+            if s and s["department_id"] in index["departments"]
+        }
+        if emp["department_id"] in index["departments"]:
+            dept_ids.add(emp["department_id"])
+
+        for level, ids in (("teams", team_ids), ("sections", section_ids), ("departments", dept_ids)):
+            for unit_id in ids:
+                index[level][unit_id]["members"].add(emp["id"])
+
+        # Effective placement: the team path first, then the direct links
+        section = team_section or direct_section
+        index["employees"][emp["id"]] = {
+            "team_id": team["id"] if team else None,
+            "section_id": section["id"] if section else None,
+            "department_id": (
+                section["department_id"] if section and section["department_id"] in index["departments"]
+                else emp["department_id"] if emp["department_id"] in index["departments"]
+                else None
+            ),
+            # Every department whose scope includes the employee
+            "department_ids": tuple(sorted(dept_ids)),
+        }
+
+    return index
+
+
+def _hierarchy():
+    global _index, _loaded_at
+    if _index is not None and time.monotonic() - _loaded_at < HIERARCHY_TTL_SECONDS:
+        return _index
+    with _lock:
+        if _index is not None and time.monotonic() - _loaded_at < HIERARCHY_TTL_SECONDS:
+            return _index
+        try:
+            loaded = _load()
+        except Exception as e:
+            print(f"[ORG-HIERARCHY] Load failed: {e}")
+            loaded = None
+        if loaded is not None:
+            _index = loaded
+            _loaded_at = time.monotonic()
+        # On failure keep serving the previous snapshot (if any)
+        return _index
+
+
+def invalidate_org_hierarchy(broadcast=True):
+    """
+    Forces a rebuild on next access (call after structure / placement changes).
+    broadcast=False only drops this worker's copy (used when following another
+    worker's invalidation).
+    """
+    global _loaded_at, _generation
+    with _lock:
+        _loaded_at = 0.0
+        _generation += 1
+    if broadcast:
+        from app.utils.stats_cache import bump_org_version
+        bump_org_version()
+
+
+def hierarchy_generation():
+    """Changes whenever the hierarchy is invalidated."""
+    return _generation
+
+
+def get_commands(employee_id):
+    """{"commands_department_id", "commands_section_id", "commands_team_id"} for the employee."""
+    index = _hierarchy() or {}
+    try:
+        commands = index.get("commands", {}).get(int(employee_id), {})
+    except (TypeError, ValueError):
+        commands = {}
+    return {
+        "commands_department_id": commands.get("commands_department_id"),
+        "commands_section_id": commands.get("commands_section_id"),
+        "commands_team_id": commands.get("commands_team_id"),
+    }
+
+
+def get_placement(employee_id):
+    """Effective {"team_id", "section_id", "department_id", "department_ids"} of the employee, or None."""
+    index = _hierarchy() or {}
+    try:
+        return index.get("employees", {}).get(int(employee_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_ancestors(level, unit_id):
+    """Parent unit ids of a team / section as {"section_id", "department_id"}."""
+    index = _hierarchy() or {}
+    ancestors = {"section_id": None, "department_id": None}
+    if level == "team":
+        team = index.get("teams", {}).get(unit_id)
+        if not team:
+            return ancestors
+        ancestors["section_id"] = team["section_id"]
+        unit_id = team["section_id"]
+    if level in ("team", "section"):
+        section = index.get("sections", {}).get(unit_id)
+        if section:
+            ancestors["department_id"] = section["department_id"]
+    return ancestors
+
+
+def _members(level, unit_id):
+    index = _hierarchy() or {}
+    unit = index.get(level, {}).get(unit_id)
+    return unit["members"] if unit else set()
+
+
+def employees_in_scope(user):
+    """
+    Employee ids the requesting user may see, for `e.id = ANY(%s)` filters.
+    None means unrestricted (admin / no user). Commanders get the members of
+    their highest commanded unit; anyone else only themselves.
+    """
+    if not user or user.get("is_admin"):
+        return None
+    if user.get("commands_department_id"):
+        members = _members("departments", int(user["commands_department_id"]))
+    elif user.get("commands_section_id"):
+        members = _members("sections", int(user["commands_section_id"]))
+    elif user.get("commands_team_id"):
+        members = _members("teams", int(user["commands_team_id"]))
+    else:
+        members = {user["id"]} if user.get("id") is not None else set()
+    return sorted(members)
+
+
+def _public(unit):
+    return {k: v for k, v in unit.items() if k not in ("children", "members")}
+
+
+def get_structure_tree(user=None):
+    """Departments -> sections -> teams, limited to the commander's unit."""
+    index = _hierarchy()
+    if not index:
+        return []
+
+    dept_id = user.get("commands_department_id") if user else None
+    sect_id = user.get("commands_section_id") if user else None
+    team_id = user.get("commands_team_id") if user else None
+    is_admin = user.get("is_admin", False) if user else False
+
+    only_dept = only_sect = only_team = None
+    if not is_admin:
+        if dept_id:
+            only_dept = int(dept_id)
+        elif sect_id:
+            only_sect = int(sect_id)
+            only_dept = get_ancestors("section", only_sect)["department_id"]
+        elif team_id:
+            only_team = int(team_id)
+            ancestors = get_ancestors("team", only_team)
+            only_sect, only_dept = ancestors["section_id"], ancestors["department_id"]
+            if only_sect is None:
+                return []
+        if (sect_id or team_id) and only_dept is None:
+            return []
+
+    structure = []
+    for d_id in index["department_order"]:
+        if only_dept is not None and d_id != only_dept:
+            continue
+        dept = index["departments"][d_id]
+        dept_node = {**_public(dept), "sections": []}
+        for s_id in dept["children"]:
+            if only_sect is not None and s_id != only_sect:
+                continue
+            section = index["sections"][s_id]
+            teams = [
+                _public(index["teams"][t_id])
+                for t_id in section["children"]
+                if only_team is None or t_id == only_team
+            ]
+            dept_node["sections"].append({**_public(section), "teams": teams})
+        structure.append(dept_node)
+    return structure
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from app.models.employee_model import EmployeeModel
 from app.utils.db import get_db_connection
+from app.utils.status_window import open_or_ends_on_or_after, starts_on_day
 
 from psycopg2.extras import RealDictCursor
 
@@ -130,12 +131,12 @@ def check_and_send_morning_reminders(force_now=False, force_time=None):
 
             # 2. Self Report Check
             cur.execute(
-                """
+                f"""
                 SELECT 1 FROM attendance_logs al
                 JOIN status_types st ON al.status_type_id = st.id
                 WHERE al.employee_id = %s
-                AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= CURRENT_DATE)
-                AND (DATE(al.start_datetime) = CURRENT_DATE OR st.is_persistent = TRUE)
+                AND {open_or_ends_on_or_after("CURRENT_DATE")}
+                AND ({starts_on_day("CURRENT_DATE")} OR st.is_persistent = TRUE)
                 ORDER BY al.start_datetime DESC LIMIT 1
             """,
                 (emp["id"],),
@@ -149,7 +150,7 @@ def check_and_send_morning_reminders(force_now=False, force_time=None):
             # If Team Leader
             if emp["commands_team_id"]:
                 cur.execute(
-                    """
+                    f"""
                     SELECT e.first_name, e.last_name 
                     FROM employees e 
                     WHERE e.team_id = %s AND e.is_active = TRUE AND e.id != %s
@@ -157,8 +158,8 @@ def check_and_send_morning_reminders(force_now=False, force_time=None):
                         SELECT 1 FROM attendance_logs al 
                         JOIN status_types st ON al.status_type_id = st.id
                         WHERE al.employee_id = e.id 
-                        AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= CURRENT_DATE)
-                        AND (DATE(al.start_datetime) = CURRENT_DATE OR st.is_persistent = TRUE)
+                        AND {open_or_ends_on_or_after("CURRENT_DATE")}
+                        AND ({starts_on_day("CURRENT_DATE")} OR st.is_persistent = TRUE)
                     )
                 """,
                     (emp["commands_team_id"], emp["id"]),
@@ -196,7 +197,7 @@ def check_and_send_morning_reminders(force_now=False, force_time=None):
                     sub_units = cur.fetchall()
                     for unit in sub_units:
                         cur.execute(
-                            """
+                            f"""
                             SELECT COUNT(*) as count 
                             FROM employees e 
                             WHERE e.team_id = %s AND e.is_active = TRUE 
@@ -204,8 +205,8 @@ def check_and_send_morning_reminders(force_now=False, force_time=None):
                                 SELECT 1 FROM attendance_logs al 
                                 JOIN status_types st ON al.status_type_id = st.id
                                 WHERE al.employee_id = e.id 
-                                AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= CURRENT_DATE) 
-                                AND (DATE(al.start_datetime) = CURRENT_DATE OR st.is_persistent = TRUE)
+                                AND {open_or_ends_on_or_after("CURRENT_DATE")} 
+                                AND ({starts_on_day("CURRENT_DATE")} OR st.is_persistent = TRUE)
                             )
                             """,
                             (unit["id"],),
@@ -0,0 +1,95 @@
+"""
+Requester Context
+=================
+The requesting user's profile (command scope, delegation, notification
+settings) as returned by EmployeeModel.get_employee_by_id, memoized:
+
+  - per request in flask.g, so several lookups in one request share one query
+  - across requests for REQUESTER_TTL_SECONDS, keyed by user id
+
+Cached entries are dropped by invalidate_requester() (employee / delegation
+changes) and whenever the org hierarchy is invalidated, since a structure or
+placement change can move any commander's scope. Invalidations reach the
+other workers through the shared stats "org" version.
+
+Use for authorization / scoping only; endpoints that return the profile
+itself (/auth/me, GET /employees/<id>) keep reading it fresh.
+"""
+
+import threading
+import time
+from flask import g, has_request_context
+from app.utils.org_hierarchy import hierarchy_generation
+
+REQUESTER_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_cache = {}  # {user_id: (loaded_at, generation, profile)}
+
+
+def _key(user_id):
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+
+def _from_cache(key):
+    entry = _cache.get(key)
+    if not entry:
+        return None
+    loaded_at, generation, profile = entry
+    if time.monotonic() - loaded_at >= REQUESTER_TTL_SECONDS or generation != hierarchy_generation():
+        return None
+    return profile
+
+
+def get_requester(user_id):
+    """Requester profile dict (a private copy), or None if the user does not exist."""
+    if user_id is None:
+        return None
+    key = _key(user_id)
+
+    memo = None
+    if has_request_context():
+        memo = g.setdefault("_requesters", {})
+        if key in memo:
+            return memo[key]
+
+    profile = _from_cache(key)
+    if profile is None:
+        from app.models.employee_model import EmployeeModel
+
+        generation = hierarchy_generation()
+        profile = EmployeeModel.get_employee_by_id(key)
+        if profile is not None:
+            with _lock:
+                _cache[key] = (time.monotonic(), generation, profile)
+
+    # Routes may annotate the dict - never hand out the shared cached object
+    requester = dict(profile) if profile is not None else None
+    if memo is not None:
+        memo[key] = requester
+    return requester
+
+
+def invalidate_requester(user_id=None, broadcast=True):
+    """
+    Drops one cached requester, or all of them when user_id is None.
+    broadcast also makes the other workers drop theirs (all of them).
+    """
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(_key(user_id), None)
+    if has_request_context():
+        memo = g.get("_requesters")
+        if memo:
+            if user_id is None:
+                memo.clear()
+            else:
+                memo.pop(_key(user_id), None)
+    if broadcast:
+        from app.utils.stats_cache import bump_org_version
+        bump_org_version()
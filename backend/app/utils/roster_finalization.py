@@ -0,0 +1,149 @@
+"""
+Roster Finalization
+===================
+Planned roster entries are stored unverified and become "reported" once
+their day arrives. This used to happen on every dashboard load
+(auto_approve_daily_roster - a table-wide UPDATE on the busiest read path).
+
+run_roster_finalization() verifies every unverified row that started on or
+before today and is still active (the old UPDATE's condition), through the
+partial index on unverified rows, and records the day in system_settings
+(roster_finalized_through). It runs:
+
+  - from the scheduler right after the nightly rollover
+  - lazily from the dashboard read paths (ensure_roster_finalized), since the
+    scheduler only runs in the development server: at most once per
+    ROSTER_CHECK_SECONDS per process, when the watermark is behind today or
+    an index probe finds due unverified rows (entries added later in the day)
+"""
+
+import threading
+import time
+from datetime import date
+from app.utils.db import get_db_connection
+from app.utils.current_status import refresh_current_status
+from app.utils.stats_cache import bump_data_version
+from app.utils.status_window import starts_on_or_before
+
+WATERMARK_KEY = "roster_finalized_through"
+ROSTER_CHECK_SECONDS = 60
+
+# Unverified rows due by `today` (%s) - the same set the old per-load UPDATE touched
+DUE_CONDITION = " AND ".join(
+    [
+        "is_verified = FALSE",
+        starts_on_or_before("%s", log=""),
+        "(end_datetime IS NULL OR end_datetime >= CURRENT_TIMESTAMP)",
+    ]
+)
+
+_check_lock = threading.Lock()
+_checked_at = None  # monotonic time of this process's last check
+
+
+def _get_watermark(cur):
+    cur.execute("SELECT value FROM system_settings WHERE key = %s", (WATERMARK_KEY,))
+    row = cur.fetchone()
+    if not row or not row[0]:
+        return None
+    try:
+        return date.fromisoformat(str(row[0])[:10])
+    except ValueError:
+        return None
+
+
+def _set_watermark(cur, day):
+    cur.execute(
+        """
+        INSERT INTO system_settings (key, value, description)
+        VALUES (%s, %s, 'Last day whose roster entries were auto-verified')
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP
+        """,
+        (WATERMARK_KEY, day.isoformat()),
+    )
+
+
+def run_roster_finalization(today=None):
+    """
+    Verifies the roster entries that are due by today.
+    Returns the number of verified rows, or None on failure.
+    """
+    today = today or date.today()
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        # Serialize concurrent runs (several workers / a manual trigger)
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (WATERMARK_KEY,))
+        watermark = _get_watermark(cur)
+
+        cur.execute(
+            f"""
+            UPDATE attendance_logs
+            SET is_verified = TRUE, verified_at = NOW()
+            WHERE {DUE_CONDITION}
+            RETURNING employee_id
+            """,
+            (today,),
+        )
+        count = cur.rowcount
+        verified = sorted({r[0] for r in cur.fetchall()})
+        refresh_current_status(cur, verified)
+        if watermark is None or watermark < today:
+            _set_watermark(cur, today)
+        conn.commit()
+
+        if verified:
+            bump_data_version(verified)
+        if count or watermark != today:
+            print(f"[ROSTER] Finalized roster through {today} ({count} records)")
+        return count
+    except Exception as e:
+        conn.rollback()
+        print(f"[ROSTER] Finalization failed: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _finalization_due(today):
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT (SELECT value FROM system_settings WHERE key = %s),
+                   EXISTS (SELECT 1 FROM attendance_logs WHERE {DUE_CONDITION})
+            """,
+            (WATERMARK_KEY, today),
+        )
+        watermark, pending = cur.fetchone()
+        return pending or not watermark or str(watermark)[:10] < today.isoformat()
+    finally:
+        conn.close()
+
+
+def ensure_roster_finalized():
+    """
+    Cheap guard for the dashboard read paths: at most once per
+    ROSTER_CHECK_SECONDS (per process), runs the finalization when the
+    watermark is behind today or due roster entries are still unverified.
+    """
+    global _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < ROSTER_CHECK_SECONDS:
+        return
+    if not _check_lock.acquire(blocking=False):
+        return  # another request of this process is checking
+    try:
+        _checked_at = now
+        today = date.today()
+        if _finalization_due(today):
+            run_roster_finalization(today)
+    except Exception as e:
+        print(f"[ROSTER] Finalization check failed: {e}")
+    finally:
+        _check_lock.release()
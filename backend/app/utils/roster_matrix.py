@@ -0,0 +1,158 @@
+"""
+Roster Matrix Engine
+====================
+Employee x day status grid for a date range, built from interval logs
+(get_logs_for_employees rows) without expanding them day by day in Python.
+
+Employees and days are mapped to integer indices and every log becomes one
+NumPy slice assignment into an int32 grid of status codes:
+
+    grid[row, first_day:last_day + 1] = code
+
+Semantics (same as the per-day SQL, see status_window.py):
+    Smart Continuity  a dated log covers its days up to its end date; an open
+                      log covers the rest of the range if its status is
+                      persistent, otherwise only the day it started on.
+    Latest log wins   logs are applied in (start_datetime, id) order, so a
+                      later log overwrites the days it shares with an
+                      earlier one.
+
+Code 0 means "no status"; codes are decoded to names / colors only at the
+edge (labels(), statuses) so the grid itself stays compact.
+"""
+
+from datetime import date, datetime, timedelta
+import numpy as np
+
+EMPTY_CODE = 0
+EMPTY_LABEL = "-"
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class RosterMatrix:
+    """Status-code grid: one row per employee, one column per day."""
+
+    def __init__(self, employee_ids, start_date, end_date):
+        self.start = _as_date(start_date)
+        self.end = _as_date(end_date)
+        if self.end < self.start:
+            raise ValueError("end_date is before start_date")
+
+        self.employee_ids = list(employee_ids)
+        self.row_of = {emp_id: i for i, emp_id in enumerate(self.employee_ids)}
+        self.day_count = (self.end - self.start).days + 1
+        self.codes = np.zeros((len(self.employee_ids), self.day_count), dtype=np.int32)
+
+        # code -> {"status_type_id", "status_name", "status_color"}; index 0 is "no status"
+        self.statuses = [None]
+        self._code_of = {}
+
+    def _code(self, log):
+        key = (log.get("status_type_id"), log.get("status_name"))
+        code = self._code_of.get(key)
+        if code is None:
+            code = len(self.statuses)
+            self._code_of[key] = code
+            self.statuses.append(
+                {
+                    "status_type_id": log.get("status_type_id"),
+                    "status_name": log.get("status_name"),
+                    "status_color": log.get("status_color"),
+                }
+            )
+        return code
+
+    def _span(self, log):
+        """[first, last] day offsets the log covers inside the range, or None."""
+        first = (_as_date(log["start_datetime"]) - self.start).days
+        if log.get("end_datetime"):
+            last = (_as_date(log["end_datetime"]) - self.start).days
+        elif log.get("is_persistent", True):
+            last = self.day_count - 1
+        else:
+            # Daily status: resets the day after it was reported
+            last = first
+
+        first, last = max(first, 0), min(last, self.day_count - 1)
+        return (first, last) if first <= last else None
+
+    def apply(self, logs, presorted=False):
+        """
+        Paints the logs onto the grid; later (start_datetime, id) wins.
+        presorted=True consumes an already ordered iterable (e.g. a streaming
+        cursor) as it comes, without materializing it.
+        """
+        ordered = logs if presorted else sorted(
+            logs,
+            key=lambda l: (l["start_datetime"], l.get("log_id") or l.get("id") or 0),
+        )
+        for log in ordered:
+            row = self.row_of.get(log["employee_id"])
+            if row is None:
+                continue
+            span = self._span(log)
+            if span is None:
+                continue
+            self.codes[row, span[0] : span[1] + 1] = self._code(log)
+        return self
+
+    # --- Edge decoding ---
+
+    def days(self):
+        return [self.start + timedelta(days=i) for i in range(self.day_count)]
+
+    def day_strings(self, fmt="%Y-%m-%d"):
+        return [d.strftime(fmt) for d in self.days()]
+
+    def _names(self, empty):
+        return np.array(
+            [empty] + [s["status_name"] for s in self.statuses[1:]], dtype=object
+        )
+
+    def labels(self, empty=EMPTY_LABEL):
+        """Object array of status names in the grid's shape (one lookup per cell)."""
+        return self._names(empty)[self.codes]
+
+    def label_rows(self, empty=EMPTY_LABEL):
+        """Decoded rows one at a time (for row-by-row writers)."""
+        names = self._names(empty)
+        for row in self.codes:
+            yield names[row].tolist()
+
+    def run_lengths(self):
+        """
+        Per employee row, the grid run-length encoded as a flat
+        [code, length, code, length, ...] list covering every day.
+        """
+        rows, days = self.codes.shape
+        if rows == 0 or days == 0:
+            return [[] for _ in range(rows)]
+
+        # A run starts on day 0 and wherever the code differs from the day before
+        change = np.ones((rows, days), dtype=bool)
+        change[:, 1:] = self.codes[:, 1:] != self.codes[:, :-1]
+        run_rows, run_starts = np.nonzero(change)  # row-major: runs of a row are adjacent
+
+        row_last = np.ones(len(run_rows), dtype=bool)
+        row_last[:-1] = run_rows[1:] != run_rows[:-1]
+        run_ends = np.empty_like(run_starts)
+        run_ends[:-1] = run_starts[1:]
+        run_ends[row_last] = days
+
+        pairs = np.column_stack(
+            (self.codes[run_rows, run_starts], run_ends - run_starts)
+        ).astype(np.int64)
+        per_row = np.split(pairs, np.flatnonzero(row_last)[:-1] + 1)
+        return [chunk.ravel().tolist() for chunk in per_row]
+
+
+def build_roster_matrix(employee_ids, start_date, end_date, logs, presorted=False):
+    """RosterMatrix for the employees over [start_date, end_date], filled from `logs`."""
+    return RosterMatrix(employee_ids, start_date, end_date).apply(logs, presorted=presorted)
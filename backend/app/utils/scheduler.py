@@ -2,6 +2,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from app.utils.reminder_service import (
     check_and_send_morning_reminders,
 )
+from datetime import datetime
 import atexit
 
 
@@ -44,6 +45,80 @@ def start_scheduler():
         replace_existing=True,
     )
 
+    # 3. Current-status rollover - runs every night right after midnight
+    # Rebuilds employee_current_status so non-persistent statuses expire
+    # and roster entries planned for the new day become current.
+    def _safe_status_rollover():
+        try:
+            from app.utils.current_status import run_status_rollover
+            run_status_rollover()
+        except Exception as e:
+            print(f"[SCHEDULER] Status rollover error: {e}")
+
+    scheduler.add_job(
+        func=_safe_status_rollover,
+        trigger="cron",
+        hour=0,
+        minute=1,
+        id="status_rollover_job",
+        replace_existing=True,
+    )
+
+    # Roster finalization - right after the rollover (and once at startup to
+    # catch up after downtime): verifies the new day's planned roster entries.
+    # The dashboard routes also trigger it lazily (ensure_roster_finalized).
+    def _safe_roster_finalization():
+        try:
+            from app.utils.roster_finalization import run_roster_finalization
+            run_roster_finalization()
+        except Exception as e:
+            print(f"[SCHEDULER] Roster finalization error: {e}")
+
+    scheduler.add_job(
+        func=_safe_roster_finalization,
+        trigger="cron",
+        hour=0,
+        minute=2,
+        id="roster_finalization_job",
+        replace_existing=True,
+        next_run_time=datetime.now(),
+    )
+
+    # Daily status facts: finalize yesterday / extend coverage to today.
+    # Also runs once at startup so a fresh install gets its initial backfill.
+    def _safe_daily_facts():
+        try:
+            from app.utils.daily_facts import run_daily_facts_job
+            run_daily_facts_job()
+        except Exception as e:
+            print(f"[SCHEDULER] Daily facts error: {e}")
+
+    scheduler.add_job(
+        func=_safe_daily_facts,
+        trigger="cron",
+        hour=0,
+        minute=5,
+        id="daily_facts_job",
+        replace_existing=True,
+        next_run_time=datetime.now(),
+    )
+
+    # Generated report files: remove results older than REPORT_RESULT_TTL_HOURS
+    def _safe_report_purge():
+        try:
+            from app.services.report_jobs import purge_expired_reports
+            purge_expired_reports()
+        except Exception as e:
+            print(f"[SCHEDULER] Report purge error: {e}")
+
+    scheduler.add_job(
+        func=_safe_report_purge,
+        trigger="interval",
+        hours=1,
+        id="report_purge_job",
+        replace_existing=True,
+    )
+
     scheduler.start()
     print("[SCHEDULER] Background scheduler started. Tasks scheduled.")
 
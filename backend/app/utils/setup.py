@@ -1,4 +1,11 @@
 from app.utils.db import get_db_connection
+from app.utils.current_status import refresh_current_status
+from app.utils.db_indexes import ensure_indexes
+from app.utils.log_partitions import ensure_log_partitions
+from app.utils.change_tracking import ensure_change_tracking
+from app.utils.backup_stream import BACKUP_TABLES
+from app.utils.status_registry import invalidate_status_registry
+from app.utils.org_hierarchy import invalidate_org_hierarchy
 from werkzeug.security import generate_password_hash
 
 
@@ -84,16 +91,18 @@ def setup_database():
                 font_size VARCHAR(20) DEFAULT 'normal',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );""",
+            # Range-partitioned by month on start_datetime (see log_partitions.py)
             """CREATE TABLE IF NOT EXISTS attendance_logs (
-                id BIGSERIAL PRIMARY KEY,
+                id BIGSERIAL,
                 employee_id INTEGER REFERENCES employees(id),
                 status_type_id INTEGER REFERENCES status_types(id),
                 start_datetime TIMESTAMP NOT NULL,
                 end_datetime TIMESTAMP,
                 note TEXT,
                 reported_by INTEGER REFERENCES employees(id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );""",
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, start_datetime)
+            ) PARTITION BY RANGE (start_datetime);""",
             """CREATE TABLE IF NOT EXISTS transfer_requests (
                 id SERIAL PRIMARY KEY,
                 employee_id INTEGER REFERENCES employees(id),
@@ -170,7 +179,7 @@ def setup_database():
                 CONSTRAINT unique_active_delegation UNIQUE (commander_id, delegate_id, start_date)
             );""",
             """CREATE TABLE IF NOT EXISTS attendance_logs_archive (
-                id BIGINT PRIMARY KEY,
+                id BIGINT NOT NULL,
                 employee_id INTEGER REFERENCES employees(id),
                 status_type_id INTEGER REFERENCES status_types(id),
                 start_datetime TIMESTAMP NOT NULL,
@@ -179,8 +188,9 @@ def setup_database():
                 reported_by INTEGER REFERENCES employees(id),
                 is_verified BOOLEAN DEFAULT FALSE,
                 verified_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );""",
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, start_datetime)
+            ) PARTITION BY RANGE (start_datetime);""",
             """CREATE TABLE IF NOT EXISTS data_restore_requests (
                 id SERIAL PRIMARY KEY,
                 requester_id INTEGER REFERENCES employees(id),
@@ -193,6 +203,72 @@ def setup_database():
                 resolved_at TIMESTAMP,
                 expires_at TIMESTAMP
             );""",
+            """CREATE TABLE IF NOT EXISTS employee_current_status (
+                employee_id INTEGER PRIMARY KEY REFERENCES employees(id) ON DELETE CASCADE,
+                log_id BIGINT,
+                status_type_id INTEGER REFERENCES status_types(id) ON DELETE CASCADE,
+                start_datetime TIMESTAMP,
+                end_datetime TIMESTAMP,
+                note TEXT,
+                is_verified BOOLEAN,
+                status_date DATE NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );""",
+            """CREATE TABLE IF NOT EXISTS daily_status_facts (
+                fact_date DATE NOT NULL,
+                employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+                status_type_id INTEGER REFERENCES status_types(id) ON DELETE SET NULL,
+                is_presence BOOLEAN,
+                team_id INTEGER,
+                section_id INTEGER,
+                department_id INTEGER,
+                computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (fact_date, employee_id)
+            );""",
+            """CREATE TABLE IF NOT EXISTS report_jobs (
+                id VARCHAR(32) PRIMARY KEY,
+                report_type VARCHAR(30) NOT NULL,
+                params JSONB,
+                requested_by INTEGER REFERENCES employees(id) ON DELETE SET NULL,
+                cache_key VARCHAR(64) NOT NULL,
+                worker_token VARCHAR(32),
+                status VARCHAR(20) DEFAULT 'queued', -- queued, running, done, failed
+                file_path TEXT,
+                download_name TEXT,
+                mimetype TEXT,
+                row_count INTEGER,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                heartbeat_at TIMESTAMP, -- refreshed by the owning process while queued / running
+                finished_at TIMESTAMP
+            );""",
+            """CREATE TABLE IF NOT EXISTS archive_runs (
+                id SERIAL PRIMARY KEY,
+                cutoff_date DATE NOT NULL,
+                status VARCHAR(20) DEFAULT 'running', -- running (or interrupted), done
+                last_id BIGINT DEFAULT 0, -- checkpoint: last moved attendance_logs id
+                batches INTEGER DEFAULT 0,
+                partitions_moved INTEGER DEFAULT 0,
+                rows_deleted INTEGER DEFAULT 0,
+                rows_archived INTEGER DEFAULT 0,
+                resumes INTEGER DEFAULT 0,
+                duration_seconds REAL DEFAULT 0,
+                error TEXT,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            );""",
+            """CREATE TABLE IF NOT EXISTS restore_progress (
+                id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1), -- single row (see backup_restore.py)
+                state JSONB,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );""",
+            """CREATE TABLE IF NOT EXISTS stats_data_versions (
+                scope VARCHAR(50) PRIMARY KEY, -- epoch, global, dept:<id> (see stats_cache.py)
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );""",
             """CREATE TABLE IF NOT EXISTS feedbacks (
                 id SERIAL PRIMARY KEY,
                 user_id INTEGER REFERENCES employees(id),
@@ -229,6 +305,12 @@ def setup_database():
         cur.execute(
             "CREATE INDEX IF NOT EXISTS idx_restore_requests_requester ON data_restore_requests(requester_id);"
         )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_daily_facts_employee ON daily_status_facts(employee_id, fact_date);"
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_report_jobs_cache_key ON report_jobs(cache_key, created_at);"
+        )
 
         # Insert default system settings
         cur.execute(
@@ -263,6 +345,18 @@ def setup_database():
             cur.execute(
                 "ALTER TABLE employees ADD COLUMN IF NOT EXISTS font_size VARCHAR(20) DEFAULT 'normal';"
             )
+            cur.execute(
+                "ALTER TABLE attendance_logs ADD COLUMN IF NOT EXISTS is_verified BOOLEAN DEFAULT TRUE;"
+            )
+            cur.execute(
+                "ALTER TABLE attendance_logs ADD COLUMN IF NOT EXISTS verified_at TIMESTAMP;"
+            )
+            cur.execute(
+                "ALTER TABLE archive_runs ADD COLUMN IF NOT EXISTS partitions_moved INTEGER DEFAULT 0;"
+            )
+            cur.execute(
+                "ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;"
+            )
             cur.execute(
                 "ALTER TABLE status_types ADD COLUMN IF NOT EXISTS code VARCHAR(50);"
             )
@@ -461,7 +555,27 @@ def setup_database():
 
             print("[SUCCESS] Service Types inserted successfully.")
 
+        # 3b. Monthly attendance partitions (default + current window, after the column migrations)
+        if not ensure_log_partitions(cur):
+            print(
+                "[WARNING] attendance_logs is not partitioned - run migrate_log_partitions.py to convert it"
+            )
+
+        # 4. Managed attendance indexes (after the column migrations above)
+        ensure_indexes(cur)
+
+        # 4b. Row-change triggers feeding incremental backups
+        ensure_change_tracking(cur, BACKUP_TABLES)
+
+        # 5. Build the current-status projection on a fresh install only - writes maintain
+        #    it, restores / migrations rebuild it themselves, the nightly rollover refreshes it
+        cur.execute("SELECT 1 FROM employee_current_status LIMIT 1")
+        if cur.fetchone() is None:
+            refresh_current_status(cur)
+
         conn.commit()
+        invalidate_status_registry()
+        invalidate_org_hierarchy()
         print("[SUCCESS] Database setup completed successfully.")
 
     except Exception as e:
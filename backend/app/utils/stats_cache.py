@@ -0,0 +1,261 @@
+"""
+Statistics Result Cache
+=======================
+Bounded LRU + TTL cache for expensive, requester-scoped statistics
+(dashboard status breakdown, totals, age distribution).
+
+Entries are keyed by (namespace, requester scope, filters, data version).
+Writers call bump_data_version(employee_ids) after committing; only the
+versions of the departments those employees belong to move, so a roster
+edit in one department does not flush the cache of the others. Admin
+(unscoped) results follow the global version, which moves on every bump.
+Writes that are not tied to specific employees (structure changes,
+rollover, restore, archiving) bump everything.
+
+The versions are counter rows in stats_data_versions, so a write handled by
+one worker invalidates the cached results of every worker; each lookup reads
+its (at most three) counters by primary key. When the database cannot be
+reached the cache is bypassed.
+
+Results also depend on the per-process org-hierarchy and requester caches
+(requester scope, department placement). Their invalidations bump the shared
+"org" counter (bump_org_version); a lookup that sees it move drops this
+worker's copies and bypasses the cache once, so nothing is computed from a
+hierarchy older than the version it is stored under.
+
+Old entries are never looked up again once the version moves; they age out
+through the LRU / TTL.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from app.utils.db import get_db_connection
+from app.utils.org_hierarchy import get_placement, get_ancestors
+
+STATS_CACHE_MAX_ENTRIES = 256
+STATS_CACHE_TTL_SECONDS = 300
+
+# Counter rows in stats_data_versions
+EPOCH_SCOPE = "epoch"  # bumped by "everything changed"
+GLOBAL_SCOPE = "global"  # bumped by every write
+ORG_SCOPE = "org"  # bumped by org-hierarchy / requester invalidations
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (stored_at, value)
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "bumps": 0, "bypassed": 0}
+_org_seen = None  # ORG_SCOPE version this worker's hierarchy / requester caches follow
+
+
+def _dept_scope(dept_id):
+    return f"dept:{dept_id}"
+
+
+def _increment(scopes):
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO stats_data_versions (scope, version)
+            SELECT scope, 1 FROM unnest(%s::text[]) AS scope
+            ON CONFLICT (scope) DO UPDATE
+            SET version = stats_data_versions.version + 1, updated_at = NOW()
+            """,
+            (sorted(scopes),),
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[STATS-CACHE] Could not bump data version: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _read_versions(scopes):
+    """{scope: version} for the given counters, or None when the database is unreachable."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT scope, version FROM stats_data_versions WHERE scope = ANY(%s)",
+            (list(scopes),),
+        )
+        return dict(cur.fetchall())
+    except Exception as e:
+        conn.rollback()
+        print(f"[STATS-CACHE] Could not read data version: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def bump_data_version(employee_ids=None):
+    """
+    Marks cached statistics touching these employees as stale (in every worker).
+    employee_ids=None (or an employee without a department) invalidates everything.
+    """
+    departments = set()
+    if employee_ids is None:
+        departments = None
+    else:
+        for emp_id in employee_ids:
+            placement = get_placement(emp_id)
+            if not placement or not placement["department_ids"]:
+                departments = None
+                break
+            departments.update(placement["department_ids"])
+
+    if departments is None:
+        scopes = {EPOCH_SCOPE, GLOBAL_SCOPE}
+    else:
+        scopes = {GLOBAL_SCOPE} | {_dept_scope(dept_id) for dept_id in departments}
+    _increment(scopes)
+
+    with _lock:
+        _counters["bumps"] += 1
+        if departments is None:
+            # Unreachable under the new epoch anyway - free the memory now
+            _entries.clear()
+
+
+def bump_org_version():
+    """Tells every worker to reload its org-hierarchy and requester caches."""
+    _increment({ORG_SCOPE})
+
+
+def _sync_org(version):
+    """
+    Drops this worker's hierarchy / requester caches when the shared org
+    version moved. False when they were out of step (the caller's requester
+    and scope were resolved from them).
+    """
+    global _org_seen
+    if version == _org_seen:
+        return True
+    from app.utils.org_hierarchy import invalidate_org_hierarchy
+    from app.utils.requester_context import invalidate_requester
+
+    invalidate_org_hierarchy(broadcast=False)
+    invalidate_requester(broadcast=False)
+    with _lock:
+        _org_seen = version
+    return False
+
+
+def _scope_department(user):
+    """The single department a non-admin requester's scope lies in, or None."""
+    if user.get("commands_department_id"):
+        return int(user["commands_department_id"])
+    if user.get("commands_section_id"):
+        return get_ancestors("section", int(user["commands_section_id"]))["department_id"]
+    if user.get("commands_team_id"):
+        return get_ancestors("team", int(user["commands_team_id"]))["department_id"]
+    placement = get_placement(user.get("id"))
+    return placement["department_id"] if placement else None
+
+
+def _scope_key(user):
+    if not user:
+        return ("all", None)
+    return (
+        "admin" if user.get("is_admin") else "scoped",
+        user.get("id"),
+        user.get("commands_department_id"),
+        user.get("commands_section_id"),
+        user.get("commands_team_id"),
+    )
+
+
+def _version(user):
+    """
+    (epoch, org, scope, version) of the requester's data, or None when it
+    cannot be read or the local org caches were stale.
+    """
+    scope = GLOBAL_SCOPE
+    if user and not user.get("is_admin"):
+        dept_id = _scope_department(user)
+        if dept_id is not None:
+            scope = _dept_scope(dept_id)
+    versions = _read_versions({EPOCH_SCOPE, ORG_SCOPE, scope})
+    if versions is None:
+        return None
+    org = versions.get(ORG_SCOPE, 0)
+    if not _sync_org(org):
+        return None
+    return (versions.get(EPOCH_SCOPE, 0), org, scope, versions.get(scope, 0))
+
+
+def data_version(requesting_user):
+    """
+    Opaque version of the data visible to the requester; changes whenever a
+    write touches their scope (in any worker). For callers that cache derived
+    results themselves (e.g. generated report files). None when the version
+    cannot be read - do not cache then.
+    """
+    return _version(requesting_user)
+
+
+def cached_result(namespace, requesting_user, params, loader):
+    """
+    Returns loader() through the cache. `params` must fully describe the
+    result for the requester (filters, resolved target date, ...).
+    A None result is returned but not cached.
+    """
+    # Version is read before loading: a write committed meanwhile moves it,
+    # so a result computed from older data is stored under the old key.
+    version = _version(requesting_user)
+    if version is None:
+        with _lock:
+            _counters["bypassed"] += 1
+        return loader()
+    key = (
+        namespace,
+        _scope_key(requesting_user),
+        json.dumps(params or {}, sort_keys=True, default=str),
+        version,
+    )
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if now - entry[0] < STATS_CACHE_TTL_SECONDS:
+                _entries.move_to_end(key)
+                _counters["hits"] += 1
+                return entry[1]
+            del _entries[key]
+            _counters["expired"] += 1
+        _counters["misses"] += 1
+
+    value = loader()
+    if value is None:
+        return None
+
+    with _lock:
+        _entries[key] = (time.monotonic(), value)
+        _entries.move_to_end(key)
+        _counters["stores"] += 1
+        while len(_entries) > STATS_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _counters["evictions"] += 1
+    return value
+
+
+def get_stats_cache_info():
+    """Counters and sizing for the admin view."""
+    with _lock:
+        lookups = _counters["hits"] + _counters["misses"]
+        return {
+            "entries": len(_entries),
+            "max_entries": STATS_CACHE_MAX_ENTRIES,
+            "ttl_seconds": STATS_CACHE_TTL_SECONDS,
+            "hit_rate": round(_counters["hits"] / lookups, 3) if lookups else None,
+            "counters": dict(_counters),
+        }
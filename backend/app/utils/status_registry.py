@@ -0,0 +1,136 @@
+"""
+Status Type Registry
+====================
+In-process cache of status_types, loaded once and shared by all models:
+id -> name, code, color, is_presence, is_persistent, parent_status_id,
+weekend_allowed and children (all descendant ids).
+
+status_types changes only through setup / restore / admin maintenance, which
+call invalidate_status_registry(). A TTL reload covers edits made by other
+processes or by scripts outside the app.
+"""
+
+import threading
+import time
+from psycopg2.extras import RealDictCursor
+from app.utils.db import get_db_connection
+
+REGISTRY_TTL_SECONDS = 300
+
+# Statuses that may be logged on Friday / Saturday (matched on the status name)
+WEEKEND_ALLOWED_MARKERS = ("תגבור", "אחר")
+
+_PUBLIC_FIELDS = ("id", "name", "color", "is_presence", "is_persistent", "parent_status_id")
+
+_lock = threading.Lock()
+_by_id = None  # {id: status dict}
+_ordered_ids = []
+_loaded_at = 0.0
+
+
+def _load():
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            """
+            SELECT id, name, code, color, is_presence, is_persistent, parent_status_id
+            FROM status_types
+            ORDER BY COALESCE(parent_status_id, id), id
+        """
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+    by_id = {}
+    direct_children = {}
+    for row in rows:
+        name = row.get("name") or ""
+        row["weekend_allowed"] = any(m in name for m in WEEKEND_ALLOWED_MARKERS)
+        by_id[row["id"]] = row
+        if row.get("parent_status_id") is not None:
+            direct_children.setdefault(row["parent_status_id"], []).append(row["id"])
+
+    # Transitive children (guards against cycles in bad data)
+    for status_id, row in by_id.items():
+        seen = set()
+        stack = list(direct_children.get(status_id, []))
+        while stack:
+            child = stack.pop()
+            if child in seen or child == status_id:
+                continue
+            seen.add(child)
+            stack.extend(direct_children.get(child, []))
+        row["children"] = frozenset(seen)
+
+    return by_id, [r["id"] for r in rows]
+
+
+def _registry():
+    global _by_id, _ordered_ids, _loaded_at
+    if _by_id is not None and time.monotonic() - _loaded_at < REGISTRY_TTL_SECONDS:
+        return _by_id
+    with _lock:
+        if _by_id is not None and time.monotonic() - _loaded_at < REGISTRY_TTL_SECONDS:
+            return _by_id
+        try:
+            loaded = _load()
+        except Exception as e:
+            print(f"[STATUS-REGISTRY] Load failed: {e}")
+            loaded = None
+        if loaded is not None:
+            _by_id, _ordered_ids = loaded
+            _loaded_at = time.monotonic()
+        # On failure keep serving the previous snapshot (if any)
+        return _by_id or {}
+
+
+def invalidate_status_registry():
+    """Forces a reload on next access (call after editing status_types)."""
+    global _loaded_at
+    with _lock:
+        _loaded_at = 0.0
+
+
+def get_status(status_id):
+    """Status dict for the id, or None if unknown."""
+    try:
+        return _registry().get(int(status_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def list_status_types():
+    """All status types (API shape), parents followed by their sub-statuses."""
+    registry = _registry()
+    return [
+        {field: registry[i][field] for field in _PUBLIC_FIELDS}
+        for i in _ordered_ids
+        if i in registry
+    ]
+
+
+def is_weekend_allowed(status_id):
+    status = get_status(status_id)
+    return bool(status and status["weekend_allowed"])
+
+
+def is_presence(status_id):
+    status = get_status(status_id)
+    return bool(status and status["is_presence"])
+
+
+def status_family(status_id):
+    """The status id plus all its sub-status ids (for "status X or its children" filters)."""
+    status = get_status(status_id)
+    if not status:
+        return [int(status_id)]
+    return sorted({status["id"], *status["children"]})
+
+
+def status_family_sql(status_id, column="st.id"):
+    """Inline SQL condition matching the status or any of its sub-statuses (ids are ints)."""
+    return f"{column} IN ({', '.join(str(i) for i in status_family(status_id))})"
@@ -0,0 +1,77 @@
+"""
+Status Window Predicates
+========================
+SQL fragments for "is this log active on day D" (Smart Continuity), written
+as half-open timestamp ranges so the B-tree indexes on start_datetime /
+end_datetime stay usable:
+
+    DATE(start) <= D   ->  start <  D + 1
+    DATE(end)   >= D   ->  end   >= D
+    DATE(start) =  D   ->  start >= D        (given start < D + 1)
+
+`day` is any SQL date expression: '%s', '%(target_date)s', 'CURRENT_DATE',
+or a column such as 'dr.date_val'; pass log="" for unaliased columns.
+Each occurrence of a placeholder in a fragment consumes one query parameter,
+in the same positions as the DATE() forms these fragments replace.
+"""
+
+
+def _day(day):
+    return f"({day})::date"
+
+
+def _col(log, name):
+    return f"{log}.{name}" if log else name
+
+
+def starts_on_or_before(day, log="al"):
+    """DATE(log.start_datetime) <= day"""
+    return f"{_col(log, 'start_datetime')} < {_day(day)} + 1"
+
+
+def ends_on_or_after(day, log="al"):
+    """DATE(log.end_datetime) >= day (NULL end is NOT matched)"""
+    return f"{_col(log, 'end_datetime')} >= {_day(day)}"
+
+
+def starts_on_or_after(day, log="al"):
+    """DATE(log.start_datetime) >= day"""
+    return f"{_col(log, 'start_datetime')} >= {_day(day)}"
+
+
+def starts_on_day(day, log="al"):
+    """DATE(log.start_datetime) = day (consumes two parameters for a placeholder)"""
+    return f"({starts_on_or_after(day, log)} AND {starts_on_or_before(day, log)})"
+
+
+def open_or_ends_on_or_after(day, log="al"):
+    """(log.end_datetime IS NULL OR DATE(log.end_datetime) >= day)"""
+    return f"({_col(log, 'end_datetime')} IS NULL OR {ends_on_or_after(day, log)})"
+
+
+def continuity_clause(day, log="al", status="st"):
+    """
+    Log-level part of Smart Continuity, for a log already known to start on or
+    before `day`: a dated log covers the day while its end >= day; an open log
+    only if its status is persistent or it started on `day`.
+    Consumes two parameters when `day` is a placeholder.
+    """
+    end = _col(log, "end_datetime")
+    return (
+        f"(({end} IS NOT NULL AND {ends_on_or_after(day, log)})"
+        f" OR ({end} IS NULL AND ({status}.is_persistent = TRUE"
+        f" OR {starts_on_or_after(day, log)})))"
+    )
+
+
+def active_on_day(day, log="al", status="st"):
+    """
+    Full Smart Continuity filter: the log started on or before `day`, has not
+    ended before it, and is persistent or started on `day`.
+    Consumes three parameters when `day` is a placeholder.
+    """
+    return (
+        f"{starts_on_or_before(day, log)}"
+        f" AND {open_or_ends_on_or_after(day, log)}"
+        f" AND ({status}.is_persistent = TRUE OR {starts_on_or_after(day, log)})"
+    )
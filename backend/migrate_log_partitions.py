@@ -0,0 +1,51 @@
+"""
+Converts attendance_logs / attendance_logs_archive into monthly range-partitioned
+tables, in place and in one transaction (see app/utils/log_partitions.py):
+
+- the archive table is attached as a single partition - no rows are copied
+- the live table (last two months + planned days) is copied into month partitions
+
+Stop the backend first: both tables are locked for the duration.
+Afterwards setup_database() re-creates the managed indexes and the
+change-tracking triggers on the partitioned tables.
+"""
+
+from app import create_app
+from app.utils.db import get_db_connection
+from app.utils.log_partitions import convert_to_partitioned
+from app.utils.current_status import refresh_current_status
+from app.utils.setup import setup_database
+from app.utils.change_tracking import request_full_backup
+
+
+def migrate():
+    conn = get_db_connection()
+    if not conn:
+        print("Failed to connect to database.")
+        return False
+    try:
+        cur = conn.cursor()
+        print("Converting attendance tables to monthly partitions...")
+        summary = convert_to_partitioned(cur)
+        if summary:
+            refresh_current_status(cur)
+        conn.commit()
+        print(f"Migration successful: {summary or 'already partitioned'}")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed (nothing changed): {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        if migrate():
+            print("Running database setup...")
+            setup_database()
+            # Rows were copied without change tracking: start a new backup chain
+            request_full_backup("attendance tables partitioned")
+            print("Database setup finished.")
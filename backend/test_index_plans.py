@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from datetime import date
+
+# EXPLAIN regression over the hot attendance queries:
+# each query must be planned with the managed index it was designed for.
+# Sequential scans are disabled so the check is stable on small dev datasets.
+# On partitioned tables the plan names the partitions' indexes; they are
+# resolved to the managed parent index through pg_inherits.
+
+sys.path.append(os.getcwd())
+from app.utils.db_indexes import MANAGED_INDEXES
+
+HOT_QUERIES = [
+    (
+        "latest log per employee (LATERAL lookup)",
+        "idx_attendance_logs_emp_start",
+        """
+        SELECT al.id FROM attendance_logs al
+        WHERE al.employee_id = %(emp)s AND al.start_datetime < %(day)s::date + 1
+        ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
+        """,
+    ),
+    (
+        "latest archived log per employee",
+        "idx_attendance_logs_archive_emp_start",
+        """
+        SELECT al.id FROM attendance_logs_archive al
+        WHERE al.employee_id = %(emp)s AND al.start_datetime < %(day)s::date + 1
+        ORDER BY al.start_datetime DESC, al.id DESC LIMIT 1
+        """,
+    ),
+    (
+        "archived logs still active at the cutoff",
+        "idx_attendance_logs_archive_end",
+        """
+        SELECT id FROM attendance_logs_archive
+        WHERE end_datetime IS NULL OR end_datetime >= %(day)s::date
+        """,
+    ),
+    (
+        "close previous open status",
+        "idx_attendance_logs_open",
+        """
+        SELECT id FROM attendance_logs
+        WHERE employee_id = %(emp)s AND end_datetime IS NULL
+        """,
+    ),
+    (
+        "roster auto-approve (unverified)",
+        "idx_attendance_logs_unverified",
+        """
+        SELECT id FROM attendance_logs
+        WHERE is_verified = FALSE AND start_datetime < %(day)s::date + 1
+        """,
+    ),
+    (
+        "day window scan",
+        "idx_attendance_logs_start_end",
+        """
+        SELECT id FROM attendance_logs
+        WHERE start_datetime >= %(day)s::date AND start_datetime < %(day)s::date + 1
+        """,
+    ),
+]
+
+
+def _plan_indexes(node, found):
+    if "Index Name" in node:
+        found.add(node["Index Name"])
+    for child in node.get("Plans", []):
+        _plan_indexes(child, found)
+    return found
+
+
+def _with_parents(cur, index_names):
+    """The plan's index names plus every parent index they are attached to."""
+    cur.execute(
+        """
+        WITH RECURSIVE chain AS (
+            SELECT c.oid FROM pg_class c
+            WHERE c.relname = ANY(%s) AND c.relkind IN ('i', 'I')
+            UNION
+            SELECT i.inhparent FROM pg_inherits i JOIN chain ON i.inhrelid = chain.oid
+        )
+        SELECT c.relname FROM chain JOIN pg_class c ON c.oid = chain.oid
+        """,
+        (sorted(index_names),),
+    )
+    return set(index_names) | {r["relname"] for r in cur.fetchall()}
+
+
+def test_index_plans():
+    load_dotenv()
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASS'),
+        port=os.getenv('DB_PORT', 5432)
+    )
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute("SET enable_seqscan = off")
+
+        cur.execute("SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)",
+                    ([name for name, _, _ in MANAGED_INDEXES],))
+        existing = {r["indexname"] for r in cur.fetchall()}
+
+        params = {"emp": 1, "day": date.today().isoformat()}
+        failures = 0
+        for label, expected, query in HOT_QUERIES:
+            if expected not in existing:
+                print(f"[FAIL] {label}: index {expected} does not exist (run setup_database)")
+                failures += 1
+                continue
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cur.fetchone()["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = _plan_indexes(plan[0]["Plan"], set())
+            if expected in _with_parents(cur, used):
+                print(f"[OK]   {label}: {expected}")
+            else:
+                print(f"[FAIL] {label}: expected {expected}, plan used {sorted(used) or 'no index'}")
+                failures += 1
+
+        print(f"\n{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use their index")
+        assert failures == 0, f"{failures} hot queries do not use their index"
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_index_plans()
+    except AssertionError:
+        sys.exit(1)
@@ -0,0 +1,134 @@
+import os
+import sys
+import random
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from datetime import date, datetime, timedelta
+
+# Regression check for app.utils.log_source: for every day of the live period,
+# the planned (live-only) source must find the same active log per employee as
+# the full live + archive UNION - including a persistent status that started
+# before the cutoff and is still open, which the archive cycle keeps live.
+# Runs on a generated dataset in TEMP tables that shadow the real ones.
+
+sys.path.append(os.getcwd())
+from app.utils.log_partitions import archive_cutoff
+from app.utils.log_source import LOG_SOURCE_COLUMNS, plan_log_source
+from app.utils.status_window import active_on_day
+
+TODAY = date.today()
+CUTOFF = archive_cutoff(TODAY)
+FIRST_DAY = CUTOFF - timedelta(days=90)
+LOGS = 4000
+EMPLOYEES = 150
+OPEN_EMPLOYEE = EMPLOYEES + 1  # old, still open persistent status
+
+FULL_UNION = (
+    f"(SELECT {LOG_SOURCE_COLUMNS} FROM pg_temp.attendance_logs"
+    f" UNION ALL SELECT {LOG_SOURCE_COLUMNS} FROM pg_temp.attendance_logs_archive)"
+)
+
+ACTIVE_QUERY = """
+    SELECT DISTINCT ON (al.employee_id) al.employee_id, al.id
+    FROM {source} al
+    JOIN pg_temp.status_types st ON st.id = al.status_type_id
+    WHERE {active}
+    ORDER BY al.employee_id, al.start_datetime DESC, al.id DESC
+"""
+
+
+def _generate_logs(rng):
+    span = (TODAY + timedelta(days=7) - FIRST_DAY).days
+    rows = []
+    for i in range(1, LOGS + 1):
+        start = datetime.combine(FIRST_DAY + timedelta(days=rng.randint(0, span)), datetime.min.time())
+        start += timedelta(seconds=rng.randint(0, 86399))
+        end = None
+        if rng.random() < 0.6:
+            end = start + timedelta(seconds=rng.randint(0, 20 * 86400))
+        rows.append((i, rng.randint(1, EMPLOYEES), rng.randint(1, 4), start, end))
+    # Open "course"-like persistent status that started before the cutoff
+    rows.append((LOGS + 1, OPEN_EMPLOYEE, 1, datetime.combine(CUTOFF - timedelta(days=17), datetime.min.time()), None))
+    return rows
+
+
+def _active(cur, source, day):
+    cur.execute(ACTIVE_QUERY.format(source=source, active=active_on_day("%(day)s")), {"day": day})
+    return dict(cur.fetchall())
+
+
+def test_log_source():
+    load_dotenv()
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASS'),
+        port=os.getenv('DB_PORT', 5432)
+    )
+    try:
+        cur = conn.cursor()
+        for table in ("attendance_logs", "attendance_logs_archive"):
+            cur.execute(f"""
+                CREATE TEMP TABLE {table} (
+                    id BIGINT PRIMARY KEY, employee_id INTEGER, status_type_id INTEGER,
+                    start_datetime TIMESTAMP NOT NULL, end_datetime TIMESTAMP,
+                    note TEXT, reported_by INTEGER, created_at TIMESTAMP DEFAULT NOW(),
+                    is_verified BOOLEAN DEFAULT TRUE, verified_at TIMESTAMP
+                ) ON COMMIT DROP
+            """)
+        cur.execute("""
+            CREATE TEMP TABLE status_types (id INTEGER PRIMARY KEY, is_persistent BOOLEAN)
+            ON COMMIT DROP
+        """)
+        cur.execute("INSERT INTO pg_temp.status_types VALUES (1, TRUE), (2, FALSE), (3, TRUE), (4, FALSE)")
+
+        # Split the way the archive cycle does: only logs that started and ended before the cutoff are archived
+        rows = _generate_logs(random.Random(20261018))
+        cutoff_start = datetime.combine(CUTOFF, datetime.min.time())
+        archived = [r for r in rows if r[3] < cutoff_start and r[4] is not None and r[4] < cutoff_start]
+        archived_ids = {r[0] for r in archived}
+        for table, part in (
+            ("attendance_logs_archive", archived),
+            ("attendance_logs", [r for r in rows if r[0] not in archived_ids]),
+        ):
+            psycopg2.extras.execute_values(
+                cur,
+                f"INSERT INTO pg_temp.{table} (id, employee_id, status_type_id, start_datetime, end_datetime) VALUES %s",
+                part,
+            )
+
+        failures = 0
+        days = (TODAY - CUTOFF).days + 1
+        for offset in range(days):
+            day = CUTOFF + timedelta(days=offset)
+            expected = _active(cur, FULL_UNION, day)
+            for label, source in (
+                ("day", plan_log_source(day, today=TODAY)),
+                ("week", plan_log_source(max(CUTOFF, day - timedelta(days=6)), day, today=TODAY)),
+                ("no access", plan_log_source(day - timedelta(days=30), day, today=TODAY)),
+            ):
+                actual = _active(cur, source, day)
+                if actual != expected:
+                    failures += 1
+                    diff = set(expected.items()) ^ set(actual.items())
+                    print(f"[FAIL] {day} ({label} window): {len(diff)} employee(s) differ, e.g. {sorted(diff)[:3]}")
+
+        yesterday = _active(cur, plan_log_source(TODAY - timedelta(days=1), today=TODAY), TODAY - timedelta(days=1))
+        if yesterday.get(OPEN_EMPLOYEE) != LOGS + 1:
+            failures += 1
+            print("[FAIL] old open persistent status is missing from yesterday's live-window source")
+
+        conn.rollback()
+        print(f"\n{days} live-period days checked, {failures} mismatches")
+        assert failures == 0, f"{failures} planned log sources differ from the full history"
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_log_source()
+    except AssertionError:
+        sys.exit(1)
@@ -0,0 +1,151 @@
+import os
+import sys
+import random
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from datetime import date, datetime, timedelta
+
+# Equivalence check: the sargable fragments in app.utils.status_window must
+# select exactly the same logs as the DATE(...) predicates they replaced.
+# Runs on a generated dataset in TEMP tables (nothing is written to real tables).
+
+sys.path.append(os.getcwd())
+from app.utils.status_window import (
+    starts_on_or_before,
+    starts_on_or_after,
+    starts_on_day,
+    open_or_ends_on_or_after,
+    continuity_clause,
+    active_on_day,
+)
+
+BASE_DAY = date(2026, 1, 1)
+DAYS = 40
+LOGS = 5000
+
+# (label, legacy predicate, new predicate) - "%(day)s" is the day under test
+CASES = [
+    (
+        "starts on or before",
+        "DATE(al.start_datetime) <= %(day)s",
+        starts_on_or_before("%(day)s"),
+    ),
+    (
+        "starts on or after",
+        "DATE(al.start_datetime) >= %(day)s",
+        starts_on_or_after("%(day)s"),
+    ),
+    (
+        "starts on day",
+        "DATE(al.start_datetime) = %(day)s",
+        starts_on_day("%(day)s"),
+    ),
+    (
+        "open or ends on/after",
+        "(al.end_datetime IS NULL OR DATE(al.end_datetime) >= %(day)s)",
+        open_or_ends_on_or_after("%(day)s"),
+    ),
+    (
+        "continuity (log already started)",
+        """DATE(al.start_datetime) <= %(day)s AND (
+               (al.end_datetime IS NOT NULL AND DATE(al.end_datetime) >= %(day)s)
+               OR (al.end_datetime IS NULL AND (st.is_persistent = TRUE OR DATE(al.start_datetime) = %(day)s)))""",
+        f"{starts_on_or_before('%(day)s')} AND {continuity_clause('%(day)s')}",
+    ),
+    (
+        "smart continuity (full)",
+        """DATE(al.start_datetime) <= %(day)s
+           AND (al.end_datetime IS NULL OR DATE(al.end_datetime) >= %(day)s)
+           AND (st.is_persistent = TRUE OR DATE(al.start_datetime) = %(day)s)""",
+        active_on_day("%(day)s"),
+    ),
+]
+
+
+def _random_ts(rng):
+    day = BASE_DAY + timedelta(days=rng.randint(0, DAYS))
+    # Bias towards the day boundaries, where DATE() vs ranges could diverge
+    choice = rng.random()
+    if choice < 0.25:
+        t = datetime.min.time()
+    elif choice < 0.5:
+        t = datetime.max.time()  # 23:59:59.999999
+    else:
+        t = (datetime.min + timedelta(seconds=rng.randint(0, 86399))).time()
+    return datetime.combine(day, t)
+
+
+def _generate_logs(rng):
+    rows = []
+    for i in range(1, LOGS + 1):
+        start = _random_ts(rng)
+        end = None
+        if rng.random() < 0.6:
+            end = start + timedelta(seconds=rng.choice([0, 1, 3600, 86399, 86400, rng.randint(0, 10 * 86400)]))
+        rows.append((i, rng.randint(1, 200), rng.randint(1, 4), start, end))
+    return rows
+
+
+def test_status_window():
+    load_dotenv()
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASS'),
+        port=os.getenv('DB_PORT', 5432)
+    )
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE attendance_logs (
+                id BIGINT PRIMARY KEY, employee_id INTEGER, status_type_id INTEGER,
+                start_datetime TIMESTAMP NOT NULL, end_datetime TIMESTAMP
+            ) ON COMMIT DROP
+        """)
+        cur.execute("""
+            CREATE TEMP TABLE status_types (id INTEGER PRIMARY KEY, is_persistent BOOLEAN)
+            ON COMMIT DROP
+        """)
+        cur.execute("INSERT INTO pg_temp.status_types VALUES (1, TRUE), (2, FALSE), (3, TRUE), (4, FALSE)")
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO pg_temp.attendance_logs VALUES %s",
+            _generate_logs(random.Random(20260101)),
+        )
+
+        failures = 0
+        for label, legacy, new in CASES:
+            mismatched_days = []
+            for offset in range(-1, DAYS + 2):
+                day = BASE_DAY + timedelta(days=offset)
+                query = """
+                    SELECT al.id FROM pg_temp.attendance_logs al
+                    JOIN pg_temp.status_types st ON al.status_type_id = st.id
+                    WHERE {}
+                """
+                cur.execute(query.format(legacy), {"day": day})
+                expected = {r[0] for r in cur.fetchall()}
+                cur.execute(query.format(new), {"day": day})
+                actual = {r[0] for r in cur.fetchall()}
+                if expected != actual:
+                    mismatched_days.append((day, len(expected ^ actual)))
+            if mismatched_days:
+                failures += 1
+                print(f"[FAIL] {label}: {len(mismatched_days)} day(s) differ, e.g. {mismatched_days[:3]}")
+            else:
+                print(f"[OK]   {label}")
+
+        conn.rollback()
+        print(f"\n{len(CASES) - failures}/{len(CASES)} fragments match the DATE() semantics")
+        assert failures == 0, f"{failures} fragments differ from the DATE() semantics"
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_status_window()
+    except AssertionError:
+        sys.exit(1)
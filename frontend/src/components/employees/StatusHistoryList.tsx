@@ -14,6 +14,8 @@ import { cn } from "@/lib/utils";
 import { Calendar, CalendarDayButton } from "@/components/ui/calendar";
 import type { DayButtonProps } from "react-day-picker";
 import { ChevronDown } from "lucide-react";
+import { toast } from "sonner";
+import { useReports } from "@/hooks/useReports";
 
 interface StatusLog {
   id: number;
@@ -48,6 +50,7 @@ export default function StatusHistoryList({
   const [selectedDate, setSelectedDate] = useState<Date | undefined>(
     initialDate || new Date(),
   );
+  const { downloadReport, exporting } = useReports();
 
   useEffect(() => {
     if (employeeId) {
@@ -109,13 +112,15 @@ export default function StatusHistoryList({
     };
   }, [history]);
 
-  // Handle export
-  const handleExport = () => {
-    if (!employeeId) return;
-    window.open(
-      `${api.defaults.baseURL}/attendance/history/${employeeId}/export`,
-      "_blank",
-    );
+  // Handle export (background report job, downloaded when ready)
+  const handleExport = async () => {
+    if (!employeeId || exporting) return;
+    try {
+      await downloadReport("history", { employee_id: employeeId });
+    } catch (err: any) {
+      console.error("History export failed", err);
+      toast.error(err?.response?.data?.error || err?.message || "נכשל בייצוא הדוח");
+    }
   };
 
   if (loading) {
@@ -320,6 +325,7 @@ export default function StatusHistoryList({
           {/* Export Button */}
           <button
             onClick={handleExport}
+            disabled={exporting}
             className="flex items-center gap-1.5 text-xs font-bold text-muted-foreground hover:text-foreground transition-colors"
           >
             <Download className="w-3.5 h-3.5" />
@@ -17,12 +17,11 @@ import {
   Filter,
   Info,
 } from "lucide-react";
-import apiClient from "@/config/api.client";
-import { EMPLOYEES_EXPORT_ENDPOINT } from "@/config/employees.endpoints";
 import { useDateContext } from "@/context/DateContext";
 import { type DateRange } from "react-day-picker";
 import { toast } from "sonner";
 import { useEmployees } from "@/hooks/useEmployees";
+import { useReports } from "@/hooks/useReports";
 import { cn } from "@/lib/utils";
 
 import { FilterModal, type EmployeeFilters } from "./FilterModal";
@@ -51,6 +50,7 @@ export function ExportReportDialog({
   });
 
   const { employees, fetchEmployees } = useEmployees();
+  const { runReport, exporting } = useReports();
 
   // Fetch employees when filter modal opens
   useEffect(() => {
@@ -65,57 +65,52 @@ export function ExportReportDialog({
   }, [selectedDate]);
 
   const handleDownload = async (forWhatsApp = false) => {
+    if (exporting) return;
     try {
-      console.log("Starting download...", { mode, dailyDate, dateRange });
-      
-      const params = new URLSearchParams();
+      // Same parameters as GET /employees/export, generated as a background report job
+      const params: Record<string, string> = {};
 
       if (mode === "daily") {
         if (!dailyDate) {
           toast.error("נא לבחור תאריך");
           return;
         }
-        params.append("date", format(dailyDate, "yyyy-MM-dd"));
+        params.date = format(dailyDate, "yyyy-MM-dd");
       } else if (mode === "range") {
         if (!dateRange?.from || !dateRange?.to) {
           toast.error("נא לבחור טווח תאריכים");
           return;
         }
-        params.append("start_date", format(dateRange.from, "yyyy-MM-dd"));
-        params.append("end_date", format(dateRange.to, "yyyy-MM-dd"));
+        params.start_date = format(dateRange.from, "yyyy-MM-dd");
+        params.end_date = format(dateRange.to, "yyyy-MM-dd");
       } else {
         toast.error("נא לבחור תאריך או טווח תאריכים");
         return;
       }
 
       if (activeFilters.departments?.length)
-        params.append("depts", activeFilters.departments.join(","));
+        params.depts = activeFilters.departments.join(",");
       if (activeFilters.sections?.length)
-        params.append("sects", activeFilters.sections.join(","));
+        params.sects = activeFilters.sections.join(",");
       if (activeFilters.teams?.length)
-        params.append("tms", activeFilters.teams.join(","));
+        params.tms = activeFilters.teams.join(",");
       if (activeFilters.serviceTypes?.length)
-        params.append("serviceTypes", activeFilters.serviceTypes.join(","));
+        params.serviceTypes = activeFilters.serviceTypes.join(",");
       if (activeFilters.statuses?.length)
-        params.append("statuses", activeFilters.statuses.join(","));
+        params.statuses = activeFilters.statuses.join(",");
 
-      const url = `${EMPLOYEES_EXPORT_ENDPOINT}?${params.toString()}`;
-      console.log("Fetching from URL:", url);
+      toast.loading("מכין דוח...");
+
+      const { blob: reportBlob } = await runReport("employees", params);
 
-      toast.loading("מוריד דוח...");
-      
-      const response = await apiClient.get(url, { responseType: "blob" });
-      
-      console.log("Response received:", response);
-      
       // Check if response is actually a blob and not an error
-      if (!response.data || response.data.size === 0) {
+      if (!reportBlob || reportBlob.size === 0) {
         toast.dismiss();
         toast.error("הדוח ריק או לא נמצא");
         return;
       }
 
-      const blob = new Blob([response.data], {
+      const blob = new Blob([reportBlob], {
         type: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
       });
       
@@ -310,6 +305,7 @@ export function ExportReportDialog({
                     e.stopPropagation();
                     handleDownload(false);
                   }}
+                  disabled={exporting}
                   className="col-span-1 sm:col-span-2 h-12 rounded-xl bg-primary text-white hover:bg-primary/90 font-black text-sm gap-2 cursor-pointer pointer-events-auto transition-all"
                 >
                   <Download className="w-4 h-4" />
@@ -324,6 +320,7 @@ export function ExportReportDialog({
                     e.stopPropagation();
                     handleDownload(true);
                   }}
+                  disabled={exporting}
                   className="h-10 rounded-xl border-emerald-600/20 bg-emerald-50 text-emerald-700 dark:text-emerald-400 hover:bg-emerald-600 hover:text-white font-bold text-xs gap-2 cursor-pointer pointer-events-auto transition-all"
                 >
                   <FileSpreadsheet className="w-3.5 h-3.5" />
@@ -190,7 +190,7 @@ export function BackupSettings({
               <input
                 type="file"
                 id="restore-file"
-                accept=".json"
+                accept=".json,.gz"
                 className="hidden"
                 onChange={handleRestore}
               />
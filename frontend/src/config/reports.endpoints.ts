@@ -0,0 +1,6 @@
+export const REPORTS_BASE_ENDPOINT = "/reports"; // POST {type, params} -> job
+
+// Helpers for dynamic IDs
+export const reportJobEndpoint = (jobId: string) => `/reports/${jobId}`;
+export const reportDownloadEndpoint = (jobId: string) =>
+  `/reports/${jobId}/download`;
@@ -0,0 +1,94 @@
+import { useState, useCallback } from "react";
+import apiClient from "@/config/api.client";
+import * as endpoints from "@/config/reports.endpoints";
+
+export type ReportType = "employees" | "history" | "audit";
+
+export interface ReportJob {
+  job_id: string;
+  report_type: ReportType;
+  status: "queued" | "running" | "done" | "failed";
+  row_count?: number | null;
+  error?: string | null;
+  download_name?: string | null;
+  created_at?: string | null;
+  finished_at?: string | null;
+}
+
+const POLL_INTERVAL_MS = 1500;
+const POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Background exports: queues a report job (POST /reports), polls it until the
+ * file is ready and downloads it. Identical requests reuse the server's
+ * cached / in-flight job.
+ */
+export const useReports = () => {
+  const [exporting, setExporting] = useState<boolean>(false);
+  const [job, setJob] = useState<ReportJob | null>(null);
+
+  const runReport = useCallback(
+    async (
+      type: ReportType,
+      params: Record<string, string | number | undefined> = {},
+    ): Promise<{ blob: Blob; job: ReportJob }> => {
+      setExporting(true);
+      try {
+        let { data: current } = await apiClient.post<ReportJob>(
+          endpoints.REPORTS_BASE_ENDPOINT,
+          { type, params },
+        );
+        setJob(current);
+
+        const deadline = Date.now() + POLL_TIMEOUT_MS;
+        while (current.status === "queued" || current.status === "running") {
+          if (Date.now() > deadline) {
+            throw new Error("Report generation timed out");
+          }
+          await sleep(POLL_INTERVAL_MS);
+          ({ data: current } = await apiClient.get<ReportJob>(
+            endpoints.reportJobEndpoint(current.job_id),
+          ));
+          setJob(current);
+        }
+        if (current.status !== "done") {
+          throw new Error(current.error || "Report generation failed");
+        }
+
+        const response = await apiClient.get(
+          endpoints.reportDownloadEndpoint(current.job_id),
+          { responseType: "blob" },
+        );
+        return { blob: response.data, job: current };
+      } finally {
+        setExporting(false);
+      }
+    },
+    [],
+  );
+
+  // Runs the report and saves it under fileName (or the server's name)
+  const downloadReport = useCallback(
+    async (
+      type: ReportType,
+      params: Record<string, string | number | undefined> = {},
+      fileName?: string,
+    ) => {
+      const { blob, job: done } = await runReport(type, params);
+      const url = window.URL.createObjectURL(blob);
+      const link = document.createElement("a");
+      link.href = url;
+      link.setAttribute("download", fileName || done.download_name || "report");
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+      return done;
+    },
+    [runReport],
+  );
+
+  return { runReport, downloadReport, exporting, job };
+};
@@ -40,6 +40,7 @@ import { Input } from "@/components/ui/input";
 import { useAuthContext } from "@/context/AuthContext";
 import { toast } from "sonner";
 import { PageHeader } from "@/components/layout/PageHeader";
+import { useReports } from "@/hooks/useReports";
 import { Card } from "@/components/ui/card";
 
 // Mapping action types to Hebrew labels and icons
@@ -84,7 +85,7 @@ export default function ActivityLogPage() {
   const [users, setUsers] = useState<any[]>([]);
   
   const [isLoading, setIsLoading] = useState(false);
-  const [isExporting, setIsExporting] = useState(false);
+  const { downloadReport, exporting: isExporting } = useReports();
   
   // Filter states
   const [searchTerm, setSearchTerm] = useState("");
@@ -133,24 +134,18 @@ export default function ActivityLogPage() {
   };
 
   const handleExport = async () => {
-    setIsExporting(true);
+    if (isExporting) return;
     try {
-      const response = await apiClient.get("/audit/export", {
-        params: { limit: 1000 },
-        responseType: "blob",
-      });
-      const url = window.URL.createObjectURL(new Blob([response.data]));
-      const link = document.createElement("a");
-      link.href = url;
-      link.setAttribute("download", `full_system_audit_${format(new Date(), "yyyyMMdd_HHmm")}.csv`);
-      document.body.appendChild(link);
-      link.click();
+      // Generated as a background report job, downloaded when ready
+      await downloadReport(
+        "audit",
+        { limit: 1000 },
+        `full_system_audit_${format(new Date(), "yyyyMMdd_HHmm")}.csv`,
+      );
       toast.success("הדוח המלא נוצר בהצלחה וייפתח כעת");
     } catch (err) {
       console.error("Export failed", err);
       toast.error("נכשל בייצוא הדוח");
-    } finally {
-      setIsExporting(false);
     }
   };
 
@@ -127,7 +127,7 @@ export default function SettingsPage() {
       const link = document.createElement("a");
       link.href = url;
       const date = new Date().toISOString().split("T")[0];
-      link.setAttribute("download", `shiftguard_backup_${date}.json`);
+      link.setAttribute("download", `shiftguard_backup_${date}.ndjson.gz`);
       document.body.appendChild(link);
       link.click();
       link.remove();